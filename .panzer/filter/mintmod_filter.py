@@ -3,9 +3,10 @@
 """Main entry for Pandoc filter ``mintmod_filter``."""
 
 import os
-from panflute import run_filter
+import panflute as pf
 from innoconv_mintmod.mintmod_filter.filter_action import MintmodFilterAction
-from innoconv_mintmod.utils import remove_annotations, remove_empty_paragraphs
+from innoconv_mintmod.utils import delete_annotation, delete_empty_paragraph
+from innoconv_mintmod.visitor import Visitor
 
 
 def main():
@@ -13,13 +14,21 @@ def main():
     debug = bool(os.environ.get("INNOCONV_DEBUG"))
     filter_action = MintmodFilterAction(debug=debug)
 
+    # cleanup passes share a single walk through the document
+    finalize = Visitor()
+    finalize.add_pass(delete_empty_paragraph, pf.Para)
+    if not filter_action.context.depth:
+        # annotations must not be removed in subprocesses
+        finalize.add_pass(delete_annotation, pf.Div)
+
     def _finalize(doc):
-        remove_empty_paragraphs(doc)
-        if not os.getenv("INNOCONV_RECURSION_DEPTH"):
-            # remove_annotations must not happen in subprocesses
-            remove_annotations(doc)
+        finalize.walk(doc)
+        filter_action.save_stats()
+        filter_action.save_math_cache()
 
-    run_filter(filter_action.filter, finalize=_finalize)
+    pf.run_filter(
+        filter_action.filter, prepare=filter_action.prepare, finalize=_finalize
+    )
 
 
 if __name__ == "__main__":
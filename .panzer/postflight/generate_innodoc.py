@@ -7,21 +7,41 @@ This is the final step to generate innoDoc content from Mintmod input.
  - Create a mapping between mintmod section IDs and section paths. (a)
  - Create a mapping between element IDs and section paths. (b)
  - Rewrite all links by using (a) and (b).
+ - Optionally render unique formulas with an external command.
+ - Optionally render TikZ figures to SVG files with an external command.
+ - Optionally collect unique formulas into a ``math.json`` table.
  - Save individual sections to innoDoc-specific directory structure.
  - Generate a ``manifest.yml``.
  - Removes single JSON file.
 """
 
+import hashlib
 import json
 import os
 import re
 import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pformat
 from subprocess import PIPE, Popen
 
 import yaml
 
-from innoconv_mintmod.constants import ENCODING, OUTPUT_FORMAT_EXT_MAP
+from innoconv_mintmod.constants import (
+    ENCODING,
+    MATH_RENDERED_FILENAME,
+    MATH_TABLE_FILENAME,
+    OUTPUT_FORMAT_EXT_MAP,
+    TIKZ_ASSETS_URL,
+)
+from innoconv_mintmod.errors import UnsupportedElement
+from innoconv_mintmod.markdown_writer import (
+    PANDOC_MARKDOWN_COMMAND,
+    MarkdownWriter,
+    markdown_document,
+)
+from innoconv_mintmod.prerender import Formula, MathRenderer, TikzRenderer
+from innoconv_mintmod.walker import walk
 
 sys.path.append(os.path.join(os.environ["PANZER_SHARED"], "panzerhelper"))
 # pylint: disable=import-error,wrong-import-position,wrong-import-order
@@ -30,6 +50,9 @@ import panzertools  # noqa: E402
 #: Max. depth of headers to consider when splitting sections
 MAX_LEVELS = 3
 
+#: Length of the hash that keys the math table
+MATH_KEY_LENGTH = 16
+
 
 class CreateMapOfIds:
     """Create a mapping between link IDs and section path."""
@@ -38,6 +61,15 @@ class CreateMapOfIds:
         """Init attributes."""
         self.sections = sections
         self.id_map = {}
+        self._section_path = None
+        self._handlers = {
+            "CodeBlock": self._handle_id,
+            "Div": self._handle_id,
+            "Header": self._handle_header,
+            "Image": self._handle_id,
+            "Link": self._handle_link,
+            "Span": self._handle_id,
+        }
 
     def create(self):
         """Create map."""
@@ -46,138 +78,34 @@ class CreateMapOfIds:
         return self.id_map
 
     def _handle_section(self, section, prefix):
-        section_path = "{}{}".format(prefix, section["id"])
-        if "content" in section:
-            for node in section["content"]:
-                self._handle_node(node, section_path)
-        if "children" in section:
-            for child in section["children"]:
-                self._handle_section(child, "{}/".format(section_path))
-
-    def _handle_node(self, node, section_path):
-        handle_node_map = {
-            "BulletList": self._handle_bulletlist,
-            "CodeBlock": self._handle_codeblock,
-            "DefinitionList": self._handle_definitionlist,
-            "Div": self._handle_div,
-            "Header": self._handle_header,
-            "Image": self._handle_image,
-            "Link": self._handle_link,
-            "OrderedList": self._handle_orderedlist,
-            "Quoted": self._handle_quoted,
-            "Span": self._handle_span,
-            "Table": self._handle_table,
-            ("Emph", "Strong"): self._handle_emph_strong,
-            ("Para", "Plain"): self._handle_para,
-            (
-                "LineBreak",
-                "Math",
-                "SoftBreak",
-                "Space",
-                "Str",
-            ): lambda *args: None,
-        }
+        self._section_path = "{}{}".format(prefix, section["id"])
+        walk(section.get("content", []), self._handlers, self._handle_unknown)
+        section_path = self._section_path
+        for child in section.get("children", []):
+            self._handle_section(child, "{}/".format(section_path))
+
+    def _handle_id(self, node):
+        elem_id = node["c"][0][0]
+        if elem_id:
+            self.id_map[elem_id] = self._section_path
+
+    def _handle_header(self, node):
+        header_id = node["c"][1][0]
+        if header_id:
+            self.id_map[header_id] = self._section_path
 
-        for elem_type in handle_node_map:
-            if node["t"] == elem_type or node["t"] in elem_type:
-                handle_node_map[elem_type](node, section_path)
-                return
+    def _handle_link(self, node):
+        if "video" in node["c"][0][1]:
+            self._handle_id(node)
 
+    def _handle_unknown(self, node):
         panzertools.log(
             "WARNING",
             "CreateMapOfIds: Unknown element {} in section {}: {}".format(
-                node["t"], section_path, pformat(node)
+                node["t"], self._section_path, pformat(node)
             ),
         )
 
-    def _handle_image(self, node, section_path):
-        image_id = node["c"][0][0]
-        if image_id:
-            self.id_map[image_id] = section_path
-
-    def _handle_link(self, node, section_path):
-        if "video" in node["c"][0][1]:
-            video_id = node["c"][0][0]
-            if video_id:
-                self.id_map[video_id] = section_path
-
-    def _handle_definitionlist(self, node, section_path):
-        for term in node["c"]:
-            for term_0 in term[0]:
-                if isinstance(term_0, list):
-                    for sub_node in term_0:
-                        self._handle_node(sub_node, section_path)
-                else:
-                    self._handle_node(term_0, section_path)
-            for term_1 in term[1]:
-                if isinstance(term_1, list):
-                    for sub_node in term_1:
-                        self._handle_node(sub_node, section_path)
-                else:
-                    self._handle_node(term_1, section_path)
-
-    def _handle_quoted(self, node, section_path):
-        for sub_node in node["c"][1]:
-            self._handle_node(sub_node, section_path)
-
-    def _handle_header(self, node, section_path):
-        header_id = node["c"][1][0]
-        if header_id:
-            self.id_map[header_id] = section_path
-        for sub_node in node["c"][2]:
-            self._handle_node(sub_node, section_path)
-
-    def _handle_codeblock(self, node, section_path):
-        cb_id = node["c"][0][0]
-        if cb_id:
-            self.id_map[cb_id] = section_path
-
-    def _handle_span(self, node, section_path):
-        span_id = node["c"][0][0]
-        if span_id:
-            self.id_map[span_id] = section_path
-        for sub_node in node["c"][1]:
-            self._handle_node(sub_node, section_path)
-
-    def _handle_table(self, node, section_path):
-        try:
-            headcols = node["c"][3][1][0][1]
-        except IndexError:
-            headcols = []
-        for headcol in headcols:
-            for sub_node in headcol[4]:
-                self._handle_node(sub_node, section_path)
-        for row in node["c"][4][0][3]:
-            for col in row[1]:
-                for sub_node in col[4]:
-                    self._handle_node(sub_node, section_path)
-
-    def _handle_para(self, node, section_path):
-        for sub_node in node["c"]:
-            self._handle_node(sub_node, section_path)
-
-    def _handle_bulletlist(self, node, section_path):
-        for item in node["c"]:
-            for sub_node in item:
-                self._handle_node(sub_node, section_path)
-
-    def _handle_div(self, node, section_path):
-        div_id = node["c"][0][0]
-        if div_id:
-            self.id_map[div_id] = section_path
-        for sub_node in node["c"][1]:
-            self._handle_node(sub_node, section_path)
-
-    def _handle_emph_strong(self, node, section_path):
-        for sub_node in node["c"]:
-            if isinstance(sub_node, list):
-                self._handle_node(sub_node, section_path)
-
-    def _handle_orderedlist(self, node, section_path):
-        for item in node["c"][1]:
-            for sub_node in item:
-                self._handle_node(sub_node, section_path)
-
 
 class PostprocessLinks:
     """Postprocess all links to work with new section structure."""
@@ -186,6 +114,8 @@ class PostprocessLinks:
         self.sections = sections
         self.section_map = section_map
         self.id_map = id_map
+        self._section = None
+        self._handlers = {"Link": self._handle_ref, "Span": self._handle_span}
 
     def process(self):
         """Rewrite links."""
@@ -193,136 +123,47 @@ class PostprocessLinks:
             self._handle_section(section)
 
     def _handle_section(self, section):
-        if "content" in section:
-            for node in section["content"]:
-                self._handle_node(node, section)
-        if "children" in section:
-            for child in section["children"]:
-                self._handle_section(child)
-
-    def _handle_node(self, node, section):
-        handle_node_map = {
-            "BulletList": self._handle_bulletlist,
-            "DefinitionList": self._handle_definitionlist,
-            "Div": self._handle_div,
-            "Link": self._handle_ref,
-            "OrderedList": self._handle_orderedlist,
-            "Quoted": self._handle_quoted,
-            "Span": self._handle_span,
-            "Strong": self._handle_strong,
-            "Table": self._handle_table,
-            ("Para", "Plain", "Emph"): self._handle_para,
-            (
-                "Code",
-                "CodeBlock",
-                "Header",
-                "Image",
-                "LineBreak",
-                "Math",
-                "SoftBreak",
-                "Space",
-                "Str",
-            ): lambda *args: None,
-        }
-
-        for elem_type in handle_node_map:
-            if node["t"] == elem_type or node["t"] in elem_type:
-                handle_node_map[elem_type](node, section)
-                return
-
-        panzertools.log(
-            "WARNING",
-            "PostprocessLinks: Unknown element {} in section {}: {}".format(
-                node["t"], section["id"], pformat(node)
-            ),
-        )
+        self._section = section
+        walk(section.get("content", []), self._handlers, self._handle_unknown)
+        for child in section.get("children", []):
+            self._handle_section(child)
 
-    def _handle_definitionlist(self, node, section):
-        for term in node["c"]:
-            for term_0 in term[0]:
-                if isinstance(term_0, list):
-                    for sub_node in term_0:
-                        self._handle_node(sub_node, section)
-                else:
-                    self._handle_node(term_0, section)
-            for term_1 in term[1]:
-                if isinstance(term_1, list):
-                    for sub_node in term_1:
-                        self._handle_node(sub_node, section)
-                else:
-                    self._handle_node(term_1, section)
-
-    def _handle_table(self, node, section):
-        try:
-            headcols = node["c"][3][1][0][1]
-        except IndexError:
-            headcols = []
-        for headcol in headcols:
-            for sub_node in headcol[4]:
-                self._handle_node(sub_node, section)
-        for row in node["c"][4][0][3]:
-            for col in row[1]:
-                for sub_node in col[4]:
-                    self._handle_node(sub_node, section)
-
-    def _handle_quoted(self, node, section):
-        for sub_node in node["c"][1]:
-            self._handle_node(sub_node, section)
-
-    def _handle_strong(self, node, section):
-        for sub_node in node["c"]:
-            if isinstance(sub_node, list):
-                self._handle_node(sub_node, section)
-
-    def _handle_span(self, node, section):
+    def _handle_span(self, node):
         attrs = self._attrs_to_dict(node["c"][0][2])
-        if "data-index-term" in attrs.keys():
-            pass
-        elif not attrs.keys():
-            for sub_node in node["c"][1]:
-                self._handle_node(sub_node, section)
-        elif "question" in node["c"][0][1]:
-            pass
-        else:
+        if (
+            attrs
+            and "data-index-term" not in attrs
+            and "question" not in node["c"][0][1]
+        ):
             panzertools.log(
                 "WARNING",
                 r"Found unknown span in section {}: {}".format(
-                    section["id"], pformat(node)
+                    self._section["id"], pformat(node)
                 ),
             )
 
-    def _handle_ref(self, node, section):
+    def _handle_ref(self, node):
         attrs = self._attrs_to_dict(node["c"][0][2])
         if "data-mref" in attrs.keys():
             # \MRef has ID target, caption is (section, example,
             # exercise, ...) number
-            self._handle_link("MRef", node, section)
+            self._handle_link("MRef", node, self._section)
             node["c"][1] = []
         elif "data-msref" in attrs.keys():
             # \MSRef has ID target and caption
-            self._handle_link("MSRef", node, section)
+            self._handle_link("MSRef", node, self._section)
         elif "data-mnref" in attrs.keys():
             # \MNRef: seems to be the same as \MRef...
-            self._handle_link("MNRef", node, section)
+            self._handle_link("MNRef", node, self._section)
             node["c"][1] = []
 
-    def _handle_para(self, node, section):
-        for sub_node in node["c"]:
-            self._handle_node(sub_node, section)
-
-    def _handle_div(self, node, section):
-        for sub_node in node["c"][1]:
-            self._handle_node(sub_node, section)
-
-    def _handle_orderedlist(self, node, section):
-        for item in node["c"][1]:
-            for sub_node in item:
-                self._handle_node(sub_node, section)
-
-    def _handle_bulletlist(self, node, section):
-        for item in node["c"]:
-            for sub_node in item:
-                self._handle_node(sub_node, section)
+    def _handle_unknown(self, node):
+        panzertools.log(
+            "WARNING",
+            "PostprocessLinks: Unknown element {} in section {}: {}".format(
+                node["t"], self._section["id"], pformat(node)
+            ),
+        )
 
     def _handle_link(self, cmd, node, section):
         target = node["c"][2][0]
@@ -360,74 +201,77 @@ class PostprocessLinks:
 
 
 class ExtractSectionTree:
-    """Generate section tree from a flat document structure."""
+    """Generate section tree from a flat document structure.
+
+    Headers up to level :data:`MAX_LEVELS` split the nodes into nested
+    sections in a single pass. A stack holds the open sections from the top
+    level down to the current one, nodes are added to the innermost section.
+    """
 
     def __init__(self, nodes, level):
         self.nodes = nodes
         self.level = level
-        self.sections = []
-        self.section = {}
-        self.await_header = True
-        self.content = []
-        self.children = []
 
     def get_tree(self):
-        """Generate and return tree."""
-        section_idx = 0
-        for node in self.nodes:
-            if (
-                node["t"] == "Header"
-                and node["c"][0] == self.level
-                and self.level <= MAX_LEVELS
-            ):
-                self.await_header = False
-                if "title" in self.section:
-                    self.create_section()
-                    self.children = []
-                    self.section = {}
-                self.section["title"] = node["c"][2]
-                section_id = node["c"][1][0]
-
-                # short title
-                for name, val in node["c"][1][2]:
-                    if name == "short_title":
-                        self.section["short_title"] = val
-
-                # section type
-                if "exercises" in node["c"][1][1]:
-                    self.section["type"] = "exercises"
-                elif "test" in node["c"][1][1]:
-                    self.section["type"] = "test"
-
-                section_num = "{:03}".format(section_idx)
-                if section_id:
-                    # number sections so they are in consistent order
-                    self.section["id"] = "{}-{}".format(section_num, section_id)
-                else:
-                    # if there's no section id for some reason just use number
-                    self.section["id"] = section_num
-                section_idx += 1
-            else:
-                if self.await_header:
-                    self.content.append(node)
-                else:
-                    self.children.append(node)
+        """Generate and return tree.
 
-        if "title" in self.section:
-            self.create_section()
+        :rtype: tuple
+        :returns: sections and the nodes before the first section
+        """
+        content = []
+        sections = []
+        # open sections as (section, content, children), the root has none
+        stack = [(None, content, sections)]
+        for node in self.nodes:
+            if node["t"] == "Header":
+                header_level = node["c"][0]
+                depth = header_level - self.level + 1
+                if 0 < depth <= len(stack) and header_level <= MAX_LEVELS:
+                    while len(stack) > depth:
+                        self._close_section(stack)
+                    siblings = stack[-1][2]
+                    stack.append((self._create_section(node, len(siblings)), [], []))
+                    continue
+            stack[-1][1].append(node)
+
+        while len(stack) > 1:
+            self._close_section(stack)
+
+        return sections, content
 
-        return self.sections, self.content
+    @staticmethod
+    def _create_section(node, section_idx):
+        section = {"title": node["c"][2]}
+        section_id = node["c"][1][0]
+
+        # short title
+        for name, val in node["c"][1][2]:
+            if name == "short_title":
+                section["short_title"] = val
+
+        # section type
+        if "exercises" in node["c"][1][1]:
+            section["type"] = "exercises"
+        elif "test" in node["c"][1][1]:
+            section["type"] = "test"
+
+        section_num = "{:03}".format(section_idx)
+        if section_id:
+            # number sections so they are in consistent order
+            section["id"] = "{}-{}".format(section_num, section_id)
+        else:
+            # if there's no section id for some reason just use number
+            section["id"] = section_num
+        return section
 
-    def create_section(self):
-        """Save a section."""
-        subsections, subcontent = ExtractSectionTree(
-            self.children, self.level + 1
-        ).get_tree()
-        if subsections:
-            self.section["children"] = subsections
-        if subcontent:
-            self.section["content"] = subcontent
-        self.sections.append(self.section)
+    @staticmethod
+    def _close_section(stack):
+        section, content, children = stack.pop()
+        if children:
+            section["children"] = children
+        if content:
+            section["content"] = content
+        stack[-1][2].append(section)
 
 
 class CreateMapOfSectionIds:
@@ -466,25 +310,263 @@ class CreateMapOfSectionIds:
         return mm_section_id
 
 
+def iter_math(sections):
+    """Find Math nodes in the content of sections.
+
+    :param sections: Section tree
+    :type sections: list
+
+    :rtype: generator
+    :returns: pairs of list and index of Math nodes in it
+    """
+    return iter_nodes(sections, "Math")
+
+
+def iter_nodes(sections, node_type):
+    """Find nodes of a type in the content of sections.
+
+    :param sections: Section tree
+    :type sections: list
+    :param node_type: Pandoc element type (e.g. ``Math``)
+    :type node_type: str
+
+    :rtype: generator
+    :returns: pairs of list and index of the nodes in it
+    """
+    stack = list(sections)
+    while stack:
+        section = stack.pop()
+        stack.extend(section.get("children", []))
+        content_stack = [section.get("content", [])]
+        while content_stack:
+            obj = content_stack.pop()
+            if isinstance(obj, list):
+                for idx, item in enumerate(obj):
+                    if isinstance(item, dict) and item.get("t") == node_type:
+                        yield obj, idx
+                    elif isinstance(item, (list, dict)):
+                        content_stack.append(item)
+            elif isinstance(obj, dict):
+                content = obj.get("c")
+                if isinstance(content, (list, dict)):
+                    content_stack.append(content)
+
+
+def write_if_changed(path, text):
+    """Write a file unless it already has the same content.
+
+    Unchanged files keep their modification time, so rsync, CDN caches and
+    file watchers don't pick them up. Files are replaced atomically.
+
+    :param path: File path
+    :type path: str
+    :param text: File content
+    :type text: str
+
+    :rtype: bool
+    :returns: ``True`` if the file was written
+    """
+    data = text.encode(ENCODING)
+    try:
+        with open(path, "rb") as existing_file:
+            existing = hashlib.sha1(existing_file.read()).digest()
+    except FileNotFoundError:
+        existing = None
+    if existing == hashlib.sha1(data).digest():
+        return False
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "wb") as tmp_file:
+        tmp_file.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def math_key(tex):
+    """Return the key of a formula in the math table.
+
+    :param tex: TeX code
+    :type tex: str
+
+    :rtype: str
+    :returns: key (prefix of a SHA-1 hash)
+    """
+    return hashlib.sha1(tex.encode(ENCODING)).hexdigest()[:MATH_KEY_LENGTH]
+
+
+class CreateMathTable:
+    """Collect unique formulas into a table and let Math nodes refer to it.
+
+    Every Math node is wrapped in a Span with a ``data-math`` attribute
+    holding the content hash of the formula, the formula itself is moved to
+    the table. The table maps hashes to the formula and its number of
+    occurrences, so a frontend can typeset each formula once.
+    """
+
+    def __init__(self, sections):
+        self.sections = sections
+        self.table = {}
+
+    def create(self):
+        """Replace formulas by references and return the table."""
+        for nodes, idx in iter_math(self.sections):
+            nodes[idx] = self._reference(nodes[idx])
+        return self.table
+
+    def _reference(self, node):
+        math_type, tex = node["c"]
+        key = math_key(tex)
+        try:
+            self.table[key]["count"] += 1
+        except KeyError:
+            self.table[key] = {"tex": tex, "count": 1}
+        return {
+            "t": "Span",
+            "c": [
+                ["", ["math"], [["data-math", key]]],
+                [{"t": "Math", "c": [math_type, ""]}],
+            ],
+        }
+
+
+class PrerenderMath:
+    """Render all unique formulas with an external renderer command.
+
+    See :mod:`innoconv_mintmod.prerender`. Results are keyed like the math
+    table with separate entries for inline and display math.
+    """
+
+    def __init__(self, sections, renderer):
+        self.sections = sections
+        self.renderer = renderer
+
+    def render(self):
+        """Render formulas and return the rendered markup."""
+        formulas = set()
+        for nodes, idx in iter_math(self.sections):
+            math_type, tex = nodes[idx]["c"]
+            formulas.add(Formula(tex, math_type["t"] == "DisplayMath"))
+        rendered = {}
+        for formula, output in self.renderer.render(formulas).items():
+            mode = "display" if formula.display else "inline"
+            rendered.setdefault(math_key(formula.tex), {})[mode] = output
+        return rendered
+
+
+class RenderTikz:
+    """Render TikZ figures to SVG files with an external renderer command.
+
+    See :mod:`innoconv_mintmod.prerender`. The URL of the SVG file is added
+    to the ``tikz`` CodeBlock as ``data-svg`` attribute. The code is taken
+    from the CodeBlock or from the asset referenced by its ``src`` attribute.
+    """
+
+    def __init__(self, sections, renderer, assets_dir):
+        self.sections = sections
+        self.renderer = renderer
+        self.assets_dir = assets_dir
+
+    def render(self):
+        """Render figures and reference them in the CodeBlocks.
+
+        :rtype: int
+        :returns: number of CodeBlocks that got an SVG file
+        """
+        blocks = []
+        for nodes, idx in iter_nodes(self.sections, "CodeBlock"):
+            attrs, code = nodes[idx]["c"]
+            if "tikz" in attrs[1]:
+                blocks.append((attrs, code or self._read_asset(attrs)))
+        paths = self.renderer.render_paths(code for _, code in blocks if code)
+        count = 0
+        for attrs, code in blocks:
+            try:
+                path = paths[code]
+            except KeyError:
+                continue
+            url = "{}/{}".format(TIKZ_ASSETS_URL, os.path.basename(path))
+            attrs[2].append(["data-svg", url])
+            count += 1
+        return count
+
+    def _read_asset(self, attrs):
+        for key, value in attrs[2]:
+            if key == "src" and self.assets_dir:
+                path = os.path.join(self.assets_dir, os.path.basename(value))
+                with open(path, "r", encoding=ENCODING) as asset_file:
+                    return asset_file.read()
+        return None
+
+
 class WriteSections:
-    """Write sections to individual files and remove content from TOC tree."""
+    """Write sections to individual files and remove content from TOC tree.
+
+    For Markdown output sections are written by
+    :class:`~innoconv_mintmod.markdown_writer.MarkdownWriter` unless ``native``
+    is off or they contain elements it doesn't support. The remaining
+    sections are converted in batches by a single pandoc process per worker.
+    The contents of a batch are joined into one document, separated by
+    delimiter blocks, and the metadata of all its sections is passed as a
+    list. The output is split at the delimiters and
+    every section gets its own YAML header again.
+    """
 
     #: Timeout for pandoc process
     PANDOC_TIMEOUT = 120
 
-    def __init__(self, sections, outdir_base, output_format):
+    #: Pandoc API version of section documents
+    PANDOC_API_VERSION = [1, 22]
+
+    def __init__(self, sections, outdir_base, output_format, jobs=1, native=True):
         self.sections = sections
         self.outdir_base = outdir_base
         self.output_format = output_format
+        self.jobs = max(jobs, 1)
+        self.native = native
 
     def write_sections(self):
-        """Write all sections."""
+        """Write all sections.
+
+        Directories are created in order before sections are converted and
+        written by up to ``jobs`` concurrent workers. Files whose content
+        didn't change are left alone.
+        """
+        entries = []
         for idx, section in enumerate(self.sections):
-            self._write_section(section, self.outdir_base, 1, idx == 0)
+            self._collect_section(section, self.outdir_base, 1, entries, idx == 0)
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            if self.output_format == "markdown":
+                outputs = self._convert_sections_to_markdown(
+                    [
+                        (content, self._markdown_meta(section))
+                        for section, _, content in entries
+                    ],
+                    executor,
+                )
+            else:
+                outputs = [content for _, _, content in entries]
+            paths = [filepath for _, filepath, _ in entries]
+            written = 0
+            for (section, _, _), changed in zip(
+                entries, executor.map(self._write_file, paths, outputs)
+            ):
+                if changed:
+                    written += 1
+                    panzertools.log("INFO", "Wrote section {}".format(section["id"]))
+        panzertools.log(
+            "INFO",
+            "Wrote {} sections, {} unchanged.".format(written, len(entries) - written),
+        )
         return self.sections
 
-    def _write_section(self, section, outdir, depth, root=False):
-        """Write a single section to a JSON file."""
+    def _write_file(self, filepath, output):
+        """Write converted section (JSON content is serialized here)."""
+        if self.output_format != "markdown":
+            output = json.dumps(output)
+        return write_if_changed(filepath, output)
+
+    def _collect_section(self, section, outdir, depth, entries, root=False):
+        """Create the directory of a section and remember its content."""
         if depth > MAX_LEVELS:
             return
 
@@ -501,57 +583,155 @@ class WriteSections:
             content = []
 
         filename = "content.{}".format(OUTPUT_FORMAT_EXT_MAP[self.output_format])
-        filepath = os.path.join(outdir_section, filename)
+        entries.append((section, os.path.join(outdir_section, filename), content))
 
-        if self.output_format == "markdown":
-            try:
-                section_type = section["type"]
-            except KeyError:
-                section_type = None
-            try:
-                short_title = section["short_title"]
-            except KeyError:
-                short_title = None
-            output = self._convert_section_to_markdown(
-                content, section["title"], short_title, section_type
-            )
-            with open(filepath, "w") as sfile:
-                sfile.write(output)
-        elif self.output_format == "json":
-            with open(filepath, "w") as sfile:
-                json.dump(content, sfile)
-        panzertools.log("INFO", "Wrote section {}".format(section["id"]))
+        for subsection in section.get("children", []):
+            self._collect_section(subsection, outdir_section, depth + 1, entries)
+
+    @staticmethod
+    def _markdown_meta(section):
+        """Return the metadata of a section as pandoc meta values."""
+        meta = {"title": {"t": "MetaInlines", "c": section["title"]}}
+        if "short_title" in section:
+            meta["short_title"] = {
+                "t": "MetaInlines",
+                "c": panzertools.destringify(section["short_title"]),
+            }
+        if "type" in section:
+            meta["type"] = {
+                "t": "MetaInlines",
+                "c": [{"t": "Str", "c": section["type"]}],
+            }
+        return meta
+
+    def _convert_sections_to_markdown(self, items, executor):
+        """Convert JSON sections to markdown format.
+
+        Sections are written by :class:`MarkdownWriter` if possible. The
+        others are split into one batch per worker, each batch is converted
+        by a single pandoc process. Sections with footnotes or headers are
+        converted on their own as pandoc moves notes to the end of the
+        document and tracks header identifiers across the whole document (it
+        would leave out identifiers that only differ from the automatic ones
+        due to headers of other sections).
+        """
+        outputs, batch, single = self._write_native(items)
+        panzertools.log(
+            "INFO",
+            "Converting {} of {} sections with pandoc.".format(
+                len(batch) + len(single), len(items)
+            ),
+        )
+
+        chunks = self._chunks(batch)
+        single_outputs = executor.map(
+            lambda idx: self._convert_section_to_markdown(*items[idx]), single
+        )
+        chunk_outputs = executor.map(
+            lambda chunk: self._convert_batch([items[idx] for idx in chunk]), chunks
+        )
+        for idx, output in zip(single, single_outputs):
+            outputs[idx] = output
+        for chunk, output in zip(chunks, chunk_outputs):
+            for idx, section_output in zip(chunk, output):
+                outputs[idx] = section_output
+        return outputs
+
+    def _chunks(self, batch):
+        """Split section indices into one chunk per worker."""
+        chunk_size = max(1, -(-len(batch) // self.jobs))
+        chunks = []
+        for start in range(0, len(batch), chunk_size):
+            end = start + chunk_size
+            chunks.append(batch[start:end])
+        return chunks
+
+    def _write_native(self, items):
+        """Write sections with :class:`MarkdownWriter` if possible.
+
+        Returns the outputs (``None`` for sections left to pandoc) and the
+        indices of the sections pandoc converts in batches and on their own.
+        """
+        outputs = [None] * len(items)
+        batch = []
+        single = []
+        for idx, (content, meta) in enumerate(items):
+            if self.native:
+                try:
+                    outputs[idx] = MarkdownWriter().write(content, meta)
+                    continue
+                except UnsupportedElement:
+                    pass
+            (single if self._needs_own_document(content) else batch).append(idx)
+        return outputs, batch, single
+
+    def _convert_batch(self, items):
+        """Convert JSON sections to markdown format using one pandoc process."""
+        delimiter = "<!-- innoconv-section {} {{}} -->".format(uuid.uuid4().hex)
+        blocks = []
+        for pos, (content, _) in enumerate(items):
+            blocks.append({"t": "RawBlock", "c": ["markdown", delimiter.format(pos)]})
+            blocks.extend(content)
+        meta = {
+            "sections": {
+                "t": "MetaList",
+                "c": [{"t": "MetaMap", "c": meta} for _, meta in items],
+            }
+        }
+        out = self._run_pandoc(blocks, meta)
 
         try:
-            for subsection in section["children"]:
-                self._write_section(subsection, outdir_section, depth + 1)
-        except KeyError:
-            pass
+            return self._split_markdown(out, delimiter, len(items))
+        except ValueError as err:
+            panzertools.log("WARNING", "Converting sections one by one: {}".format(err))
+            return [self._convert_section_to_markdown(*item) for item in items]
 
-    def _convert_section_to_markdown(self, content, title, short_title, section_type):
-        """Convert JSON section to markdown format using pandoc."""
-        pandoc_cmd = [
-            "pandoc",
-            "--markdown-headings=atx",
-            "--wrap=preserve",
-            "--columns=999",
-            "--standalone",
-            "--from=json",
-            "--to=markdown+yaml_metadata_block",
+    @staticmethod
+    def _split_markdown(out, delimiter, count):
+        """Split batched pandoc output into Markdown documents.
+
+        :raises ValueError: if the output doesn't contain ``count`` sections
+        """
+        match = re.match(r"---\n(.*?\n)---\n", out, re.DOTALL)
+        if not match:
+            raise ValueError("no YAML metadata block")
+        # keep all values as strings (e.g. a title "1")
+        metas = yaml.load(match.group(1), Loader=yaml.BaseLoader) or {}
+        metas = metas.get("sections", [])
+        prefix, suffix = delimiter.split("{}")
+        pattern = r"^{}(\d+){}\n".format(re.escape(prefix), re.escape(suffix))
+        body_start = match.end()
+        parts = re.split(pattern, out[body_start:], flags=re.MULTILINE)
+        positions = [str(pos) for pos in range(count)]
+        if len(metas) != count or parts[1::2] != positions:
+            raise ValueError("found {} of {} sections".format(len(metas), count))
+        return [
+            markdown_document(meta, body.strip("\n"))
+            for meta, body in zip(metas, parts[2::2])
         ]
-        meta = {"title": {"t": "MetaInlines", "c": title}}
-        if short_title is not None:
-            meta["short_title"] = {
-                "t": "MetaInlines",
-                "c": panzertools.destringify(short_title),
+
+    @staticmethod
+    def _needs_own_document(content):
+        """Return if a section contains footnotes or headers."""
+        found = []
+        walk(content, {"Note": found.append, "Header": found.append})
+        return bool(found)
+
+    def _convert_section_to_markdown(self, content, meta):
+        """Convert JSON section to markdown format using pandoc."""
+        return self._run_pandoc(content, meta)
+
+    def _run_pandoc(self, blocks, meta):
+        """Convert a JSON document to markdown format using pandoc."""
+        doc_json = json.dumps(
+            {
+                "blocks": blocks,
+                "pandoc-api-version": self.PANDOC_API_VERSION,
+                "meta": meta,
             }
-        if section_type is not None:
-            meta["type"] = {"t": "MetaInlines", "c": [{"t": "Str", "c": section_type}]}
-        section_json = json.dumps(
-            {"blocks": content, "pandoc-api-version": [1, 22], "meta": meta}
         ).encode(ENCODING)
-        proc = Popen(pandoc_cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE)
-        out, err = proc.communicate(input=section_json, timeout=self.PANDOC_TIMEOUT)
+        proc = Popen(PANDOC_MARKDOWN_COMMAND, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        out, err = proc.communicate(input=doc_json, timeout=self.PANDOC_TIMEOUT)
         out = out.decode(ENCODING)
         err = err.decode(ENCODING)
         if proc.returncode != 0:
@@ -612,8 +792,30 @@ class GenerateInnodoc:
             outdir = os.path.join(outdir, self.lang)
         os.makedirs(outdir, exist_ok=True)
 
+        # render formulas at build time
+        renderer_cmd = os.environ.get("INNOCONV_MATH_RENDERER")
+        if renderer_cmd:
+            self.prerender_math(sections, outdir, renderer_cmd)
+
+        # render TikZ figures to SVG
+        if os.environ.get("INNOCONV_TIKZ_RENDERER"):
+            self.render_tikz(sections)
+
+        # move formulas to a table (JSON output only)
+        if os.environ.get("INNOCONV_MATH_TABLE"):
+            if self.convert_to == "json":
+                self.write_math_table(sections, outdir)
+            else:
+                panzertools.log("WARNING", "Math table needs JSON output.")
+
         # write sections to file
-        sections = WriteSections(sections, outdir, self.convert_to).write_sections()
+        sections = WriteSections(
+            sections,
+            outdir,
+            self.convert_to,
+            jobs=int(os.environ.get("INNOCONV_JOBS", "1")),
+            native=os.environ.get("INNOCONV_MARKDOWN_WRITER") != "pandoc",
+        ).write_sections()
 
         if os.environ.get("INNOCONV_GENERATE_INNODOC_MARKDOWN"):
             # write metadata file
@@ -625,9 +827,10 @@ class GenerateInnodoc:
         else:
             # write TOC
             tocpath = os.path.join(outdir, "toc.json")
-            with open(tocpath, "w") as toc_file:
-                json.dump(sections, toc_file)
-            panzertools.log("INFO", "Wrote: {}".format(tocpath))
+            if write_if_changed(tocpath, json.dumps(sections)):
+                panzertools.log("INFO", "Wrote: {}".format(tocpath))
+            else:
+                panzertools.log("INFO", "Unchanged: {}".format(tocpath))
 
         # print toc tree
         if self.debug:
@@ -639,6 +842,54 @@ class GenerateInnodoc:
             "INFO", "Removed original pandoc output: {}".format(self.filepath)
         )
 
+    @staticmethod
+    def prerender_math(sections, outdir, renderer_cmd):
+        """Render formulas and write them to a sidecar file."""
+        renderer = MathRenderer(
+            renderer_cmd,
+            os.environ["INNOCONV_MATH_RENDER_CACHE"],
+            jobs=int(os.environ.get("INNOCONV_JOBS", "1")),
+        )
+        rendered = PrerenderMath(sections, renderer).render()
+        rendered_path = os.path.join(outdir, MATH_RENDERED_FILENAME)
+        with open(rendered_path, "w") as rendered_file:
+            json.dump(rendered, rendered_file, sort_keys=True)
+        panzertools.log(
+            "INFO", "Wrote: {} ({})".format(rendered_path, renderer.report())
+        )
+
+    @staticmethod
+    def render_tikz(sections):
+        """Render TikZ figures to SVG files next to the TikZ assets."""
+        svg_dir = os.environ["INNOCONV_TIKZ_SVG_DIR"]
+        renderer = TikzRenderer(
+            os.environ["INNOCONV_TIKZ_RENDERER"],
+            svg_dir,
+            preamble=os.environ.get("INNOCONV_TIKZ_PREAMBLE_FILE"),
+            jobs=int(os.environ.get("INNOCONV_JOBS", "1")),
+            timeout=float(os.environ["INNOCONV_TIKZ_TIMEOUT"]),
+        )
+        count = RenderTikz(sections, renderer, svg_dir).render()
+        panzertools.log(
+            "INFO",
+            "Rendered {} TikZ figures ({})".format(count, renderer.report()),
+        )
+
+    @staticmethod
+    def write_math_table(sections, outdir):
+        """Replace formulas in sections by references and write the table."""
+        table = CreateMathTable(sections).create()
+        math_path = os.path.join(outdir, MATH_TABLE_FILENAME)
+        with open(math_path, "w") as math_file:
+            json.dump(table, math_file, sort_keys=True)
+        occurrences = sum(entry["count"] for entry in table.values())
+        panzertools.log(
+            "INFO",
+            "Wrote: {} ({} formulas, {} occurrences)".format(
+                math_path, len(table), occurrences
+            ),
+        )
+
     def update_manifest(self, title, outdir):
         """Update ``manifest.yml`` file.
 
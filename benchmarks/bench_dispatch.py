@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Benchmark handler dispatch of the mintmod filter.
+
+A large document consisting of raw LaTeX elements is run through
+:meth:`MintmodFilterAction.filter`. The handlers used are cheap so dispatch
+overhead dominates. For comparison the former lookup (slugify, ``getattr``
+and environment lookups for every element) is timed as well.
+"""
+
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+
+# pylint: disable=wrong-import-position,protected-access
+import panflute as pf  # noqa: E402
+from slugify import slugify  # noqa: E402
+
+from innoconv_mintmod.mintmod_filter.filter_action import (  # noqa: E402
+    MintmodFilterAction,
+    _lookup,
+)
+
+#: Number of elements in the generated document
+ELEMENTS = 20000
+
+#: Number of runs (the fastest is reported)
+RUNS = 5
+
+#: Cheap commands
+COMMANDS = (r"\glqq", r"\grqq", r"\quad", r"\noindent", r"\newline")
+
+
+def legacy_lookup(handlers, name):
+    """Former handler lookup."""
+    bool(os.environ.get("INNOCONV_REMOVE_EXERCISES", False))
+    func = getattr(handlers, "handle_%s" % slugify(name), None)
+    bool(os.environ.get("INNOCONV_IGNORE_EXERCISES", False))
+    return func if callable(func) else None
+
+
+def measure(func):
+    """Return fastest wall time of ``func()`` in seconds."""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Run benchmark."""
+    doc = pf.Doc(metadata={"lang": "de"})
+    elems = [
+        pf.RawInline(COMMANDS[idx % len(COMMANDS)], format="latex")
+        for idx in range(ELEMENTS)
+    ]
+    doc.content.extend([pf.Para(*elems)])
+    names = [elem.text[1:] for elem in elems]
+    action = MintmodFilterAction()
+
+    def _filter():
+        for elem in elems:
+            action.filter(elem, doc)
+
+    def _legacy():
+        for name in names:
+            legacy_lookup(action._commands, name)
+
+    def _table():
+        for name in names:
+            _lookup(action._command_handlers, action._command_cache, name)
+
+    for label, func in (
+        ("filter()", _filter),
+        ("lookup (former)", _legacy),
+        ("lookup (dispatch table)", _table),
+    ):
+        seconds = measure(func)
+        print(
+            "{:<24} {:8.1f} ms {:8.2f} us/element".format(
+                label, seconds * 1000, seconds / ELEMENTS * 1e6
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Benchmark the finalization passes of the mintmod filter.
+
+A large document is cleaned up by walking it once per pass with
+:py:meth:`panflute.base.Element.walk` (as before) and with a single fused
+:class:`~innoconv_mintmod.visitor.Visitor` walk.
+"""
+
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+
+# pylint: disable=wrong-import-position
+import panflute as pf  # noqa: E402
+
+from innoconv_mintmod.constants import INDEX_LABEL_PREFIX  # noqa: E402
+from innoconv_mintmod.utils import (  # noqa: E402
+    delete_annotation,
+    delete_empty_paragraph,
+)
+from innoconv_mintmod.visitor import Visitor  # noqa: E402
+
+#: Number of sections in the generated document
+SECTIONS = 2000
+
+#: Number of runs (the fastest is reported)
+RUNS = 5
+
+
+def make_doc():
+    """Generate a document with empty paragraphs and annotations."""
+    blocks = []
+    for idx in range(SECTIONS):
+        blocks.append(pf.Header(pf.Str("Section {}".format(idx)), level=2))
+        blocks.append(pf.Div(pf.Para(), classes=[INDEX_LABEL_PREFIX]))
+        blocks.append(
+            pf.Div(
+                pf.Para(*[pf.Str("word") for _ in range(20)]),
+                pf.Para(),
+                pf.BulletList(
+                    *[pf.ListItem(pf.Plain(pf.Str("item"))) for _ in range(5)]
+                ),
+            )
+        )
+    return pf.Doc(*blocks)
+
+
+def measure(func):
+    """Return fastest wall time of ``func(doc)`` in seconds."""
+    timings = []
+    for _ in range(RUNS):
+        doc = make_doc()
+        start = time.perf_counter()
+        func(doc)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Run benchmark."""
+
+    def _separate(doc):
+        doc.walk(delete_empty_paragraph)
+        doc.walk(delete_annotation)
+
+    visitor = Visitor()
+    visitor.add_pass(delete_empty_paragraph, pf.Para)
+    visitor.add_pass(delete_annotation, pf.Div)
+
+    for label, func in (
+        ("separate doc.walk()", _separate),
+        ("fused Visitor.walk()", visitor.walk),
+    ):
+        print("{:<24} {:8.1f} ms".format(label, measure(func) * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+r"""Benchmark ``\ifttm`` removal.
+
+The streaming scanner is compared to the former single regular expression.
+Sources contain either regular ``\ifttm…\else…\fi`` blocks or blocks without
+an ``\else`` branch. The latter make the regular expression scan up to the end
+of the input for every block.
+"""
+
+import io
+import os
+import re
+import sys
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+
+# pylint: disable=wrong-import-position
+from innoconv_mintmod.mintmod_ifttm import remove_ifttm  # noqa: E402
+
+#: Number of runs per size (the fastest is reported)
+RUNS = 3
+
+#: Number of blocks in generated sources
+SIZES = (500, 1000, 2000, 4000)
+
+#: Generated sources by name
+BLOCKS = (
+    (
+        "with else",
+        "Some text with $x^2$ and a \\textbf{command}.\n"
+        "\\ifttm\\special{html:<p>}\\else\\vspace{1ex}\\fi\n",
+    ),
+    (
+        "without else",
+        "Some text with $x^2$ and a \\textbf{command}.\n"
+        "\\ifttm \\MUGraphics{img.png}{}{}\\fi\n",
+    ),
+)
+
+
+def regex_ifttm(source):
+    """Former implementation."""
+    return re.sub(
+        r"\\ifttm(.*?)\\else.*?\\fi([%\s\\])", r"\1\2", source, flags=re.DOTALL
+    )
+
+
+def scanner_ifttm(source):
+    """Streaming scanner."""
+    out = io.StringIO()
+    remove_ifttm(io.StringIO(source), out)
+    return out.getvalue()
+
+
+def measure(func, source):
+    """Return fastest wall time of ``func(source)`` in seconds."""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        func(source)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Run benchmark."""
+    for name, block in BLOCKS:
+        for size in SIZES:
+            source = block * size
+            print(
+                "{:<12} {:>5} KiB: regex {:9.1f} ms, scanner {:7.1f} ms".format(
+                    name,
+                    len(source) >> 10,
+                    measure(regex_ifttm, source) * 1000,
+                    measure(scanner_ifttm, source) * 1000,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
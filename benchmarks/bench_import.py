@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Benchmark CLI startup and library import time.
+
+Each command is run in a fresh interpreter. The bare interpreter startup is
+reported as reference and subtracted from the other timings.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+
+#: Number of runs per command (the fastest is reported)
+RUNS = 20
+
+COMMANDS = (
+    ("interpreter", ["-c", "pass"]),
+    ("import innoconv_mintmod", ["-c", "import innoconv_mintmod"]),
+    ("import innoconv_mintmod.__main__", ["-c", "import innoconv_mintmod.__main__"]),
+    ("innoconv-mintmod --help", ["-m", "innoconv_mintmod", "--help"]),
+    ("innoconv-mintmod --version", ["-m", "innoconv_mintmod", "--version"]),
+)
+
+
+def measure(args):
+    """Return fastest wall time of a Python command in seconds."""
+    env = os.environ.copy()
+    env["PYTHONPATH"] = ROOT_DIR
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable] + args, env=env, stdout=subprocess.DEVNULL, check=True
+        )
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Run benchmark."""
+    reference = None
+    for name, args in COMMANDS:
+        seconds = measure(args)
+        if reference is None:
+            reference = seconds
+            print("{:<36} {:8.1f} ms".format(name, seconds * 1000))
+        else:
+            print(
+                "{:<36} {:8.1f} ms (+{:.1f} ms)".format(
+                    name, seconds * 1000, (seconds - reference) * 1000
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Benchmark expansion of math commands with irregular arguments.
+
+Long matrix- and vector-heavy formulas are expanded by the former loop (that
+searched the remaining text again for every command and concatenated
+strings) and by :func:`~innoconv_mintmod.mintmod_filter.math.expand_irregular`.
+Formulas with nested commands are only expanded by the latter as the former
+loop didn't support them.
+"""
+
+import os
+import re
+import sys
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+
+# pylint: disable=wrong-import-position
+from innoconv_mintmod.constants import COMMANDS_IRREGULAR  # noqa: E402
+from innoconv_mintmod.mintmod_filter.math import expand_irregular  # noqa: E402
+from innoconv_mintmod.utils import parse_nested_args  # noqa: E402
+
+#: Number of runs (the fastest is reported)
+RUNS = 5
+
+#: Number of commands in generated formulas
+COMMANDS = (100, 1000, 10000)
+
+IRREG_MATH_CMDS = re.compile(
+    "({})".format("|".join(r"\\{}".format(cmd) for cmd in COMMANDS_IRREGULAR))
+)
+
+#: Formula parts with vectors and points
+VECTORS = (
+    r"\MVector{1\\-\tfrac{5}{2}\\\sqrt{2}} + "
+    r"\MPointThree{\frac{1}{2}}{3}{\sqrt{2}} + "
+    r"\MPointTwoAS{2}{1+\frac{\sqrt{3}}{2}} = "
+)
+
+#: Formula parts with commands nested in arguments
+NESTED = (
+    r"\MCases{\MVector{1\\0} & x > 0 \\ \MVector{0\\1} & x \leq 0} + "
+    r"\MPointTwo{\MVector{a\\b}}{\MPointTwoAS{c}{d}} = "
+)
+
+
+def legacy_expand(rest):
+    """Former implementation (without nested commands)."""
+    text = ""
+    while rest:
+        match = IRREG_MATH_CMDS.search(rest)
+        if match:
+            cmd_name = match.group()
+            start = match.start()
+            text += rest[:start]
+            start_index = start + len(cmd_name)
+            args_til_end = rest[start_index:]
+            cmd_args, rest = parse_nested_args(args_til_end)
+            sub = COMMANDS_IRREGULAR[cmd_name[1:]]
+            if isinstance(sub, dict):
+                sub = sub[len(cmd_args)]
+            text += sub.format(*cmd_args)
+        else:
+            text += rest
+            rest = None
+    return text
+
+
+def measure(func, *args):
+    """Return fastest wall time of ``func(*args)`` in seconds."""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Run benchmark."""
+    for count in COMMANDS:
+        formula = VECTORS * (count // 3) + "x"
+        assert expand_irregular(formula) == legacy_expand(formula)
+        print(
+            "vectors {:>5} commands ({:>7} chars): former {:8.2f} ms, "
+            "expander {:8.2f} ms".format(
+                count,
+                len(formula),
+                measure(legacy_expand, formula) * 1000,
+                measure(expand_irregular, formula) * 1000,
+            )
+        )
+    for count in COMMANDS:
+        formula = NESTED * (count // 7) + "x"
+        print(
+            "nested  {:>5} commands ({:>7} chars): expander {:8.2f} ms".format(
+                count, len(formula), measure(expand_irregular, formula) * 1000
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
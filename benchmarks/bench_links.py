@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Benchmark link rewriting of generate_innodoc.
+
+The section tree of a full course (as extracted from the Pandoc JSON output)
+is walked by :class:`CreateMapOfIds` and :class:`PostprocessLinks`, which use
+the table-driven :func:`~innoconv_mintmod.walker.walk`. A generic walk over
+all dicts and lists of the AST is measured for comparison.
+"""
+
+import copy
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, ".panzer", "postflight"))
+os.environ.setdefault("PANZER_SHARED", os.path.join(ROOT_DIR, ".panzer", "shared"))
+
+# pylint: disable=wrong-import-position,import-error
+from generate_innodoc import (  # noqa: E402
+    CreateMapOfIds,
+    CreateMapOfSectionIds,
+    PostprocessLinks,
+    iter_nodes,
+)
+
+#: Number of chapters, sections per chapter and subsections per section
+CHAPTERS = 10
+
+#: Number of paragraphs per subsection
+PARAGRAPHS = 20
+
+#: Number of runs (the fastest is reported)
+RUNS = 5
+
+
+def attr(elem_id="", classes=None, attrs=None):
+    """Return Pandoc attributes."""
+    return [elem_id, classes or [], attrs or []]
+
+
+def words(count):
+    """Return inlines of a sentence."""
+    inlines = []
+    for _ in range(count):
+        inlines.extend(({"t": "Str", "c": "word"}, {"t": "Space"}))
+    return inlines
+
+
+def cell(blocks):
+    """Return a table cell."""
+    return [attr(), {"t": "AlignDefault"}, 1, 1, blocks]
+
+
+def make_content(path):
+    """Return the content of a subsection."""
+    content = [{"t": "Header", "c": [3, attr("h-" + path), words(3)]}]
+    for idx in range(PARAGRAPHS):
+        elem_id = "{}-{}".format(path, idx)
+        content.append(
+            {
+                "t": "Para",
+                "c": words(10)
+                + [
+                    {"t": "Math", "c": [{"t": "InlineMath"}, "x^2"]},
+                    {"t": "Emph", "c": words(2)},
+                    {"t": "Span", "c": [attr(elem_id), words(2)]},
+                    {
+                        "t": "Link",
+                        "c": [
+                            attr(attrs=[["data-mref", elem_id]]),
+                            words(1),
+                            ["#" + elem_id, ""],
+                        ],
+                    },
+                ],
+            }
+        )
+    rows = [[attr(), [cell([{"t": "Plain", "c": words(2)}])] * 3]] * 3
+    content.append(
+        {
+            "t": "Div",
+            "c": [
+                attr("div-" + path, ["exercise"]),
+                [
+                    {"t": "BulletList", "c": [[{"t": "Plain", "c": words(3)}]] * 5},
+                    {
+                        "t": "Table",
+                        "c": [
+                            attr(),
+                            [None, []],
+                            [[{"t": "AlignDefault"}, {"t": "ColWidthDefault"}]] * 3,
+                            [attr(), rows[:1]],
+                            [[attr(), 0, [], rows]],
+                            [attr(), []],
+                        ],
+                    },
+                ],
+            ],
+        }
+    )
+    return content
+
+
+def make_sections():
+    """Generate the section tree of a course."""
+
+    def _section(path, children):
+        return {
+            "id": path.rsplit("/", 1)[-1],
+            "title": words(2),
+            "content": [] if children else make_content(path.replace("/", "-")),
+            "children": children,
+        }
+
+    return [
+        _section(
+            "c{}".format(chap),
+            [
+                _section(
+                    "c{}/s{}".format(chap, sec),
+                    [
+                        _section("c{}/s{}/u{}".format(chap, sec, sub), [])
+                        for sub in range(CHAPTERS)
+                    ],
+                )
+                for sec in range(CHAPTERS)
+            ],
+        )
+        for chap in range(CHAPTERS)
+    ]
+
+
+def measure(func):
+    """Return fastest wall time of ``func(sections)`` in seconds."""
+    sections = make_sections()
+    timings = []
+    for _ in range(RUNS):
+        tree = copy.deepcopy(sections)
+        start = time.perf_counter()
+        func(tree)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Run benchmark."""
+    sections = make_sections()
+    id_map = CreateMapOfIds(sections).create()
+    section_map = CreateMapOfSectionIds(sections).get_map()
+    nodes = sum(1 for _ in iter_nodes(sections, "Str"))
+    print("{} IDs, {} Str elements".format(len(id_map), nodes))
+
+    def _links(tree):
+        PostprocessLinks(tree, section_map, id_map).process()
+
+    # link rewriting logs every link
+    with open(os.devnull, "w") as devnull:
+        stderr, sys.stderr = sys.stderr, devnull
+        try:
+            for label, func in (
+                ("generic walk", lambda tree: sum(1 for _ in iter_nodes(tree, ""))),
+                ("CreateMapOfIds", lambda tree: CreateMapOfIds(tree).create()),
+                ("PostprocessLinks", _links),
+            ):
+                print("{:<24} {:8.1f} ms".format(label, measure(func) * 1000))
+        finally:
+            sys.stderr = stderr
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Benchmark math substitutions.
+
+A corpus of formulas is substituted by applying every rule of
+:data:`~innoconv_mintmod.constants.MATH_SUBSTITUTIONS` with :func:`re.sub`
+(as before) and with the compiled single-pass
+:class:`~innoconv_mintmod.substitution.Substitutions`.
+"""
+
+import os
+import re
+import sys
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+
+# pylint: disable=wrong-import-position
+from innoconv_mintmod.constants import MATH_SUBSTITUTIONS  # noqa: E402
+from innoconv_mintmod.mintmod_filter.math import MATH_SUBSTITUTER  # noqa: E402
+
+#: Number of runs (the fastest is reported)
+RUNS = 5
+
+#: How often the corpus is repeated
+REPEAT = 500
+
+#: Formulas as they occur in course sources (most contain no mintmod command)
+CORPUS = (
+    r"x",
+    r"f(x) = x^2 + 2x + 1",
+    r"\frac{a}{b} + \sqrt{c}",
+    r"\alpha + \beta = \gamma",
+    r"\sum_{k=1}^n k = \frac{n(n+1)}{2}",
+    r"\lim_{x\to\infty} \left(1 + \frac1x\right)^x = e",
+    r"x \in \R",
+    r"\N \subset \Z \subset \Q \subset \R \subset \C",
+    r"\MZahl{3}{14159}",
+    r"\int_0^1 x^2 \MD x = \frac13",
+    r"\MGeoStrecke{A}{B} = \MGeoStrecke{B}{C}",
+    r"\MoIl[\left] 0 \MIntvlSep 1 \MoIr[\right]",
+    r"\{ x \in \R \MCondSetSep x > 0 \}",
+    r"\Id(\MEU) \Rightarrow \Mvarphi",
+    r"\begin{MCaseEnv}x & x \geq 0 \\ -x & x < 0\end{MCaseEnv}",
+    r"\vec{a} \cdot \vec{b} = |\vec{a}|\,|\vec{b}| \cos\varphi",
+)
+
+
+def sequential(text):
+    """Former implementation."""
+    for repl in MATH_SUBSTITUTIONS:
+        text = re.sub(repl[0], repl[1], text)
+    return text
+
+
+def measure(func):
+    """Return fastest wall time of substituting the corpus in seconds."""
+    corpus = CORPUS * REPEAT
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        for formula in corpus:
+            func(formula)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Run benchmark."""
+    for formula in CORPUS:
+        assert MATH_SUBSTITUTER.sub(formula) == sequential(formula), formula
+    print("{} formulas".format(len(CORPUS) * REPEAT))
+    for label, func in (
+        ("sequential re.sub()", sequential),
+        ("Substitutions.sub()", MATH_SUBSTITUTER.sub),
+    ):
+        print("{:<24} {:8.1f} ms".format(label, measure(func) * 1000))
+
+
+if __name__ == "__main__":
+    main()
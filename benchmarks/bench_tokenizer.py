@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Benchmark parsing of LaTeX command arguments.
+
+The tokenizer is compared to the former character-by-character argument
+parser on deeply nested arguments and on long arguments with few groups.
+Expansion of math commands with irregular arguments is timed on formulas with
+many commands.
+"""
+
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+
+# pylint: disable=wrong-import-position
+from innoconv_mintmod.mintmod_filter.math import expand_irregular  # noqa: E402
+from innoconv_mintmod.utils import parse_nested_args  # noqa: E402
+
+#: Number of runs (the fastest is reported)
+RUNS = 5
+
+#: Nesting depths of generated arguments
+DEPTHS = (10, 100, 1000)
+
+#: Number of words in generated flat arguments
+WIDTHS = (10, 100, 1000)
+
+#: Number of irregular commands in generated formulas
+COMMANDS = (10, 100, 1000)
+
+
+def legacy_parse_nested_args(to_parse):
+    """Former implementation."""
+    pargs = []
+    if to_parse.startswith("{"):
+        stack = []
+        for i, cha in enumerate(to_parse):
+            if not stack and cha != "{":
+                break
+            if cha == "{":
+                stack.append(i)
+            elif cha == "}" and stack:
+                start = stack.pop()
+                if not stack:
+                    start_index = start + 1
+                    pargs.append(to_parse[start_index:i])
+        chars_to_remove = len("".join(pargs)) + 2 * len(pargs)
+        to_parse = to_parse[chars_to_remove:]
+    if not to_parse:
+        to_parse = None
+    return (pargs, to_parse)
+
+
+def nested(depth):
+    """Return three arguments nested ``depth`` levels deep."""
+    arg = "x"
+    for level in range(depth):
+        arg = r"\frac{%s}{%d}" % (arg, level)
+    return "{%s}" % arg * 3 + " rest"
+
+
+def wide(width):
+    """Return three arguments with ``width`` words and a few groups each."""
+    return "{%s}" % (r"some \emph{text} and $x^{2}$ " * width) * 3 + " rest"
+
+
+def measure(func, *args):
+    """Return fastest wall time of ``func(*args)`` in seconds."""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Run benchmark."""
+    cases = [("depth", depth, nested(depth)) for depth in DEPTHS]
+    cases += [("width", width, wide(width)) for width in WIDTHS]
+    for label, size, text in cases:
+        assert parse_nested_args(text) == legacy_parse_nested_args(text)
+        print(
+            "{} {:>5} ({:>6} chars): former {:8.2f} ms, tokenizer {:8.2f} ms".format(
+                label,
+                size,
+                len(text),
+                measure(legacy_parse_nested_args, text) * 1000,
+                measure(parse_nested_args, text) * 1000,
+            )
+        )
+    for count in COMMANDS:
+        formula = r"\MPointTwo[\Big]{\frac{1}{n}}{\sqrt{2}} + " * count
+        seconds = measure(expand_irregular, formula)
+        print(
+            "expand_irregular {:>5} commands: {:8.2f} ms".format(count, seconds * 1000)
+        )
+
+
+if __name__ == "__main__":
+    main()
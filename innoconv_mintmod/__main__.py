@@ -4,30 +4,29 @@
 
 import sys
 import argparse
-from panflute import debug
 
-from innoconv_mintmod.utils import get_panzer_bin
 from innoconv_mintmod.constants import (
+    DEFAULT_CACHE_DIR,
     DEFAULT_OUTPUT_DIR_BASE,
     DEFAULT_OUTPUT_FORMAT,
     OUTPUT_FORMAT_CHOICES,
     DEFAULT_INPUT_FORMAT,
     INPUT_FORMAT_CHOICES,
     DEFAULT_LANGUAGE_CODE,
+    DEFAULT_MARKDOWN_WRITER,
+    DEFAULT_MEMORY_HEADROOM,
+    DEFAULT_TIKZ_TIMEOUT,
     LANGUAGE_CODES,
+    MARKDOWN_WRITER_CHOICES,
+    MATH_MACROS_FILENAME,
+    MATH_TABLE_FILENAME,
+    TIKZ_ASSETS_URL,
 )
 import innoconv_mintmod.metadata as metadata
-from innoconv_mintmod.runner import InnoconvRunner
-
-PANZER_BIN = get_panzer_bin()
 
 INNOCONV_DESCRIPTION = """
   Convert mintmod LaTeX content.
-
-  Using panzer executable: "{}"
-""".format(
-    PANZER_BIN
-)
+"""
 
 INNOCONV_EPILOG = """
 Copyright (C) 2018 innoCampus, TU Berlin
@@ -52,6 +51,12 @@ def get_arg_parser():
     innoconv_argparser.add_argument(
         "-h", "--help", action="help", help="show this help message and exit"
     )
+    innoconv_argparser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s {}".format(metadata.__version__),
+        help="show program's version number and exit",
+    )
     innoconv_argparser.add_argument("source", help="content directory or file")
 
     innoconv_argparser.add_argument(
@@ -61,6 +66,11 @@ def get_arg_parser():
         help="output base directory",
     )
 
+    cache_dir_help = "directory of data kept between builds (not published)"
+    innoconv_argparser.add_argument(
+        "--cache-dir", default=DEFAULT_CACHE_DIR, help=cache_dir_help
+    )
+
     innoconv_argparser.add_argument(
         "-f",
         "--from",
@@ -79,6 +89,17 @@ def get_arg_parser():
         help="output format",
     )
 
+    markdown_writer_help = (
+        "writer for innoDoc Markdown output (pandoc is used for elements the "
+        "native writer doesn't support)"
+    )
+    innoconv_argparser.add_argument(
+        "--markdown-writer",
+        choices=MARKDOWN_WRITER_CHOICES,
+        default=DEFAULT_MARKDOWN_WRITER,
+        help=markdown_writer_help,
+    )
+
     innoconv_argparser.add_argument(
         "-l",
         "--language-code",
@@ -117,18 +138,112 @@ def get_arg_parser():
         help=generate_innodoc_help,
     )
 
+    flatten_input_help = r"inline \input files before parsing"
+    innoconv_argparser.add_argument(
+        "--flatten-input", action="store_true", help=flatten_input_help
+    )
+
+    remove_ifttm_help = r"remove \ifttm commands (keep the HTML branch)"
+    innoconv_argparser.add_argument(
+        "--remove-ifttm", action="store_true", help=remove_ifttm_help
+    )
+
+    _add_math_arguments(innoconv_argparser)
+    _add_tikz_arguments(innoconv_argparser)
+    _add_jobs_arguments(innoconv_argparser)
+
     return innoconv_argparser
 
 
+def _add_math_arguments(parser):
+    """Add math options to argument parser."""
+    no_math_cache_help = "don't reuse normalized math of earlier builds"
+    parser.add_argument("--no-math-cache", action="store_true", help=no_math_cache_help)
+
+    math_macros_help = (
+        "keep math macro aliases and write their MathJax/KaTeX definitions "
+        "to {}".format(MATH_MACROS_FILENAME)
+    )
+    parser.add_argument("--math-macros", action="store_true", help=math_macros_help)
+
+    math_table_help = (
+        "move formulas to a per-language {} table (JSON output only)".format(
+            MATH_TABLE_FILENAME
+        )
+    )
+    parser.add_argument("--math-table", action="store_true", help=math_table_help)
+
+    math_renderer_help = (
+        "command that renders a formula (TeX on stdin, markup on stdout) "
+        "at build time"
+    )
+    parser.add_argument("--math-renderer", metavar="COMMAND", help=math_renderer_help)
+
+
+def _add_tikz_arguments(parser):
+    """Add TikZ options to argument parser."""
+    tikz_assets_help = "write each distinct TikZ figure once to {}".format(
+        TIKZ_ASSETS_URL
+    )
+    parser.add_argument("--tikz-assets", action="store_true", help=tikz_assets_help)
+
+    tikz_renderer_help = (
+        "command that renders a TikZ figure (code on stdin, SVG on stdout) "
+        "at build time"
+    )
+    parser.add_argument("--tikz-renderer", metavar="COMMAND", help=tikz_renderer_help)
+
+    tikz_preamble_help = "LaTeX preamble file passed to the TikZ renderer"
+    parser.add_argument("--tikz-preamble", metavar="FILE", help=tikz_preamble_help)
+
+    tikz_timeout_help = "timeout for rendering a TikZ figure in seconds"
+    parser.add_argument(
+        "--tikz-timeout",
+        type=int,
+        default=DEFAULT_TIKZ_TIMEOUT,
+        metavar="SECONDS",
+        help=tikz_timeout_help,
+    )
+
+
+def _add_jobs_arguments(parser):
+    """Add parallelization options to argument parser."""
+    jobs_help = "number of fragments/chapters/sections that are converted in parallel"
+    parser.add_argument("-j", "--jobs", type=int, default=1, help=jobs_help)
+
+    min_jobs_help = "number of parallel jobs that is kept under memory pressure"
+    parser.add_argument("--min-jobs", type=int, default=1, help=min_jobs_help)
+
+    memory_headroom_help = "memory (in MiB) that parallel jobs keep available"
+    parser.add_argument(
+        "--memory-headroom",
+        type=int,
+        default=DEFAULT_MEMORY_HEADROOM,
+        help=memory_headroom_help,
+    )
+
+
 def parse_cli_args():
     """Parse command line arguments."""
     return vars(get_arg_parser().parse_args())
 
 
+def debug(msg):
+    """Print message to stderr."""
+    print(msg, file=sys.stderr)
+
+
 def main():
     """innoConv (mintmod) main entry point."""
     args = parse_cli_args()
 
+    # heavy modules and binary lookup are only needed for an actual conversion
+    # pylint: disable=import-outside-toplevel
+    from innoconv_mintmod.utils import get_panzer_bin
+    from innoconv_mintmod.runner import InnoconvRunner
+
+    debug('Using panzer executable: "{}"'.format(get_panzer_bin()))
+
     generate_innodoc_markdown = False
 
     if args["remove_exercises"] and not args["ignore_exercises"]:
@@ -158,7 +273,22 @@ def main():
         input_format=args["input_format"],
         output_format=args["output_format"],
         generate_innodoc_markdown=generate_innodoc_markdown,
+        markdown_writer=args["markdown_writer"],
         debug=args["debug"],
+        jobs=args["jobs"],
+        min_jobs=args["min_jobs"],
+        memory_headroom=args["memory_headroom"],
+        flatten_input=args["flatten_input"],
+        remove_ifttm=args["remove_ifttm"],
+        math_cache=not args["no_math_cache"],
+        math_macros=args["math_macros"],
+        math_table=args["math_table"],
+        math_renderer=args["math_renderer"],
+        tikz_assets=args["tikz_assets"],
+        tikz_renderer=args["tikz_renderer"],
+        tikz_preamble=args["tikz_preamble"],
+        tikz_timeout=args["tikz_timeout"],
+        cache_dir=args["cache_dir"],
     )
     filename_out = runner.run()
     debug("Build finished: {}".format(filename_out))
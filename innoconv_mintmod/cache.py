@@ -0,0 +1,158 @@
+"""Cache module
+
+A bounded least-recently-used cache for string results (e.g. normalized math)
+that counts hits and misses. The cache can be stored as JSON file and loaded
+again, so results are reused between processes and builds. A version string
+protects against reusing results that were computed by different rules.
+"""
+
+from collections import OrderedDict
+import fcntl
+import json
+import os
+import sys
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entries.
+
+    :param maxsize: Maximum number of entries
+    :type maxsize: int
+    :param version: Entries are only loaded from files of the same version
+    :type version: str
+    """
+
+    def __init__(self, maxsize, version=""):
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """Return the cached value for ``key`` or ``None``.
+
+        :param key: Key
+        :type key: str
+
+        :rtype: str
+        :returns: value
+        """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store a value.
+
+        :param key: Key
+        :type key: str
+        :param value: Value
+        :type value: str
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries and reset statistics."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        """Return the fraction of lookups that were hits.
+
+        :rtype: float
+        :returns: hit rate (``0.0`` if there were no lookups)
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def memory(self):
+        """Estimate the memory used by keys and values.
+
+        :rtype: int
+        :returns: size in bytes
+        """
+        return sys.getsizeof(self._entries) + sum(
+            sys.getsizeof(key) + sys.getsizeof(value)
+            for key, value in self._entries.items()
+        )
+
+    def report(self):
+        """Return a summary of the statistics.
+
+        :rtype: str
+        :returns: summary
+        """
+        return "{} hits, {} misses ({:.1%} hit rate), {} entries ({:.1f} KiB)".format(
+            self.hits,
+            self.misses,
+            self.hit_rate(),
+            len(self._entries),
+            self.memory() / 1024,
+        )
+
+    def load(self, path):
+        """Add entries stored in a JSON file.
+
+        Entries that are in the cache already are considered more recent.
+        Missing, broken and outdated files are ignored.
+
+        :param path: File path
+        :type path: str
+        """
+        try:
+            with open(path, "r") as cache_file:
+                stored = json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return
+        if not isinstance(stored, dict) or stored.get("version") != self.version:
+            return
+        self._merge(stored.get("entries", ()))
+
+    def save(self, path):
+        """Store the entries in a JSON file.
+
+        Entries already stored in the file are kept (as far as they fit). This
+        way processes can add their results to the same file, they're
+        serialized using a lock.
+
+        :param path: File path
+        :type path: str
+        """
+        with open("{}.lock".format(path), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.load(path)
+            tmp_path = "{}.tmp".format(path)
+            with open(tmp_path, "w") as cache_file:
+                json.dump(
+                    {"version": self.version, "entries": list(self._entries.items())},
+                    cache_file,
+                )
+            os.replace(tmp_path, path)
+
+    def _merge(self, entries):
+        """Add older entries (ordered from least to most recent)."""
+        entries = OrderedDict(
+            (key, value) for key, value in entries if key not in self._entries
+        )
+        entries.update(self._entries)
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        self._entries = entries
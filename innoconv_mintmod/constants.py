@@ -94,14 +94,24 @@ MATH_SUBSTITUTIONS = (
     # MCaseEnv
     (r"\\begin{MCaseEnv}", r"\\left\\lbrace\\begin{array}{rl}"),
     (r"\\end{MCaseEnv}", r"\\end{array}\\right."),
-    # preprocess '\MPointTwo[\Big]{}{}' -> '\MPointTwo{\Big}{}{}'
-    (r"\\MPoint(Two|Three)\[([^]]+)\]", r"\\MPoint\1{\2}"),
-    # preprocess '\MEinheit[]' -> '\MEinheit{}'
-    (r"\\MEinheit\[\]", r"\\MEinheit{}"),
+)
+
+#: Rewrite rules applied to LaTeX sources before they are parsed by Pandoc.
+#: Purely syntactic aliases are replaced so Pandoc parses them correctly the
+#: first time. Rules must not add or remove line breaks.
+SOURCE_REWRITES = (
+    # Pandoc fails on lists containing MExerciseItems
+    (r"\\(begin|end){MExerciseItems}", r"\\\1{enumerate}"),
+    # MCaseEnv
+    (r"\\begin{MCaseEnv}", r"\\left\\lbrace\\begin{array}{rl}"),
+    (r"\\end{MCaseEnv}", r"\\end{array}\\right."),
+    # MQuestionGroup only groups its content
+    (r"\\(begin|end){MQuestionGroup}", r""),
 )
 
 #: Math commands with irregular arguments, key=command-name,
-#: value=formatstring or value=dict (number of arguments, formatstring)
+#: value=formatstring or value=dict (number of arguments, formatstring),
+#: optional arguments are counted and come first
 COMMANDS_IRREGULAR = OrderedDict(
     (
         ("MVector", r"\begin{{pmatrix}}{}\end{{pmatrix}}"),
@@ -152,7 +162,6 @@ TIKZ_SUBSTITUTIONS = (
 #: Regular expressions
 REGEX_PATTERNS = {
     # latex parsing
-    "CMD": re.compile(r"\A\\([^\\\s{]+)(.*)\Z", re.DOTALL),
     "ENV": re.compile(
         r"\A\\begin{(?P<env_name>[^}]+)}(.+)" r"\\end{(?P=env_name)}\Z",
         re.DOTALL,
@@ -165,11 +174,6 @@ REGEX_PATTERNS = {
         "----- pandoc write -----",
         re.MULTILINE | re.DOTALL,
     ),
-    "IRREG_MATH_CMDS": re.compile(
-        "({})".format(
-            "|".join(r"\\{}".format(cmd) for cmd in list(COMMANDS_IRREGULAR.keys()))
-        )
-    ),
     "MATH_MCASEENV": re.compile("\begin{MCaseEnv}"),
 }
 
@@ -215,6 +219,9 @@ DEFAULT_LANGUAGE_CODE = LANGUAGE_CODES[0]
 #: Default innoconv output directory
 DEFAULT_OUTPUT_DIR_BASE = os.path.join(".", "innoconv_mintmod_output")
 
+#: Default directory of data kept between builds (not published)
+DEFAULT_CACHE_DIR = os.path.join(".", "innoconv_mintmod_cache")
+
 #: Default innoconv output format
 DEFAULT_OUTPUT_FORMAT = "markdown"
 
@@ -230,6 +237,12 @@ OUTPUT_FORMAT_EXT_MAP = {
 #: Output format choices
 OUTPUT_FORMAT_CHOICES = list(OUTPUT_FORMAT_EXT_MAP.keys())
 
+#: Markdown writer choices (pandoc is always used for unsupported elements)
+MARKDOWN_WRITER_CHOICES = ("native", "pandoc")
+
+#: Default Markdown writer
+DEFAULT_MARKDOWN_WRITER = "native"
+
 #: Default innoconv input format
 DEFAULT_INPUT_FORMAT = "latex+raw_tex"
 
@@ -242,6 +255,51 @@ ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
 #: panzer support directory
 PANZER_SUPPORT_DIR = os.path.join(ROOT_DIR, ".panzer")
 
+#: Filename for job timings of earlier builds (stored in cache directory)
+TIMINGS_FILENAME = "timings.json"
+
+#: Filename of handler statistics (stored in build directory)
+HANDLER_STATS_FILENAME = "handler-stats.json"
+
+#: Number of handlers listed in the statistics log
+HANDLER_STATS_LIMIT = 20
+
+#: Maximum number of normalized formulas kept in memory
+MATH_CACHE_SIZE = 20000
+
+#: Filename of normalized formulas of earlier builds (stored in cache directory)
+MATH_CACHE_FILENAME = "math-cache.json"
+
+#: Filename of the math macro configuration (stored in output folder)
+MATH_MACROS_FILENAME = "math-macros.json"
+
+#: Filename of the table of unique formulas (stored per language)
+MATH_TABLE_FILENAME = "math.json"
+
+#: Filename of formulas rendered at build time (stored per language)
+MATH_RENDERED_FILENAME = "math-rendered.json"
+
+#: Directory of rendered formulas of earlier builds (stored in cache directory)
+MATH_RENDER_CACHE_DIRNAME = "math-render"
+
+#: URL of TikZ assets (relative to the output folder)
+TIKZ_ASSETS_URL = "_static/tikz"
+
+#: Default timeout for rendering a single TikZ figure (in seconds)
+DEFAULT_TIKZ_TIMEOUT = 60
+
+#: Filename for flattened source (stored in build directory)
+FLATTENED_FILENAME = "flattened.tex"
+
+#: Filename for preprocessed source (stored in build directory)
+PREPROCESSED_FILENAME = "preprocessed.tex"
+
+#: Filename for source map of flattened source (stored in build directory)
+SOURCE_MAP_FILENAME = "sourcemap.json"
+
+#: Default memory that parallel jobs keep available (in MiB)
+DEFAULT_MEMORY_HEADROOM = 1024
+
 #: timeout for panzer child-process (in seconds)
 PANZER_TIMEOUT = 1800
 
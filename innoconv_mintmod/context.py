@@ -0,0 +1,201 @@
+"""Context module
+
+All state of a conversion is kept in a :class:`ConversionContext`. The context
+is bound to the document that is converted, so several conversions can run in
+one process (e.g. on threads) without interfering with each other.
+
+Fragments are parsed by panzer subprocesses. The context is handed over to
+them using environment variables (see :meth:`ConversionContext.to_environ`
+and :meth:`ConversionContext.from_environ`).
+"""
+
+import os
+
+#: Maximum nesting depth of fragment parsing
+MAX_DEPTH = 10
+
+
+class ConversionContext:
+    r"""State of a conversion.
+
+    :param lang: Language code
+    :type lang: str
+    :param current_dir: Directory of the file that is currently converted
+    :type current_dir: str
+    :param depth: Nesting depth of fragment parsing (``0`` for the top-level
+        process)
+    :type depth: int
+    :param remove_exercises: Remove exercises
+    :type remove_exercises: bool
+    :param ignore_exercises: Don't warn about unhandled exercises
+    :type ignore_exercises: bool
+    :param remove_ifttm: Remove ``\ifttm`` commands from files that are read
+    :type remove_ifttm: bool
+    :param math_macros: Keep math macro aliases (they're defined in the
+        MathJax/KaTeX configuration)
+    :type math_macros: bool
+    :param tikz_assets_dir: Directory TikZ code is written to (instead of
+        inlining it)
+    :type tikz_assets_dir: str
+    """
+
+    # pylint: disable=too-many-arguments,too-many-instance-attributes
+    # (one attribute per conversion option plus the per-document state)
+
+    def __init__(
+        self,
+        lang=None,
+        current_dir=None,
+        depth=0,
+        remove_exercises=False,
+        ignore_exercises=False,
+        remove_ifttm=False,
+        math_macros=False,
+        tikz_assets_dir=None,
+    ):
+        self.lang = lang
+        self.current_dir = current_dir
+        self.depth = depth
+        self.remove_exercises = remove_exercises
+        self.ignore_exercises = ignore_exercises
+        self.remove_ifttm = remove_ifttm
+        self.math_macros = math_macros
+        self.tikz_assets_dir = tikz_assets_dir
+        # elements that later elements refer to (e.g. label, points)
+        self.remembered = {}
+        # fragments parsed ahead of time (see prefetch_fragments)
+        self.prefetched = {}
+
+    @classmethod
+    def from_environ(cls, environ=None):
+        """Create a context from environment variables.
+
+        :param environ: Environment (defaults to :data:`os.environ`)
+        :type environ: dict
+
+        :rtype: :class:`ConversionContext`
+        :returns: context
+        """
+        if environ is None:
+            environ = os.environ
+        return cls(
+            current_dir=environ.get("INNOCONV_MINTMOD_CURRENT_DIR"),
+            depth=int(environ.get("INNOCONV_RECURSION_DEPTH", "0")),
+            remove_exercises=bool(environ.get("INNOCONV_REMOVE_EXERCISES")),
+            ignore_exercises=bool(environ.get("INNOCONV_IGNORE_EXERCISES")),
+            remove_ifttm=bool(environ.get("INNOCONV_REMOVE_IFTTM")),
+            math_macros=bool(environ.get("INNOCONV_MATH_MACROS")),
+            tikz_assets_dir=environ.get("INNOCONV_TIKZ_ASSETS_DIR"),
+        )
+
+    def to_environ(self, environ):
+        """Store the context in environment variables.
+
+        :param environ: Environment that is updated
+        :type environ: dict
+        """
+        environ["INNOCONV_RECURSION_DEPTH"] = str(self.depth)
+        if self.current_dir is not None:
+            environ["INNOCONV_MINTMOD_CURRENT_DIR"] = self.current_dir
+        if self.tikz_assets_dir is not None:
+            environ["INNOCONV_TIKZ_ASSETS_DIR"] = self.tikz_assets_dir
+        else:
+            environ.pop("INNOCONV_TIKZ_ASSETS_DIR", None)
+        for key, flag in (
+            ("INNOCONV_REMOVE_EXERCISES", self.remove_exercises),
+            ("INNOCONV_IGNORE_EXERCISES", self.ignore_exercises),
+            ("INNOCONV_REMOVE_IFTTM", self.remove_ifttm),
+            ("INNOCONV_MATH_MACROS", self.math_macros),
+        ):
+            if flag:
+                environ[key] = "1"
+            else:
+                environ.pop(key, None)
+
+    def child(self, current_dir=None):
+        """Create the context of a nested fragment.
+
+        :param current_dir: Directory of the fragment (defaults to the
+            current directory of this context)
+        :type current_dir: str
+
+        :rtype: :class:`ConversionContext`
+        :returns: context
+
+        :raises RuntimeError: if the maximum nesting depth is exceeded
+        """
+        if self.depth > MAX_DEPTH:
+            raise RuntimeError("Panzer recursion depth exceeded!")
+        return ConversionContext(
+            lang=self.lang,
+            current_dir=self.current_dir if current_dir is None else current_dir,
+            depth=self.depth + 1,
+            remove_exercises=self.remove_exercises,
+            ignore_exercises=self.ignore_exercises,
+            remove_ifttm=self.remove_ifttm,
+            math_macros=self.math_macros,
+            tikz_assets_dir=self.tikz_assets_dir,
+        )
+
+    def remember(self, key, elem):
+        """Rememember an element for later.
+
+        :param key: Key under which element is stored
+        :type key: str
+        :param elem: Element to remember
+        :type elem: :py:class:`panflute.base.Element`
+        """
+        self.remembered[key] = elem
+
+    def get_remembered(self, key, keep=False):
+        """Retrieve rememembered element and forget it.
+
+        :param key: Key under which element is stored
+        :type key: str
+        :param keep: If value should be kept after retrieving
+        :type keep: bool
+
+        :rtype: :py:class:`panflute.base.Element`
+        :returns: The remembered element or `None`
+        """
+        if keep:
+            return self.remembered.get(key)
+        return self.remembered.pop(key, None)
+
+
+def bind_context(doc, context):
+    """Bind a context to a document.
+
+    :param doc: Document
+    :type doc: :py:class:`panflute.elements.Doc`
+    :param context: Context
+    :type context: :class:`ConversionContext`
+    """
+    doc.conversion_context = context
+
+
+def get_context(doc, default=None):
+    """Return the context bound to a document.
+
+    If there is none, ``default`` (or a context created from environment
+    variables) is bound to the document.
+
+    :param doc: Document
+    :type doc: :py:class:`panflute.elements.Doc`
+    :param default: Context to bind if there is none
+    :type default: :class:`ConversionContext`
+
+    :rtype: :class:`ConversionContext`
+    :returns: context
+    """
+    try:
+        return doc.conversion_context
+    except AttributeError:
+        context = default if default is not None else ConversionContext.from_environ()
+        if context.lang is None:
+            try:
+                context.lang = doc.metadata["lang"].text
+            except (AttributeError, KeyError):
+                pass
+        bind_context(doc, context)
+        return context
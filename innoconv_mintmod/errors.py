@@ -3,3 +3,7 @@
 
 class ParseError(ValueError):
     """Raised when a mintmod command cannot be parsed."""
+
+
+class UnsupportedElement(ValueError):
+    """Raised when an element cannot be written by the native Markdown writer."""
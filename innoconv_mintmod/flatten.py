@@ -0,0 +1,265 @@
+r"""Flatten module
+
+Recursively inline ``\input`` commands into one flattened source. This way
+Pandoc parses the whole course once instead of running a nested panzer
+process for every included file.
+
+``\MDirectRouletteExercises`` reads its file relative to the file it occurs
+in. In the flattened source these paths are replaced by absolute paths.
+
+Source rewrite rules (:mod:`innoconv_mintmod.rewrite`) are applied to every
+file.
+
+A :class:`SourceMap` records which file and line every part of the flattened
+source came from so that error messages can point to the original files.
+"""
+
+import bisect
+import json
+import os
+import re
+
+from innoconv_mintmod.errors import ParseError
+from innoconv_mintmod.mintmod_ifttm import IfttmScanner
+from innoconv_mintmod.rewrite import rewrite_source
+
+#: Commands that are handled by the flattener
+FLATTEN_CMDS = re.compile(r"\\(?P<cmd>input|MDirectRouletteExercises){(?P<arg>[^}]+)}")
+
+#: Line/column information in Pandoc error messages
+LINE_INFO = re.compile(r"\(line (?P<line>\d+), column (?P<column>\d+)\)")
+
+#: Header of a processing phase in panzer output
+PANZER_PHASE = re.compile(r"-{5} (?P<phase>[\w ]+?) -{5}")
+
+
+class SourceMap:
+    """Map lines of a flattened source to their original file and line.
+
+    Lines are counted starting with 1.
+    """
+
+    def __init__(self):
+        self._lines = []
+        self._origins = []
+
+    def add(self, line, path, orig_line):
+        """Record that flattened ``line`` is ``orig_line`` in file ``path``.
+
+        Subsequent lines are assumed to follow in the same file until the
+        next record.
+
+        :param line: Line in flattened source
+        :type line: int
+        :param path: Original file
+        :type path: str
+        :param orig_line: Line in original file
+        :type orig_line: int
+        """
+        if self._lines and self._lines[-1] == line:
+            self._origins[-1] = (path, orig_line)
+        else:
+            self._lines.append(line)
+            self._origins.append((path, orig_line))
+
+    def lookup(self, line):
+        """Return original file and line for a line of the flattened source.
+
+        :param line: Line in flattened source
+        :type line: int
+
+        :rtype: (str, int)
+        :returns: original file and line (``(None, line)`` if unknown)
+        """
+        idx = bisect.bisect_right(self._lines, line) - 1
+        if idx < 0:
+            return None, line
+        path, orig_line = self._origins[idx]
+        return path, orig_line + line - self._lines[idx]
+
+    def translate(self, message):
+        """Append original file and line to line information in a message.
+
+        :param message: Message (e.g. a Pandoc error)
+        :type message: str
+
+        :rtype: str
+        :returns: message with original locations
+        """
+
+        def _repl(match):
+            path, line = self.lookup(int(match.group("line")))
+            if path is None:
+                return match.group()
+            return "{} [{}:{}]".format(match.group(), path, line)
+
+        return LINE_INFO.sub(_repl, message)
+
+    def translate_output(self, lines):
+        """Translate line information in panzer output.
+
+        Only messages of the top-level Pandoc run refer to the flattened
+        source. Messages logged during the ``filter`` phase (including the
+        output of nested panzer runs for fragments) refer to fragments and
+        are passed on unchanged.
+
+        :param lines: Lines of panzer output
+        :type lines: iterable
+
+        :rtype: generator
+        :returns: translated lines
+        """
+        phase = None
+        for line in lines:
+            match = PANZER_PHASE.search(line)
+            if match:
+                phase = match.group("phase")
+            elif phase != "filter":
+                line = self.translate(line)
+            yield line
+
+    def save(self, path):
+        """Write source map as JSON file.
+
+        :param path: File path
+        :type path: str
+        """
+        with open(path, "w") as map_file:
+            json.dump(
+                [
+                    {"line": line, "file": origin[0], "orig_line": origin[1]}
+                    for line, origin in zip(self._lines, self._origins)
+                ],
+                map_file,
+                indent=1,
+            )
+
+
+def flatten(path, root_dir=None, source_map=None, remove_ifttm=False):
+    r"""Return the flattened source of a file.
+
+    :param path: Source file
+    :type path: str
+    :param root_dir: Directory ``\input`` paths are relative to (defaults to
+        directory of ``path``)
+    :type root_dir: str
+    :param source_map: Source map that is filled while flattening
+    :type source_map: :class:`SourceMap`
+    :param remove_ifttm: Remove ``\ifttm`` commands from every file
+    :type remove_ifttm: bool
+
+    :rtype: str
+    :returns: flattened source
+
+    :raises ParseError: if an included file includes itself
+    """
+    path = os.path.abspath(path)
+    if root_dir is None:
+        root_dir = os.path.dirname(path)
+    if source_map is None:
+        source_map = SourceMap()
+    state = _FlattenState(os.path.abspath(root_dir), source_map, remove_ifttm)
+    _flatten_file(path, state, ())
+    return "".join(state.out)
+
+
+class _FlattenState:
+    """Flattened output and the current line in it."""
+
+    def __init__(self, root_dir, source_map, remove_ifttm):
+        self.root_dir = root_dir
+        self.source_map = source_map
+        self.remove_ifttm = remove_ifttm
+        self.out = []
+        self.line = 1
+
+    def append(self, text):
+        """Append text that doesn't need a source map entry."""
+        self.out.append(text)
+        self.line += text.count("\n")
+
+    def append_source(self, text, path, src_line, line_sync):
+        """Append text that starts at ``src_line`` of ``path``.
+
+        ``line_sync`` holds ``(line, original line)`` pairs where lines of
+        the source were removed during preprocessing.
+        """
+        idx = bisect.bisect_right(line_sync, (src_line, float("inf")))
+        pos = 0
+        for sync_line, orig_line in line_sync[idx:]:
+            newlines = sync_line - src_line
+            if newlines > text.count("\n", pos):
+                break
+            for _ in range(newlines):
+                pos = text.index("\n", pos) + 1
+            self.append(text[:pos])
+            text, pos, src_line = text[pos:], 0, sync_line
+            self.source_map.add(self.line, path, orig_line)
+        self.append(text)
+
+
+def _flatten_file(path, state, stack):
+    """Append flattened content of ``path`` to the state."""
+    if path in stack:
+        raise ParseError("Recursive \\input of file {}".format(path))
+    with open(path, "r") as source_file:
+        content = source_file.read()
+
+    line_sync = []
+    if state.remove_ifttm:
+        scanner = IfttmScanner(track_lines=True)
+        content = scanner.feed(content) + scanner.close()
+        line_sync = scanner.line_sync
+    content = rewrite_source(content)
+
+    src_line = 1
+    pos = 0
+    state.source_map.add(state.line, path, 1)
+    for match in FLATTEN_CMDS.finditer(content):
+        start = match.start()
+        if _in_comment(content, start):
+            continue
+        state.append_source(content[pos:start], path, src_line, line_sync)
+        src_line += content.count("\n", pos, start)
+        pos = match.end()
+
+        arg = match.group("arg").strip()
+        if match.group("cmd") == "input":
+            _flatten_file(_resolve_input(state.root_dir, arg), state, stack + (path,))
+            if state.out and not state.out[-1].endswith("\n"):
+                state.append("\n")
+            # rest of the line continues in the including file
+            state.source_map.add(state.line, path, _orig_line(line_sync, src_line))
+        else:
+            arg_path = os.path.join(os.path.dirname(path), arg)
+            state.append("\\{}{{{}}}".format(match.group("cmd"), arg_path))
+    state.append_source(content[pos:], path, src_line, line_sync)
+
+
+def _orig_line(line_sync, src_line):
+    idx = bisect.bisect_right(line_sync, (src_line, float("inf"))) - 1
+    if idx < 0:
+        return src_line
+    sync_line, orig_line = line_sync[idx]
+    return orig_line + src_line - sync_line
+
+
+def _resolve_input(root_dir, arg):
+    filepath = os.path.join(root_dir, arg)
+    if not os.path.isfile(filepath) and os.path.isfile("{}.tex".format(filepath)):
+        filepath = "{}.tex".format(filepath)
+    return filepath
+
+
+def _in_comment(content, pos):
+    """Check if position is preceded by an unescaped ``%`` on its line."""
+    line_start = content.rfind("\n", 0, pos) + 1
+    idx = content.find("%", line_start, pos)
+    while idx != -1:
+        backslashes = 0
+        while idx - backslashes > line_start and content[idx - backslashes - 1] == "\\":
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return True
+        idx = content.find("%", idx + 1, pos)
+    return False
@@ -0,0 +1,190 @@
+"""Limiter module
+
+Memory use of panzer/Pandoc children varies a lot with the size of the
+fragment. The :class:`AdaptiveLimiter` watches available system memory and the
+memory used by child processes and grows or shrinks the number of concurrent
+workers between a minimum and a maximum accordingly.
+
+Memory information is read from ``/proc``. If it's not available the limiter
+allows the maximum number of workers.
+"""
+
+import os
+import threading
+
+from innoconv_mintmod.constants import DEFAULT_MEMORY_HEADROOM
+from innoconv_mintmod.utils import log
+
+#: Seconds to wait before re-checking memory while admission is throttled
+POLL_INTERVAL = 0.5
+
+#: Assumed memory use of a worker until a larger one was observed (in bytes)
+WORKER_RSS_ESTIMATE = 256 * 1024 * 1024
+
+
+class ProcMemoryProbe:
+    """Read memory information from ``/proc``."""
+
+    def __init__(self, proc_dir="/proc"):
+        self.proc_dir = proc_dir
+        self.page_size = os.sysconf("SC_PAGE_SIZE")
+
+    def available(self):
+        """Return available system memory in bytes.
+
+        :rtype: int
+        :returns: available memory (``None`` if unknown)
+        """
+        try:
+            with open(os.path.join(self.proc_dir, "meminfo"), "r") as meminfo:
+                for line in meminfo:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    def children_rss(self, pid=None):
+        """Return resident memory of all descendant processes in bytes.
+
+        :param pid: Parent process (default: current process)
+        :type pid: int
+
+        :rtype: int
+        :returns: resident memory
+        """
+        if pid is None:
+            pid = os.getpid()
+        parents = self._parent_map()
+        descendants = set()
+        found = {pid}
+        while found:
+            found = {child for child, ppid in parents.items() if ppid in found}
+            found -= descendants
+            descendants |= found
+        return sum(self._rss(child) for child in descendants)
+
+    def _parent_map(self):
+        parents = {}
+        try:
+            entries = os.listdir(self.proc_dir)
+        except OSError:
+            return parents
+        for entry in entries:
+            if not entry.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.proc_dir, entry, "stat"), "r") as stat:
+                    # comm may contain spaces, ppid is the 2nd field after it
+                    fields = stat.read().rsplit(")", 1)[1].split()
+                parents[int(entry)] = int(fields[1])
+            except (OSError, IndexError, ValueError):
+                pass
+        return parents
+
+    def _rss(self, pid):
+        try:
+            with open(os.path.join(self.proc_dir, str(pid), "statm"), "r") as statm:
+                return int(statm.read().split()[1]) * self.page_size
+        except (OSError, IndexError, ValueError):
+            return 0
+
+
+class AdaptiveLimiter:
+    """Limit the number of concurrent workers based on available memory.
+
+    Use it as context manager around the work of a single worker. Admission
+    blocks while the current limit is reached.
+
+    The limit starts at ``min_workers``. It grows by one if there's enough
+    memory for another worker on top of ``headroom`` and it shrinks by one if
+    available memory drops below ``headroom``. The memory needed by a worker is
+    the peak of the observed child RSS per active worker.
+
+    Workers that just started don't show up in available memory yet, so the
+    memory they're expected to use on top of the observed child RSS is
+    reserved before the limit grows.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # (worker bounds, memory settings and admission state)
+
+    def __init__(
+        self,
+        min_workers=1,
+        max_workers=1,
+        headroom=DEFAULT_MEMORY_HEADROOM * 1024 * 1024,
+        probe=None,
+    ):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.headroom = headroom
+        self.probe = probe or ProcMemoryProbe()
+        self.limit = self.min_workers
+        self.active = 0
+        self._worker_rss = WORKER_RSS_ESTIMATE
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def acquire(self):
+        """Wait until a worker may start."""
+        with self._condition:
+            while True:
+                self.adjust()
+                if self.active < self.limit:
+                    self.active += 1
+                    return
+                self._condition.wait(timeout=POLL_INTERVAL)
+
+    def release(self):
+        """Signal that a worker has finished."""
+        with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    def adjust(self):
+        """Grow or shrink the limit according to memory usage.
+
+        :rtype: int
+        :returns: new limit
+        """
+        available = self.probe.available()
+        if available is None:
+            self._set_limit(self.max_workers, "memory information not available")
+            return self.limit
+
+        rss = self.probe.children_rss() if self.active else 0
+        if self.active:
+            self._worker_rss = max(self._worker_rss, rss // self.active)
+        # memory of active workers that isn't in use yet and of a new one
+        reserved = max(0, self.active * self._worker_rss - rss) + self._worker_rss
+
+        if available < self.headroom:
+            self._set_limit(
+                self.limit - 1,
+                "available memory {} MiB below headroom".format(available >> 20),
+            )
+        elif available - reserved > self.headroom:
+            self._set_limit(
+                self.limit + 1,
+                "available memory {} MiB, {} MiB reserved, worker RSS {} MiB".format(
+                    available >> 20, reserved >> 20, self._worker_rss >> 20
+                ),
+            )
+        return self.limit
+
+    def _set_limit(self, limit, reason):
+        limit = min(max(limit, self.min_workers), self.max_workers)
+        if limit != self.limit:
+            log(
+                "Worker limit {} -> {} ({} active): {}".format(
+                    self.limit, limit, self.active, reason
+                )
+            )
+            self.limit = limit
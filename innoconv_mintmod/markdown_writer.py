@@ -0,0 +1,483 @@
+"""Markdown writer module
+
+Write sections of a Pandoc JSON AST as Markdown without running pandoc.
+
+The output follows pandoc's ``markdown+yaml_metadata_block`` writer (see
+:data:`PANDOC_MARKDOWN_COMMAND`) for the elements that occur in innoDoc
+content: headers, paragraphs, lists, code blocks, fenced divs, math, links,
+images and spans. Whenever an element (or a corner case like a paragraph
+that pandoc would escape) isn't covered, :class:`UnsupportedElement` is
+raised and the section has to be converted by pandoc instead.
+"""
+
+import re
+
+import yaml
+
+from innoconv_mintmod.errors import UnsupportedElement
+
+#: Pandoc command that the writer is compatible with
+PANDOC_MARKDOWN_COMMAND = [
+    "pandoc",
+    "--markdown-headings=atx",
+    "--wrap=preserve",
+    "--columns=999",
+    "--standalone",
+    "--from=json",
+    "--to=markdown+yaml_metadata_block",
+]
+
+#: Characters that are always escaped in text
+ESCAPED_CHARS = frozenset("\\`*[]$|^~<>")
+
+#: Typographic characters that are written as ASCII
+UNSMARTIFY = {
+    "‘": "'",
+    "’": "'",
+    "“": '"',
+    "”": '"',
+    "—": "---",
+    "–": "--",
+    "…": "...",
+}
+
+#: Lines that would be read as block markup (pandoc escapes them differently)
+REGEX_BLOCK_START = re.compile(
+    r"^(\s|[#>:%=]|[-+*](\s|$)|\(?(\d+|[a-zA-Z]|[ivxlcdmIVXLCDM]+)[.)](\s|$)"
+    r"|-+\s*$|\\$)"
+)
+
+#: URLs that may appear in ``[text](url)`` as is
+REGEX_SAFE_URL = re.compile(r"^[^\s()<>\\]*$")
+
+#: URLs that pandoc writes as autolink
+REGEX_URI = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:\S+$")
+
+
+def escape_text(text):
+    """Escape text like pandoc's Markdown writer.
+
+    :param text: Text of a Str element
+    :type text: str
+
+    :rtype: str
+    :returns: escaped text
+    """
+    if text.startswith("#"):
+        # depends on the rest of the line
+        raise UnsupportedElement("Text starting with #")
+    out = []
+    length = len(text)
+    idx = 0
+    while idx < length:
+        char = text[idx]
+        nxt = text[idx + 1] if idx + 1 < length else ""
+        if char in ESCAPED_CHARS or char == "_":
+            out.append("\\" + char)
+        elif char == "@" and (nxt.isalnum() or nxt in "_{"):
+            out.append("\\@")
+        elif char in "'\"":
+            out.append("\\" + char)
+        elif char == "-" and nxt == "-":
+            out.append("\\-")
+        elif char == "." and text.startswith("...", idx):
+            out.append("\\...")
+            idx += 3
+            continue
+        elif (
+            nxt == "_"
+            and char.isalnum()
+            and idx + 2 < length
+            and text[idx + 2].isalnum()
+        ):
+            # intraword underscores
+            end = idx + 3
+            out.append(text[idx:end])
+            idx = end
+            continue
+        else:
+            out.append(UNSMARTIFY.get(char, char))
+        idx += 1
+    return "".join(out)
+
+
+def stringify(inlines):
+    """Return the plain text of inlines (like pandoc's ``stringify``)."""
+    parts = []
+    for node in inlines:
+        node_type = node["t"]
+        if node_type in ("Str", "Code", "Math"):
+            parts.append(node["c"] if node_type == "Str" else node["c"][1])
+        elif node_type in ("Space", "SoftBreak", "LineBreak"):
+            parts.append(" ")
+        elif node_type in ("Emph", "Strong", "Strikeout", "SmallCaps"):
+            parts.append(stringify(node["c"]))
+        elif node_type in ("Span", "Quoted", "Link", "Image"):
+            parts.append(stringify(node["c"][1]))
+    return "".join(parts)
+
+
+def identifier(inlines):
+    """Return the automatic identifier of a header (``auto_identifiers``).
+
+    :param inlines: Header content
+    :type inlines: list
+
+    :rtype: str
+    :returns: identifier (may be empty)
+    """
+    text = "".join(
+        char
+        for char in stringify(inlines).lower()
+        if char.isalnum() or char in "_-." or char.isspace()
+    )
+    ident = "-".join(text.split())
+    for pos, char in enumerate(ident):
+        if char.isalpha():
+            return ident[pos:]
+    return ""
+
+
+def attributes(attrs, short=False):
+    """Return attributes as ``{#id .class key="value"}``.
+
+    :param attrs: Pandoc attributes
+    :type attrs: list
+    :param short: Write a single class without braces
+    :type short: bool
+
+    :rtype: str
+    :returns: attributes
+    """
+    elem_id, classes, key_values = attrs
+    if short and not elem_id and len(classes) == 1 and not key_values:
+        return classes[0]
+    parts = []
+    if elem_id:
+        parts.append("#" + elem_id)
+    parts.extend("." + cls for cls in classes)
+    for key, value in key_values:
+        value = value.replace("\\", "\\\\").replace('"', '\\"')
+        parts.append('{}="{}"'.format(key, value))
+    return "{{{}}}".format(" ".join(parts))
+
+
+def markdown_document(meta, body):
+    """Return a Markdown document with YAML metadata block.
+
+    :param meta: Metadata (strings)
+    :type meta: dict
+    :param body: Markdown content
+    :type body: str
+
+    :rtype: str
+    :returns: document
+    """
+    header = yaml.safe_dump(
+        meta, default_flow_style=False, allow_unicode=True, width=999
+    )
+    if not body:
+        return "---\n{}---\n".format(header)
+    return "---\n{}---\n\n{}\n".format(header, body)
+
+
+def _hang(marker, text):
+    """Prefix the first line with a list marker and indent the others."""
+    indent = " " * len(marker)
+    lines = text.split("\n")
+    return "\n".join(
+        [marker + lines[0]] + [indent + line if line else line for line in lines[1:]]
+    )
+
+
+class MarkdownWriter:
+    """Write Pandoc JSON elements as Markdown.
+
+    .. code-block:: python
+
+        try:
+            markdown = MarkdownWriter().write(blocks, meta)
+        except UnsupportedElement:
+            ...  # use pandoc
+    """
+
+    def __init__(self):
+        self._ids = set()
+        self._blocks_map = {
+            "BlockQuote": self._blockquote,
+            "BulletList": self._bulletlist,
+            "CodeBlock": self._codeblock,
+            "Div": self._div,
+            "Header": self._header,
+            "Null": lambda node: ("", False),
+            "OrderedList": self._orderedlist,
+            "Para": self._para,
+            "Plain": self._plain,
+            "RawBlock": self._rawblock,
+        }
+        self._inlines_map = {
+            "Code": self._code,
+            "Emph": lambda node: "*{}*".format(self._delimited(node["c"])),
+            "Image": self._image,
+            "LineBreak": lambda node: "\\\n",
+            "Link": self._link,
+            "Math": self._math,
+            "Quoted": self._quoted,
+            "RawInline": self._rawinline,
+            "SoftBreak": lambda node: "\n",
+            "Space": lambda node: " ",
+            "Span": self._span,
+            "Str": lambda node: escape_text(node["c"]),
+            "Strong": lambda node: "**{}**".format(self._delimited(node["c"])),
+        }
+
+    def write(self, blocks, meta):
+        """Write a standalone document.
+
+        :param blocks: Content
+        :type blocks: list
+        :param meta: Pandoc metadata (``MetaInlines`` and ``MetaString``)
+        :type meta: dict
+
+        :rtype: str
+        :returns: Markdown document
+
+        :raises UnsupportedElement: if the document can't be written
+        """
+        strings = {}
+        for key, value in meta.items():
+            if value["t"] == "MetaInlines":
+                strings[key] = self.inlines(value["c"])
+            elif value["t"] == "MetaString":
+                strings[key] = value["c"]
+            else:
+                raise UnsupportedElement(value["t"])
+        return markdown_document(strings, self.blocks(blocks))
+
+    def blocks(self, blocks):
+        """Write blocks.
+
+        :param blocks: Blocks
+        :type blocks: list
+
+        :rtype: str
+        :returns: Markdown
+
+        :raises UnsupportedElement: if a block can't be written
+        """
+        out = []
+        tight = False
+        prev_type = None
+        for block in blocks:
+            block_type = block["t"]
+            if prev_type in ("BulletList", "OrderedList") and (
+                block_type in ("BulletList", "OrderedList")
+                or block_type == "CodeBlock"
+                and block["c"][0] == ["", [], []]
+            ):
+                # pandoc separates these with a comment
+                raise UnsupportedElement("{} after list".format(block_type))
+            try:
+                handler = self._blocks_map[block_type]
+            except KeyError:
+                raise UnsupportedElement(block_type) from None
+            text, block_tight = handler(block)
+            prev_type = block_type
+            if not text:
+                continue
+            if out:
+                out.append("\n" if tight else "\n\n")
+            out.append(text)
+            tight = block_tight
+        return "".join(out)
+
+    def inlines(self, inlines):
+        """Write inlines.
+
+        :param inlines: Inlines
+        :type inlines: list
+
+        :rtype: str
+        :returns: Markdown
+
+        :raises UnsupportedElement: if an inline can't be written
+        """
+        out = []
+        for node in inlines:
+            try:
+                handler = self._inlines_map[node["t"]]
+            except KeyError:
+                raise UnsupportedElement(node["t"]) from None
+            out.append(handler(node))
+        return "".join(out)
+
+    # blocks
+
+    def _plain(self, node):
+        text = self.inlines(node["c"])
+        for line in text.split("\n"):
+            if REGEX_BLOCK_START.match(line):
+                raise UnsupportedElement("Paragraph starting with block markup")
+        return text, True
+
+    def _para(self, node):
+        content = node["c"]
+        if len(content) == 1 and content[0]["t"] == "Image":
+            attrs, alt, (src, title) = content[0]["c"]
+            if title.startswith("fig:"):
+                # implicit figure
+                content = [{"t": "Image", "c": [attrs, alt, [src, title[4:]]]}]
+        text, _ = self._plain({"t": "Para", "c": content})
+        return text, False
+
+    def _header(self, node):
+        level, attrs, content = node["c"]
+        text = self.inlines(content)
+        if not text or "\n" in text:
+            raise UnsupportedElement("Header")
+        auto_id = identifier(content) or "section"
+        if auto_id in self._ids:
+            num = 1
+            while "{}-{}".format(auto_id, num) in self._ids:
+                num += 1
+            auto_id = "{}-{}".format(auto_id, num)
+        self._ids.add(auto_id)
+        header = "{} {}".format("#" * level, text)
+        if attrs not in (["", [], []], [auto_id, [], []]):
+            header += " " + attributes(attrs)
+        return header, False
+
+    def _codeblock(self, node):
+        attrs, code = node["c"]
+        if attrs == ["", [], []]:
+            lines = code.rstrip("\n").split("\n")
+            return "\n".join("    " + line if line else line for line in lines), False
+        runs = [len(run) for run in re.findall(r"`+", code)]
+        fence = "`" * max([3] + [run + 1 for run in runs])
+        if not code.endswith("\n"):
+            code += "\n"
+        return (
+            "{0} {1}\n{2}{0}".format(fence, attributes(attrs, short=True), code),
+            False,
+        )
+
+    def _rawblock(self, node):
+        fmt, text = node["c"]
+        if fmt != "markdown":
+            raise UnsupportedElement("RawBlock {}".format(fmt))
+        return text, False
+
+    def _blockquote(self, node):
+        text = self.blocks(node["c"])
+        lines = text.split("\n")
+        return "\n".join("> " + line if line else ">" for line in lines), False
+
+    def _div(self, node):
+        attrs, content = node["c"]
+        if attrs == ["", [], []]:
+            # pandoc writes HTML
+            raise UnsupportedElement("Div without attributes")
+        text = self.blocks(content)
+        parts = ["::: " + attributes(attrs, short=True)]
+        if text:
+            parts.append(text)
+        parts.append(":::")
+        return "\n".join(parts), False
+
+    def _list_items(self, items, markers):
+        if not all(items):
+            raise UnsupportedElement("Empty list item")
+        tight = all(item[0]["t"] == "Plain" for item in items)
+        texts = [
+            _hang(marker, self.blocks(item)) for marker, item in zip(markers, items)
+        ]
+        return ("\n" if tight else "\n\n").join(texts), False
+
+    def _bulletlist(self, node):
+        items = node["c"]
+        return self._list_items(items, ["-   "] * len(items))
+
+    def _orderedlist(self, node):
+        (start, style, delim), items = node["c"]
+        if style["t"] not in ("DefaultStyle", "Decimal") or delim["t"] not in (
+            "DefaultDelim",
+            "Period",
+        ):
+            raise UnsupportedElement("OrderedList style")
+        markers = []
+        for num in range(start, start + len(items)):
+            markers.append("{:<3} ".format("{}.".format(num)))
+        return self._list_items(items, markers)
+
+    # inlines
+
+    def _delimited(self, inlines):
+        if not inlines or inlines[0]["t"] == "Space" or inlines[-1]["t"] == "Space":
+            raise UnsupportedElement("Emphasis with surrounding space")
+        return self.inlines(inlines)
+
+    def _code(self, node):
+        attrs, code = node["c"]
+        if "`" in code or not code.strip():
+            raise UnsupportedElement("Code")
+        text = "`{}`".format(code)
+        if attrs != ["", [], []]:
+            text += attributes(attrs)
+        return text
+
+    @staticmethod
+    def _math(node):
+        math_type, tex = node["c"]
+        if math_type["t"] == "DisplayMath":
+            return "$${}$$".format(tex)
+        if not tex or tex[0].isspace() or tex[-1].isspace():
+            raise UnsupportedElement("Math with surrounding space")
+        return "${}$".format(tex)
+
+    def _quoted(self, node):
+        quote_type, content = node["c"]
+        quote = '"' if quote_type["t"] == "DoubleQuote" else "'"
+        return "{0}{1}{0}".format(quote, self.inlines(content))
+
+    def _link(self, node):
+        attrs, content, (url, title) = node["c"]
+        if (
+            attrs == ["", [], []]
+            and not title
+            and content == [{"t": "Str", "c": url}]
+            and REGEX_URI.match(url)
+        ):
+            return "<{}>".format(url)
+        return self._link_text(attrs, self.inlines(content), url, title)
+
+    def _image(self, node):
+        attrs, alt, (src, title) = node["c"]
+        if alt == [{"t": "Str", "c": src}]:
+            alt = []
+        return "!" + self._link_text(attrs, self.inlines(alt), src, title)
+
+    @staticmethod
+    def _link_text(attrs, text, url, title):
+        if not REGEX_SAFE_URL.match(url) or '"' in title or "\\" in title:
+            raise UnsupportedElement("Link target")
+        target = url
+        if title:
+            target += ' "{}"'.format(title)
+        link = "[{}]({})".format(text, target)
+        if attrs != ["", [], []]:
+            link += attributes(attrs)
+        return link
+
+    def _span(self, node):
+        attrs, content = node["c"]
+        text = self.inlines(content)
+        if attrs == ["", [], []]:
+            return text
+        return "[{}]{}".format(text, attributes(attrs))
+
+    @staticmethod
+    def _rawinline(node):
+        fmt, text = node["c"]
+        if fmt != "markdown":
+            raise UnsupportedElement("RawInline {}".format(fmt))
+        return text
@@ -7,26 +7,32 @@ Handle mintmod LaTeX commands.
     command name.
 
     Example: ``handle_msection`` method will receive the command ``\MSection``.
+
+    Declare what a handler does (e.g. parse fragments) using the
+    :func:`~innoconv_mintmod.mintmod_filter.registry.handler` decorator.
 """
 
-from os import environ, getcwd, linesep
-from os.path import dirname, join
-import re
+import hashlib
+from os import getcwd, getpid, linesep, makedirs, replace
+from os.path import dirname, exists, join
 import panflute as pf
+from innoconv_mintmod.context import get_context
 from innoconv_mintmod.constants import (
     ELEMENT_CLASSES,
+    ENCODING,
     INDEX_ATTRIBUTE,
     INDEX_LABEL_PREFIX,
-    MATH_SUBSTITUTIONS,
     MINTMOD_SUBJECTS,
     REGEX_PATTERNS,
     SITE_UXID_PREFIX,
+    TIKZ_ASSETS_URL,
     TIKZ_SUBSTITUTIONS,
 )
 from innoconv_mintmod.utils import (
     block_wrap,
     destringify,
     parse_fragment,
+    read_source,
     log,
     get_remembered,
     to_inline,
@@ -37,6 +43,12 @@ from innoconv_mintmod.mintmod_filter.elements import (
     create_header,
     create_image,
 )
+from innoconv_mintmod.mintmod_filter.math import MATH_SUBSTITUTER
+from innoconv_mintmod.mintmod_filter.registry import handler
+from innoconv_mintmod.substitution import Substitutions
+
+#: Applies :data:`~innoconv_mintmod.constants.TIKZ_SUBSTITUTIONS` in one pass
+TIKZ_SUBSTITUTER = Substitutions(TIKZ_SUBSTITUTIONS)
 
 
 class Commands:
@@ -65,13 +77,19 @@ class Commands:
     # \input{...}
     # disabled in raw_tex mode since Pandoc 2.8, see pandoc#5673
 
+    @handler(spawns_fragment=True, reads_files=True)
     def handle_input(self, cmd_args, elem):
         r"""Handle ``\input`` command."""
+        context = get_context(elem.doc)
         filepath = join(getcwd(), cmd_args[0])
-        with open(filepath, "r") as input_file:
-            input_content = input_file.read()
-        environ["INNOCONV_MINTMOD_CURRENT_DIR"] = dirname(filepath)
-        return parse_fragment(input_content, elem.doc.metadata["lang"].text)
+        input_content = read_source(filepath, context=context)
+        context.current_dir = dirname(filepath)
+        return parse_fragment(
+            input_content,
+            elem.doc.metadata["lang"].text,
+            current_dir=dirname(filepath),
+            context=context,
+        )
 
     ###########################################################################
     # Sections
@@ -270,6 +288,7 @@ class Commands:
     ###########################################################################
     # Index
 
+    @handler(spawns_fragment=True)
     def handle_mentry(self, cmd_args, elem):
         r"""Handle ``\MEntry`` command.
 
@@ -281,11 +300,12 @@ class Commands:
 
         text = cmd_args[0]
         concept = cmd_args[1]
-        for repl in MATH_SUBSTITUTIONS:  # can contain LaTeX!
-            concept = re.sub(repl[0], repl[1], concept)
+        concept = MATH_SUBSTITUTER.sub(concept)  # can contain LaTeX!
         strong = pf.Strong()
         strong.content.extend(
-            parse_fragment(text, elem.doc.metadata["lang"].text)[0].content
+            parse_fragment(
+                text, elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+            )[0].content
         )
         span = pf.Span()
         span.attributes = {INDEX_ATTRIBUTE: concept}
@@ -302,8 +322,7 @@ class Commands:
             log("Warning: Expected Inline for MIndex: {}".format(cmd_args))
 
         concept = cmd_args[0]
-        for repl in MATH_SUBSTITUTIONS:  # can contain LaTeX!
-            concept = re.sub(repl[0], repl[1], concept)
+        concept = MATH_SUBSTITUTER.sub(concept)  # can contain LaTeX!
         span = pf.Span()
         span.attributes = {INDEX_ATTRIBUTE: concept, "hidden": "hidden"}
         return block_wrap(span, elem)
@@ -311,6 +330,7 @@ class Commands:
     ###########################################################################
     # Media
 
+    @handler(spawns_fragment=True)
     def handle_mgraphics(self, cmd_args, elem, add_desc=True):
         r"""Handle ``\MGraphics``.
 
@@ -321,6 +341,7 @@ class Commands:
         is_block = isinstance(elem, pf.Block)
         return create_image(cmd_args[0], cmd_args[2], elem, block=is_block)
 
+    @handler(spawns_fragment=True)
     def handle_mgraphicssolo(self, cmd_args, elem):
         r"""Handle ``\MGraphicsSolo``.
 
@@ -331,6 +352,7 @@ class Commands:
             cmd_args[0], cmd_args[0], elem, block=is_block, add_descr=False
         )
 
+    @handler(spawns_fragment=True)
     def handle_mugraphics(self, cmd_args, elem):
         r"""Handle ``\MUGraphics``.
 
@@ -338,6 +360,7 @@ class Commands:
         """
         return self.handle_mgraphics([cmd_args[0], None, cmd_args[2]], elem)
 
+    @handler(spawns_fragment=True)
     def handle_mugraphicssolo(self, cmd_args, elem):
         r"""Handle ``\MUGraphicsSolo``.
 
@@ -378,18 +401,25 @@ class Commands:
     def handle_mtikzauto(self, cmd_args, elem):
         r"""Handle ``\MTikzAuto`` command.
 
-        Create a ``CodeBlock`` with TikZ code.
+        Create a ``CodeBlock`` with TikZ code. If there's an assets directory
+        the code is written to a file named by its hash and the ``CodeBlock``
+        refers to it (``src`` attribute).
         """
         if isinstance(elem, pf.Inline):
             raise ValueError(
                 r"\MTikzAuto should be block element!: {}".format(cmd_args)
             )
         tikz_code = REGEX_PATTERNS["STRIP_HASH_LINE"].sub("", cmd_args[0])
-        for repl in TIKZ_SUBSTITUTIONS:
-            tikz_code = re.sub(repl[0], repl[1], tikz_code)
+        tikz_code = TIKZ_SUBSTITUTER.sub(tikz_code)
         # remove empty lines
         tikz_code = linesep.join([s for s in tikz_code.splitlines() if s])
-        codeblock = pf.CodeBlock(tikz_code)
+        assets_dir = get_context(elem.doc).tikz_assets_dir
+        if assets_dir:
+            filename = write_tikz_asset(assets_dir, tikz_code)
+            codeblock = pf.CodeBlock("")
+            codeblock.attributes = {"src": "{}/{}".format(TIKZ_ASSETS_URL, filename)}
+        else:
+            codeblock = pf.CodeBlock(tikz_code)
         codeblock.classes = ELEMENT_CLASSES["MTIKZAUTO"]
         ret = pf.Div(codeblock, classes=["figure"])
         return ret
@@ -476,15 +506,18 @@ class Commands:
         remember(elem.doc, "points", points_value)
         return []
 
+    @handler(spawns_fragment=True, reads_files=True)
     def handle_mdirectrouletteexercises(self, cmd_args, elem):
         r"""Handle ``\MDirectRouletteExercises`` command.
 
         Remember points for next question.
         """
-        filepath = join(environ["INNOCONV_MINTMOD_CURRENT_DIR"], cmd_args[0])
-        with open(filepath, "r") as input_file:
-            input_content = input_file.read()
-        content = parse_fragment(input_content, elem.doc.metadata["lang"].text)
+        context = get_context(elem.doc)
+        filepath = join(context.current_dir or getcwd(), cmd_args[0])
+        input_content = read_source(filepath, context=context)
+        content = parse_fragment(
+            input_content, elem.doc.metadata["lang"].text, context=context
+        )
         div = pf.Div(classes=ELEMENT_CLASSES["MDIRECTROULETTEEXERCISES"])
         div.content.extend(content)
         return div
@@ -501,9 +534,12 @@ class Commands:
             return pf.RawBlock(cmd_args[0][5:], format="html")
         return None
 
+    @handler(spawns_fragment=True)
     def handle_minputhint(self, cmd_args, elem):
         r"""Handle ``\MInputHint`` command."""
-        content = parse_fragment(cmd_args[0], elem.doc.metadata["lang"].text)
+        content = parse_fragment(
+            cmd_args[0], elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+        )
         if isinstance(elem, pf.Block):
             div = pf.Div(classes=ELEMENT_CLASSES["MINPUTHINT"])
             div.content.extend(content)
@@ -513,6 +549,7 @@ class Commands:
             span.content.extend(content[0].content)
         return span
 
+    @handler(spawns_fragment=True)
     def handle_mequationitem(self, cmd_args, elem):
         r"""Handle ``\MEquationItem`` command."""
 
@@ -521,8 +558,12 @@ class Commands:
                 r"\MEquationItem needs 2 arguments. Received: {}".format(cmd_args)
             )
 
-        content_left = parse_fragment(cmd_args[0], elem.doc.metadata["lang"].text)
-        content_right = parse_fragment(cmd_args[1], elem.doc.metadata["lang"].text)
+        content_left = parse_fragment(
+            cmd_args[0], elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+        )
+        content_right = parse_fragment(
+            cmd_args[1], elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+        )
 
         content = to_inline(
             [content_left, pf.Math(r"\;\;=\;", format="InlineMath"), content_right]
@@ -581,18 +622,29 @@ class Commands:
     ###########################################################################
     # Formatting
 
+    @handler(spawns_fragment=True)
     def handle_modstextbf(self, cmd_args, elem):
         r"""Handle \modstextbf command."""
         return pf.Strong(
-            *parse_fragment(cmd_args[0], elem.doc.metadata["lang"].text)[0].content
+            *parse_fragment(
+                cmd_args[0],
+                elem.doc.metadata["lang"].text,
+                context=get_context(elem.doc),
+            )[0].content
         )
 
+    @handler(spawns_fragment=True)
     def handle_modsemph(self, cmd_args, elem):
         r"""Handle \modsemph command."""
         return pf.Emph(
-            *parse_fragment(cmd_args[0], elem.doc.metadata["lang"].text)[0].content
+            *parse_fragment(
+                cmd_args[0],
+                elem.doc.metadata["lang"].text,
+                context=get_context(elem.doc),
+            )[0].content
         )
 
+    @handler(spawns_fragment=True)
     def handle_highlight(self, cmd_args, elem):
         r"""Handle \highlight command.
 
@@ -601,7 +653,11 @@ class Commands:
         the information here.
         """
         return pf.Span(
-            *parse_fragment(cmd_args[0], elem.doc.metadata["lang"].text)[0].content,
+            *parse_fragment(
+                cmd_args[0],
+                elem.doc.metadata["lang"].text,
+                context=get_context(elem.doc),
+            )[0].content,
             classes=ELEMENT_CLASSES["HIGHLIGHT"],
         )
 
@@ -747,3 +803,27 @@ class Commands:
     def _noop():
         """Return no elements."""
         return []
+
+
+def write_tikz_asset(assets_dir, tikz_code):
+    """Write TikZ code to a file named by its hash (unless it exists).
+
+    :param assets_dir: Directory
+    :type assets_dir: str
+    :param tikz_code: TikZ code
+    :type tikz_code: str
+
+    :rtype: str
+    :returns: filename
+    """
+    data = tikz_code.encode(ENCODING)
+    filename = "{}.tikz".format(hashlib.sha1(data).hexdigest())
+    path = join(assets_dir, filename)
+    if not exists(path):
+        makedirs(assets_dir, exist_ok=True)
+        # several processes may write the same figure
+        tmp_path = "{}.{}.tmp".format(path, getpid())
+        with open(tmp_path, "wb") as asset_file:
+            asset_file.write(data)
+        replace(tmp_path, path)
+    return filename
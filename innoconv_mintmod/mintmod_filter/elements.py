@@ -2,6 +2,7 @@
 
 from textwrap import shorten
 import panflute as pf
+from innoconv_mintmod.context import get_context
 from innoconv_mintmod.constants import DEFAULT_EXERCISE_POINTS, ELEMENT_CLASSES
 from innoconv_mintmod.utils import (
     destringify,
@@ -146,7 +147,7 @@ class Question(pf.Element):
         return [self._ica_to_json()]
 
 
-def create_content_box(elem_content, elem_classes, lang):
+def create_content_box(elem_content, elem_classes, lang, context=None):
     """
     Create a content box.
 
@@ -162,7 +163,7 @@ def create_content_box(elem_content, elem_classes, lang):
         raise ValueError(msg)
 
     div = pf.Div(classes=elem_classes)
-    content = parse_fragment(elem_content, lang)
+    content = parse_fragment(elem_content, lang, context=context)
 
     # Check if environment had an \MLabel/SiteUXID identifier
     identifier = extract_identifier(content)
@@ -193,7 +194,9 @@ def create_header(
         attributes["short_title"] = short_title
 
     if parse_text:
-        title = parse_fragment(title_str, doc.metadata["lang"].text)[0].content
+        title = parse_fragment(
+            title_str, doc.metadata["lang"].text, context=get_context(doc)
+        )[0].content
     else:
         title = destringify(title_str)
     header = pf.Header(
@@ -209,7 +212,12 @@ def create_image(filename, descr, elem, add_descr=True, block=True):
     img = pf.Image(url=filename, classes=ELEMENT_CLASSES["IMAGE"])
 
     if add_descr:
-        descr = parse_fragment(descr, elem.doc.metadata["lang"].text, as_doc=True)
+        descr = parse_fragment(
+            descr,
+            elem.doc.metadata["lang"].text,
+            as_doc=True,
+            context=get_context(elem.doc),
+        )
         img.title = shorten(
             pf.stringify(*descr.content).strip(), width=125, placeholder="..."
         )
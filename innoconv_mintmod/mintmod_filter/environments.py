@@ -8,13 +8,18 @@ Handle mintmod LaTeX environments.
 
     Example: ``handle_mxcontent`` method will receive the
     ``\begin{MXContent}…\end{MXContent}`` environment.
+
+    Declare what a handler does (e.g. parse fragments) using the
+    :func:`~innoconv_mintmod.mintmod_filter.registry.handler` decorator.
 """
 
+from innoconv_mintmod.context import get_context
 from innoconv_mintmod.constants import ELEMENT_CLASSES, TRANSLATIONS
 from innoconv_mintmod.mintmod_filter.elements import (
     create_content_box,
     create_header,
 )
+from innoconv_mintmod.mintmod_filter.registry import handler
 from innoconv_mintmod.utils import parse_fragment, extract_identifier
 
 
@@ -42,13 +47,19 @@ class Environments:
 
     # pylint: disable=unused-argument,no-self-use
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_msectionstart(self, elem_content, env_args, elem):
         r"""Handle ``\MSectionStart`` environment."""
-        return parse_fragment(elem_content, elem.doc.metadata["lang"].text)
+        return parse_fragment(
+            elem_content, elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+        )
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mxcontent(self, elem_content, env_args, elem):
         r"""Handle ``\MXContent`` environment."""
-        content = parse_fragment(elem_content, elem.doc.metadata["lang"].text)
+        content = parse_fragment(
+            elem_content, elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+        )
 
         # special case: Skip header creation for some weird (meta?) caption in
         # entrance test.
@@ -63,9 +74,12 @@ class Environments:
 
         return content
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mcontent(self, elem_content, env_args, elem):
         r"""Handle ``\MContent`` environment."""
-        content = parse_fragment(elem_content, elem.doc.metadata["lang"].text)
+        content = parse_fragment(
+            elem_content, elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+        )
         lang = elem.doc.metadata["lang"].text
         header = create_header(
             TRANSLATIONS["content"][lang],
@@ -79,9 +93,12 @@ class Environments:
         content.insert(0, header)
         return content
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mintro(self, elem_content, env_args, elem):
         r"""Handle ``\MIntro`` environment."""
-        content = parse_fragment(elem_content, elem.doc.metadata["lang"].text)
+        content = parse_fragment(
+            elem_content, elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+        )
         lang = elem.doc.metadata["lang"].text
         header = create_header(
             TRANSLATIONS["introduction"][lang],
@@ -100,9 +117,12 @@ class Environments:
     ###########################################################################
     # Exercises
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mexercises(self, elem_content, env_args, elem):
         r"""Handle ``\MExercises`` environment."""
-        content = parse_fragment(elem_content, elem.doc.metadata["lang"].text)
+        content = parse_fragment(
+            elem_content, elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+        )
         lang = elem.doc.metadata["lang"].text
         header = create_header(TRANSLATIONS["exercises"][lang], elem.doc, level=3)
         identifier = extract_identifier(content)
@@ -113,79 +133,103 @@ class Environments:
         content.insert(0, header)
         return content
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mexercisecollection(self, elem_content, env_args, elem):
         r"""Handle ``\MExerciseCollection`` environment."""
-        return parse_fragment(elem_content, elem.doc.metadata["lang"].text)
+        return parse_fragment(
+            elem_content, elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+        )
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mexercise(self, elem_content, env_args, elem):
         r"""Handle ``\MExercise`` environment."""
         return create_content_box(
             elem_content,
             ELEMENT_CLASSES["MEXERCISE"],
             elem.doc.metadata["lang"].text,
+            context=get_context(elem.doc),
         )
 
+    @handler(spawns_fragment=True)
     def handle_mexerciseitems(self, elem_content, env_args, elem):
         r"""Handle ``\MExerciseitems`` environments by returning an ordered list
         containing the ``\item`` s defined in the environment. This is needed
         on top of handle_itemize as there are also mexerciseitems environments
-        outside itemize environments."""
+        outside itemize environments.
+
+        Sources are usually rewritten before parsing already (see
+        :mod:`innoconv_mintmod.rewrite`)."""
         return self._replace_mexerciseitems(elem)
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mquestiongroup(self, elem_content, env_args, elem):
         r"""Handle ``\MQuestionGroup`` environments.
 
         In mintmod used to group checkboxes together. We just return the
         content as questions are grouped by exercises anyway."""
-        return parse_fragment(elem_content, elem.doc.metadata["lang"].text)
+        return parse_fragment(
+            elem_content, elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+        )
 
     ###########################################################################
 
+    @handler(spawns_fragment=True)
     def handle_itemize(self, elem_content, env_args, elem):
         r"""Handle itemize environments, that were not correctly recognized by
         pandoc. This e.g. happens if there are ``\MExerciseItems`` environments
         contained in the items."""
         return self._replace_mexerciseitems(elem)
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_minfo(self, elem_content, env_args, elem):
         r"""Handle ``\MInfo`` environment."""
         return create_content_box(
             elem_content,
             ELEMENT_CLASSES["MINFO"],
             elem.doc.metadata["lang"].text,
+            context=get_context(elem.doc),
         )
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mxinfo(self, elem_content, env_args, elem):
         r"""Handle ``\MXInfo`` environment."""
         div = create_content_box(
             elem_content,
             ELEMENT_CLASSES["MINFO"],
             elem.doc.metadata["lang"].text,
+            context=get_context(elem.doc),
         )
         header = create_header(env_args[0], elem.doc, level=4, parse_text=True)
         div.content.insert(0, header)
         return div
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mexperiment(self, elem_content, env_args, elem):
         r"""Handle ``\MExperiment`` environment."""
         return create_content_box(
             elem_content,
             ELEMENT_CLASSES["MEXPERIMENT"],
             elem.doc.metadata["lang"].text,
+            context=get_context(elem.doc),
         )
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mexample(self, elem_content, env_args, elem):
         r"""Handle ``\MExample`` command."""
         return create_content_box(
             elem_content,
             ELEMENT_CLASSES["MEXAMPLE"],
             elem.doc.metadata["lang"].text,
+            context=get_context(elem.doc),
         )
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mhint(self, elem_content, env_args, elem):
         r"""Handle ``\MHint`` command."""
         lang = elem.doc.metadata["lang"].text
-        div = create_content_box(elem_content, ELEMENT_CLASSES["MHINT"], lang)
+        div = create_content_box(
+            elem_content, ELEMENT_CLASSES["MHINT"], lang, context=get_context(elem.doc)
+        )
         caption = env_args[0]
         # pylint: disable=no-member
         div.attributes["caption"] = caption.replace(
@@ -193,9 +237,12 @@ class Environments:
         )
         return div
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mtest(self, elem_content, env_args, elem):
         r"""Handle ``\MTest`` environment."""
-        content = parse_fragment(elem_content, elem.doc.metadata["lang"].text)
+        content = parse_fragment(
+            elem_content, elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+        )
         title = env_args[0]
 
         # Normalize various forms of inconsistent titles
@@ -218,18 +265,24 @@ class Environments:
         content.insert(0, header)
         return content
 
+    @handler(fragment_format="latex+raw_tex")
     def handle_mcoshzusatz(self, elem_content, env_args, elem):
         r"""Handle ``\MCOSHZusatz`` environment."""
         return create_content_box(
             elem_content,
             ELEMENT_CLASSES["MCOSHZUSATZ"],
             elem.doc.metadata["lang"].text,
+            context=get_context(elem.doc),
         )
 
+    @handler(fragment_format="html")
     def handle_html(self, elem_content, env_args, elem):
         r"""Handle ``\html`` environment."""
         return parse_fragment(
-            elem_content, elem.doc.metadata["lang"].text, from_format="html"
+            elem_content,
+            elem.doc.metadata["lang"].text,
+            from_format="html",
+            context=get_context(elem.doc),
         )
 
     def _replace_mexerciseitems(self, elem):
@@ -237,4 +290,6 @@ class Environments:
         text and return the pandoc output of the parsed altered element."""
         elem.text = elem.text.replace("\\begin{MExerciseItems}", "\\begin{enumerate}")
         elem.text = elem.text.replace("\\end{MExerciseItems}", "\\end{enumerate}")
-        return parse_fragment(elem.text, elem.doc.metadata["lang"].text)
+        return parse_fragment(
+            elem.text, elem.doc.metadata["lang"].text, context=get_context(elem.doc)
+        )
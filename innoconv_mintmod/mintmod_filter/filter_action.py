@@ -1,34 +1,181 @@
 """Pandoc filter that transforms mintmod commands."""
 
-from os import environ
+from os import environ, getcwd
+from os.path import dirname, join
+import time
 import panflute as pf
 from slugify import slugify
 
+from innoconv_mintmod.context import ConversionContext, get_context
 from innoconv_mintmod.errors import ParseError
 from innoconv_mintmod.constants import (
+    DEFAULT_MEMORY_HEADROOM,
     REGEX_PATTERNS,
     ELEMENT_CLASSES,
     EXERCISE_CMDS_ENVS,
+    HANDLER_STATS_LIMIT,
 )
+from innoconv_mintmod.limiter import AdaptiveLimiter
+from innoconv_mintmod.scheduler import Scheduler, TimingHistory
 from innoconv_mintmod.utils import (
+    FragmentJob,
     log,
     destringify,
     parse_cmd,
     parse_nested_args,
+    prefetch_fragments,
+    read_source,
 )
 from innoconv_mintmod.mintmod_filter.environments import Environments
 from innoconv_mintmod.mintmod_filter.commands import Commands
-from innoconv_mintmod.mintmod_filter.math import handle_math
+from innoconv_mintmod.mintmod_filter.math import MATH_CACHE, handle_math
+from innoconv_mintmod.mintmod_filter.registry import HandlerStats, handler_table
 
 
 class MintmodFilterAction:
 
     """The Pandoc filter is defined in this class."""
 
-    def __init__(self, debug=False):
+    # pylint: disable=too-many-instance-attributes
+    # (handler tables of commands and environments with their lookup caches)
+
+    def __init__(self, debug=False, context=None):
         self._debug = debug
+        if context is None:
+            context = ConversionContext.from_environ()
+        #: Context bound to documents that don't have one yet
+        self.context = context
         self._commands = Commands()
         self._environments = Environments()
+        self._command_handlers = handler_table(self._commands)
+        self._environment_handlers = handler_table(self._environments)
+        # name -> handler (None for unknown names)
+        self._command_cache = {}
+        self._environment_cache = {}
+        self.stats = HandlerStats()
+
+    def prepare(self, doc):
+        r"""
+        Parse fragments of top-level environments and ``\input`` files ahead
+        of time.
+
+        The fragments are dispatched to up to ``INNOCONV_JOBS`` workers. The
+        actual number of concurrent workers adapts to available memory but
+        won't go below ``INNOCONV_MIN_JOBS``. This only happens in the
+        top-level process, child processes parse their fragments one after
+        another.
+
+        Normalized math stored by earlier processes is loaded first (see
+        :meth:`load_math_cache`).
+
+        :param doc: Document
+        :type doc: :class:`panflute.elements.Doc`
+        """
+        self.load_math_cache()
+        context = get_context(doc, self.context)
+        jobs = int(environ.get("INNOCONV_JOBS", "1"))
+        if jobs < 2 or context.depth:
+            return
+
+        current_dir = context.current_dir
+        fragment_jobs = []
+        for elem in doc.content:
+            job = self._fragment_job(elem, context, current_dir)
+            if job is not None:
+                current_dir = job.current_dir
+                fragment_jobs.append(job)
+
+        if len(fragment_jobs) > 1:
+            history = TimingHistory(environ.get("INNOCONV_TIMINGS_FILE"))
+            headroom = int(
+                environ.get("INNOCONV_MEMORY_HEADROOM", DEFAULT_MEMORY_HEADROOM)
+            )
+            limiter = AdaptiveLimiter(
+                min_workers=int(environ.get("INNOCONV_MIN_JOBS", "1")),
+                max_workers=jobs,
+                headroom=headroom * 1024 * 1024,
+            )
+            log("Prefetching {} fragments.".format(len(fragment_jobs)))
+            prefetch_fragments(
+                fragment_jobs, Scheduler(jobs, history, limiter), context=context
+            )
+
+    def _fragment_job(self, elem, context, current_dir):
+        """Return the fragment that is parsed when handling ``elem``."""
+        if not isinstance(elem, pf.RawBlock) or elem.format != "latex":
+            return None
+        try:
+            cmd_name, cmd_args = parse_cmd(elem.text)
+        except ParseError:
+            return None
+
+        if cmd_name == "input":
+            return self._input_job(cmd_args[0], context)
+        if cmd_name == "begin":
+            return self._environment_job(elem.text, context, current_dir)
+        return None
+
+    @staticmethod
+    def _input_job(path, context):
+        r"""Return the fragment of an ``\input`` file."""
+        filepath = join(getcwd(), path)
+        try:
+            input_content = read_source(filepath, context=context)
+        except (OSError, ParseError):
+            return None
+        return FragmentJob(
+            input_content, context.lang, "latex+raw_tex", dirname(filepath)
+        )
+
+    def _environment_job(self, text, context, current_dir):
+        """Return the fragment of an environment that is parsed as a whole."""
+        match = REGEX_PATTERNS["ENV"].search(text)
+        if match is None:
+            return None
+        env_name = match.group("env_name")
+        handler = _lookup(self._environment_handlers, self._environment_cache, env_name)
+        if handler is None or handler.info.fragment_format is None:
+            return None
+        if context.remove_exercises and env_name in EXERCISE_CMDS_ENVS:
+            return None
+        _, rest = parse_nested_args(match.groups()[1])
+        if not rest:
+            return None
+        return FragmentJob(
+            rest, context.lang, handler.info.fragment_format, current_dir
+        )
+
+    def save_stats(self):
+        """Merge handler statistics into ``INNOCONV_HANDLER_STATS_FILE``.
+
+        The top-level process runs last and logs the statistics of the whole
+        build.
+        """
+        path = environ.get("INNOCONV_HANDLER_STATS_FILE")
+        if path:
+            self.stats.merge(path)
+        if not self.context.depth and self.stats.calls:
+            log("Handler statistics (including nested fragments):")
+            for line in self.stats.report(limit=HANDLER_STATS_LIMIT):
+                log(line)
+
+    @staticmethod
+    def load_math_cache():
+        """Add normalized math stored in ``INNOCONV_MATH_CACHE_FILE``."""
+        path = environ.get("INNOCONV_MATH_CACHE_FILE")
+        if path:
+            MATH_CACHE.load(path)
+
+    def save_math_cache(self):
+        """Store normalized math in ``INNOCONV_MATH_CACHE_FILE``.
+
+        The top-level process logs the cache statistics.
+        """
+        path = environ.get("INNOCONV_MATH_CACHE_FILE")
+        if path:
+            MATH_CACHE.save(path)
+        if not self.context.depth and MATH_CACHE.hits + MATH_CACHE.misses:
+            log("Math cache: {}".format(MATH_CACHE.report()))
 
     def filter(self, elem, doc):
         """
@@ -51,16 +198,18 @@ class MintmodFilterAction:
 
         # simple command subtitutions in Math environments
         if isinstance(elem, pf.Math):
-            return handle_math(elem)
+            return handle_math(elem, get_context(doc, self.context).math_macros)
 
         if hasattr(elem, "format") and elem.format == "latex":
+            context = get_context(doc, self.context)
+
             # block commands and environments
             if isinstance(elem, pf.RawBlock):
                 cmd_name, cmd_args = parse_cmd(elem.text)
                 try:
                     if cmd_name == "begin":
-                        return self._handle_environment(elem)
-                    return self._handle_command(cmd_name, cmd_args, elem)
+                        return self._handle_environment(elem, context)
+                    return self._handle_command(cmd_name, cmd_args, elem, context)
                 except TypeError as err:
                     self._handle_typeerror(err, cmd_name, cmd_args, elem)
 
@@ -68,30 +217,23 @@ class MintmodFilterAction:
             elif isinstance(elem, pf.RawInline):
                 cmd_name, cmd_args = parse_cmd(elem.text)
                 try:
-                    return self._handle_command(cmd_name, cmd_args, elem)
+                    return self._handle_command(cmd_name, cmd_args, elem, context)
                 except TypeError as err:
                     self._handle_typeerror(err, cmd_name, cmd_args, elem)
 
         return None  # element unchanged
 
-    def _handle_command(self, cmd_name, cmd_args, elem):
+    def _handle_command(self, cmd_name, cmd_args, elem, context):
         """Parse and handle mintmod commands."""
 
-        if (
-            bool(environ.get("INNOCONV_REMOVE_EXERCISES", False))
-            and cmd_name in EXERCISE_CMDS_ENVS
-        ):
+        if context.remove_exercises and cmd_name in EXERCISE_CMDS_ENVS:
             return []
 
-        function_name = "handle_%s" % slugify(cmd_name)
-        func = getattr(self._commands, function_name, None)
-        if callable(func):
-            return func(cmd_args, elem)
+        handler = _lookup(self._command_handlers, self._command_cache, cmd_name)
+        if handler is not None:
+            return self._call(handler, cmd_args, elem)
 
-        if (
-            not bool(environ.get("INNOCONV_IGNORE_EXERCISES", False))
-            or cmd_name not in EXERCISE_CMDS_ENVS
-        ):
+        if not context.ignore_exercises or cmd_name not in EXERCISE_CMDS_ENVS:
             if len(cmd_name) == 1:
                 log(
                     "1-character-command '{}': {}".format(cmd_name, elem),
@@ -104,6 +246,14 @@ class MintmodFilterAction:
             return self._unknown_command_debug(cmd_name, elem)
         return None
 
+    def _call(self, handler, *args):
+        """Call a handler and record its statistics."""
+        start = time.perf_counter()
+        try:
+            return handler.func(*args)
+        finally:
+            self.stats.record(handler.label, time.perf_counter() - start)
+
     @staticmethod
     def _unknown_command_debug(cmd_name, elem):
         """Handle unknown latex commands.
@@ -121,7 +271,7 @@ class MintmodFilterAction:
         span.content.extend([msg_prefix, pf.Space(), pf.Code(elem.text)])
         return span
 
-    def _handle_environment(self, elem):
+    def _handle_environment(self, elem, context):
         """Parse and handle mintmod environments."""
         match = REGEX_PATTERNS["ENV"].search(elem.text)
         if match is None:
@@ -132,24 +282,17 @@ class MintmodFilterAction:
         env_name = match.group("env_name")
         inner_code = match.groups()[1]
 
-        if (
-            bool(environ.get("INNOCONV_REMOVE_EXERCISES", False))
-            and env_name in EXERCISE_CMDS_ENVS
-        ):
+        if context.remove_exercises and env_name in EXERCISE_CMDS_ENVS:
             return []
 
         # Parse optional arguments
         env_args, rest = parse_nested_args(inner_code)
 
-        function_name = "handle_%s" % slugify(env_name)
-        func = getattr(self._environments, function_name, None)
-        if callable(func):
-            return func(rest, env_args, elem)
+        handler = _lookup(self._environment_handlers, self._environment_cache, env_name)
+        if handler is not None:
+            return self._call(handler, rest, env_args, elem)
 
-        if (
-            not bool(environ.get("INNOCONV_IGNORE_EXERCISES", False))
-            or env_name not in EXERCISE_CMDS_ENVS
-        ):
+        if not context.ignore_exercises or env_name not in EXERCISE_CMDS_ENVS:
             log("Could not handle environment %s." % env_name, level="WARNING")
 
         if self._debug:
@@ -182,3 +325,17 @@ class MintmodFilterAction:
         import traceback  # pylint: disable=import-outside-toplevel
 
         traceback.print_tb(err.__traceback__)
+
+
+def _lookup(table, cache, name):
+    """Return :class:`~innoconv_mintmod.mintmod_filter.registry.Handler` for
+    a command/environment name (``None`` if unknown).
+
+    Names are slugified once and the result is cached, unknown names
+    included.
+    """
+    try:
+        return cache[name]
+    except KeyError:
+        handler = cache[name] = table.get(slugify(name))
+        return handler
@@ -1,59 +1,220 @@
 """Handle mintmod math commands."""
 
+from collections import OrderedDict
+import hashlib
+import json
 import re
+from string import Formatter
+from innoconv_mintmod import substitution, tokenizer
+from innoconv_mintmod.cache import LRUCache
 from innoconv_mintmod.constants import (
-    REGEX_PATTERNS,
     COMMANDS_IRREGULAR,
+    ENCODING,
+    MATH_CACHE_SIZE,
     MATH_SUBSTITUTIONS,
 )
-from innoconv_mintmod.utils import parse_nested_args, log
+from innoconv_mintmod.substitution import Substitutions
+from innoconv_mintmod.tokenizer import commands_regex, iter_commands
+from innoconv_mintmod.utils import log
 
+#: Finds math commands with irregular arguments
+IRREGULAR_CMDS = commands_regex(COMMANDS_IRREGULAR)
 
-def handle_math(elem):
+# cheap check before scanning for commands
+IRREGULAR_NAMES = tuple("\\" + name for name in COMMANDS_IRREGULAR)
+
+#: Applies :data:`~innoconv_mintmod.constants.MATH_SUBSTITUTIONS` in one pass
+MATH_SUBSTITUTER = Substitutions(MATH_SUBSTITUTIONS)
+
+# pure aliases of a command (e.g. \Mvarphi -> \varphi)
+_ALIAS_PATTERN = re.compile(r"\\\\([A-Za-z]+)")
+_BACKREFERENCE = re.compile(r"\\(\d|g<)")
+
+
+def split_aliases(rules):
+    """Separate macro aliases from substitutions that need regex.
+
+    A rule is an alias if it matches a command name only and its replacement
+    doesn't refer to groups. Such rules can be implemented as macros of the
+    math renderer.
+
+    :param rules: Pairs of pattern and replacement template
+    :type rules: iterable
+
+    :rtype: (:class:`collections.OrderedDict`, tuple)
+    :returns: mapping of command names to TeX code and remaining rules
+    """
+    aliases = OrderedDict()
+    remaining = []
+    for pattern, repl in rules:
+        match = _ALIAS_PATTERN.fullmatch(pattern)
+        if match is None or _BACKREFERENCE.search(repl):
+            remaining.append((pattern, repl))
+            continue
+        name = match.group(1)
+        aliases.setdefault(name, re.sub(pattern, repl, "\\" + name))
+    return aliases, tuple(remaining)
+
+
+_ALIASES, _NON_ALIAS_SUBSTITUTIONS = split_aliases(MATH_SUBSTITUTIONS)
+
+#: Command names mapped to TeX code (defined as macros in macro mode)
+MATH_ALIASES = _ALIASES
+
+#: Applies substitutions that aren't :data:`MATH_ALIASES` (used in macro mode)
+MATH_SUBSTITUTER_MACROS = Substitutions(_NON_ALIAS_SUBSTITUTIONS)
+
+# prefix of cache keys in macro mode (can't occur in TeX code)
+_MACROS_KEY = "\0"
+
+
+def _cache_version():
+    """Hash the substitution tables and the code that applies them."""
+    digest = hashlib.sha1(
+        repr((MATH_SUBSTITUTIONS, COMMANDS_IRREGULAR)).encode(ENCODING)
+    )
+    for path in (substitution.__file__, tokenizer.__file__, __file__):
+        with open(path, "rb") as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()
+
+
+#: Normalized math keyed by the original TeX (shared by all documents of a
+#: process, the version changes with the substitution rules and their code)
+MATH_CACHE = LRUCache(MATH_CACHE_SIZE, version=_cache_version())
+
+
+def handle_math(elem, macros=False):
     """Handle mintmod text substitutions and some commands with irregular
-    arguments."""
-    for repl in MATH_SUBSTITUTIONS:
-        elem.text = re.sub(repl[0], repl[1], elem.text)
-
-    if REGEX_PATTERNS["IRREG_MATH_CMDS"].search(elem.text):
-
-        def _handle_irregular(cmd_name, cmd_args):
-            sub = COMMANDS_IRREGULAR[cmd_name]
-            if isinstance(sub, dict):
-                try:
-                    sub = sub[len(cmd_args)]
-                except KeyError:
-                    log(
-                        "Could not find substitution for this number of args: "
-                        "{} ({})".format(cmd_name, cmd_args)
-                    )
-                    raise
-            try:
-                return sub.format(*cmd_args)
-            except IndexError:
-                log(
-                    "Received wrong number of arguments for math command: "
-                    "{} ({})".format(cmd_name, cmd_args)
-                )
-                raise
-
-        # commands with arguments that may contain nested arguments (can't be
-        # handled by regex)
-        text = ""
-        rest = elem.text
-        while rest:
-            match = REGEX_PATTERNS["IRREG_MATH_CMDS"].search(rest)
-            if match:
-                cmd_name = match.group()
-                start = match.start()
-                text += rest[:start]
-                start_index = start + len(cmd_name)
-                args_til_end = rest[start_index:]
-                cmd_args, rest = parse_nested_args(args_til_end)
-                text += _handle_irregular(cmd_name[1:], cmd_args)
-            else:
-                text += rest
-                rest = None
-        elem.text = text
+    arguments.
 
+    In macro mode :data:`MATH_ALIASES` are kept (see :func:`macro_config`)."""
+    elem.text = normalize_math(elem.text, macros)
     return elem
+
+
+def normalize_math(text, macros=False):
+    """Normalize mintmod math (results are cached in :data:`MATH_CACHE`).
+
+    :param text: TeX code
+    :type text: str
+    :param macros: Keep :data:`MATH_ALIASES`
+    :type macros: bool
+
+    :rtype: str
+    :returns: normalized TeX code
+    """
+    key = _MACROS_KEY + text if macros else text
+    normalized = MATH_CACHE.get(key)
+    if normalized is None:
+        substituter = MATH_SUBSTITUTER_MACROS if macros else MATH_SUBSTITUTER
+        normalized = expand_irregular(substituter.sub(text))
+        MATH_CACHE.put(key, normalized)
+    return normalized
+
+
+def macro_config():
+    """Return macro definitions of :data:`MATH_ALIASES` for math renderers.
+
+    :rtype: dict
+    :returns: ``mathjax`` (``TeX.Macros`` for MathJax 2 and ``tex.macros`` for
+        MathJax 3) and ``katex`` (``macros`` option) configuration
+    """
+    return {
+        "mathjax": dict(MATH_ALIASES),
+        "katex": {"\\" + name: tex for name, tex in MATH_ALIASES.items()},
+    }
+
+
+def write_macro_config(path):
+    """Write :func:`macro_config` to a JSON file.
+
+    :param path: File path
+    :type path: str
+    """
+    with open(path, "w", encoding=ENCODING) as config_file:
+        json.dump(macro_config(), config_file, indent=2, sort_keys=True)
+
+
+def expand_irregular(text):
+    """Expand math commands with irregular arguments.
+
+    Commands of :data:`~innoconv_mintmod.constants.COMMANDS_IRREGULAR` may
+    have nested arguments (that can't be handled by regex) and may be nested
+    in each other's arguments. The text is scanned once and arguments are
+    expanded recursively. Commands with an unexpected number of arguments are
+    logged and left unchanged.
+
+    :param text: TeX code
+    :type text: str
+
+    :rtype: str
+    :returns: TeX code with expanded commands
+    """
+    return _expand(text, 0)
+
+
+def _expand(text, offset):
+    """Expand commands in ``text`` (``offset`` is the position of ``text`` in
+    the whole formula, used for error messages)."""
+    if not any(name in text for name in IRREGULAR_NAMES):
+        return text  # most arguments don't contain commands
+    parts = []
+    pos = 0
+    for cmd in iter_commands(text, IRREGULAR_CMDS):
+        start, end = cmd.start, cmd.end
+        parts.append(text[pos:start])
+        parts.append(_expand_command(text[start:end], cmd, offset))
+        pos = end
+    if not parts:
+        return text
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def _expand_command(source, cmd, offset):
+    """Return the expansion of a single command (or its unchanged ``source``
+    if the number of arguments doesn't match)."""
+    cmd_args = cmd.opt_args + cmd.args
+    templates = IRREGULAR_TEMPLATES[cmd.name]
+    try:
+        sub = templates[len(cmd_args)]
+    except KeyError:
+        log(
+            "Wrong number of arguments for math command \\{} at position {}: "
+            "expected {}, got {} ({})".format(
+                cmd.name,
+                offset + cmd.start,
+                " or ".join(str(arity) for arity in sorted(templates)),
+                len(cmd_args),
+                cmd_args,
+            ),
+            level="WARNING",
+        )
+        return source
+    # arguments directly follow the command name and each other
+    arg_pos = offset + cmd.start + len(cmd.name) + 1
+    expanded = []
+    for arg in cmd_args:
+        expanded.append(_expand(arg, arg_pos + 1))
+        arg_pos += len(arg) + 2
+    return sub.format(*expanded)
+
+
+def _arity(template):
+    """Return the number of arguments a format string takes."""
+    auto = 0
+    indices = [-1]
+    for _, field, _, _ in Formatter().parse(template):
+        if field == "":
+            auto += 1
+        elif field is not None:
+            indices.append(int(field))
+    return max(auto, max(indices) + 1)
+
+
+#: Templates of math commands with irregular arguments by number of arguments
+IRREGULAR_TEMPLATES = {
+    name: sub if isinstance(sub, dict) else {_arity(sub): sub}
+    for name, sub in COMMANDS_IRREGULAR.items()
+}
@@ -0,0 +1,164 @@
+r"""
+Registry of command and environment handlers.
+
+Handlers declare what they do using the :func:`handler` decorator:
+
+.. code-block:: python
+
+    @handler(fragment_format="latex+raw_tex")
+    def handle_minfo(self, elem_content, env_args, elem):
+        ...
+
+The metadata is used to decide which fragments can be parsed ahead of time
+(see :meth:`MintmodFilterAction.prepare
+<innoconv_mintmod.mintmod_filter.filter_action.MintmodFilterAction.prepare>`).
+:class:`HandlerStats` records how often handlers are called and how much time
+they take.
+"""
+
+from collections import namedtuple
+import fcntl
+import json
+import os
+from types import MappingProxyType
+
+#: Handler metadata
+#:
+#: ``spawns_fragment``
+#:     Handler parses (parts of) the element in a Pandoc subprocess
+#: ``reads_files``
+#:     Handler reads files
+#: ``fragment_format``
+#:     Handler parses exactly the environment content in this format (the
+#:     fragment can be parsed ahead of time)
+HandlerInfo = namedtuple(
+    "HandlerInfo", ["spawns_fragment", "reads_files", "fragment_format"]
+)
+
+#: Metadata of handlers without :func:`handler` decorator
+DEFAULT_INFO = HandlerInfo(False, False, None)
+
+#: A registered handler, ``label`` identifies it in statistics
+Handler = namedtuple("Handler", ["func", "info", "label"])
+
+
+def handler(spawns_fragment=False, reads_files=False, fragment_format=None):
+    """Decorator attaching metadata to a handler method.
+
+    :param spawns_fragment: Handler parses a fragment in a subprocess
+    :type spawns_fragment: bool
+    :param reads_files: Handler reads files
+    :type reads_files: bool
+    :param fragment_format: Format the environment content is parsed in
+        (implies ``spawns_fragment``)
+    :type fragment_format: str
+
+    :rtype: function
+    :returns: decorator
+    """
+    info = HandlerInfo(
+        spawns_fragment or fragment_format is not None,
+        reads_files,
+        fragment_format,
+    )
+
+    def _decorator(func):
+        func.handler_info = info
+        return func
+
+    return _decorator
+
+
+def handler_table(handlers):
+    """Return a read-only mapping from slugified names to :class:`Handler`.
+
+    :param handlers: Object providing ``handle_NAME`` methods
+    :type handlers: object
+
+    :rtype: :class:`types.MappingProxyType`
+    :returns: handler table
+    """
+    table = {}
+    for attr in dir(handlers):
+        if attr.startswith("handle_"):
+            func = getattr(handlers, attr)
+            if callable(func):
+                info = getattr(func, "handler_info", DEFAULT_INFO)
+                label = "{}.{}".format(type(handlers).__name__, attr)
+                table[attr.split("_", 1)[1]] = Handler(func, info, label)
+    return MappingProxyType(table)
+
+
+class HandlerStats:
+    """Call counts and cumulative time per handler.
+
+    Times include fragments parsed by the handler (and therefore the time of
+    handlers called in subprocesses).
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+
+    def record(self, label, seconds):
+        """Record a handler call.
+
+        :param label: Handler label
+        :type label: str
+        :param seconds: Time the call took
+        :type seconds: float
+        """
+        self.calls[label] = self.calls.get(label, 0) + 1
+        self.seconds[label] = self.seconds.get(label, 0.0) + seconds
+
+    def merge(self, path):
+        """Add statistics to a JSON file and load the combined statistics.
+
+        Processes merging into the same file are serialized using a lock.
+
+        :param path: File path
+        :type path: str
+        """
+        with open("{}.lock".format(path), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(path, "r") as stats_file:
+                    stored = json.load(stats_file)
+            except (FileNotFoundError, ValueError):
+                stored = {}
+            for label, entry in stored.items():
+                self.calls[label] = self.calls.get(label, 0) + entry["calls"]
+                self.seconds[label] = self.seconds.get(label, 0.0) + entry["seconds"]
+            tmp_path = "{}.tmp".format(path)
+            with open(tmp_path, "w") as stats_file:
+                json.dump(
+                    {
+                        label: {"calls": calls, "seconds": self.seconds[label]}
+                        for label, calls in self.calls.items()
+                    },
+                    stats_file,
+                    indent=1,
+                    sort_keys=True,
+                )
+            os.replace(tmp_path, path)
+
+    def report(self, limit=None):
+        """Return a table of handlers ordered by cumulative time.
+
+        :param limit: Maximum number of handlers
+        :type limit: int
+
+        :rtype: list
+        :returns: lines of the table
+        """
+        labels = sorted(self.calls, key=lambda label: -self.seconds[label])
+        lines = []
+        for label in labels[:limit]:
+            calls = self.calls[label]
+            seconds = self.seconds[label]
+            lines.append(
+                "{:<50} {:>7} calls {:>9.3f} s {:>9.3f} ms/call".format(
+                    label, calls, seconds, seconds / calls * 1000
+                )
+            )
+        return lines
@@ -1,5 +1,7 @@
 # pylint: disable=missing-docstring, invalid-name, too-many-public-methods
 
+import os
+import tempfile
 import unittest
 import panflute as pf
 
@@ -9,6 +11,7 @@ from innoconv_mintmod.constants import (
     INDEX_LABEL_PREFIX,
 )
 
+from innoconv_mintmod.context import ConversionContext, bind_context
 from innoconv_mintmod.mintmod_filter.commands import Commands
 from innoconv_mintmod.utils import remember
 
@@ -406,6 +409,40 @@ class TestGraphics(unittest.TestCase):
         self.assertIsInstance(ret, pf.Image)
         self.assertEqual(ret.url, "foo.jpg")
 
+    def test_handle_mtikzauto(self):
+        """MTikzAuto command"""
+        code = "%\n\\draw (0,0) -- (1,\\MZahl{1}{5});\n\n\\node {$\\Mvarphi$};"
+        doc = pf.Doc(pf.RawBlock(r"\MTikzAuto{...}", format="latex"))
+        bind_context(doc, ConversionContext())
+        ret = self.commands.handle_mtikzauto([code], doc.content[0])
+        self.assertIsInstance(ret, pf.Div)
+        codeblock = ret.content[0]
+        self.assertEqual(codeblock.classes, ELEMENT_CLASSES["MTIKZAUTO"])
+        self.assertEqual(
+            codeblock.text,
+            r"\draw (0,0) -- (1,\num{1.5});" + os.linesep + r"\node {$\varphi$};",
+        )
+
+    def test_handle_mtikzauto_assets(self):
+        """MTikzAuto command with assets directory"""
+        with tempfile.TemporaryDirectory() as assets_dir:
+            refs = []
+            for _ in range(2):
+                doc = pf.Doc(pf.RawBlock(r"\MTikzAuto{...}", format="latex"))
+                bind_context(doc, ConversionContext(tikz_assets_dir=assets_dir))
+                ret = self.commands.handle_mtikzauto(
+                    [r"\draw (0,0) -- (1,1);"], doc.content[0]
+                )
+                codeblock = ret.content[0]
+                self.assertEqual(codeblock.text, "")
+                refs.append(codeblock.attributes["src"])
+            self.assertEqual(refs[0], refs[1])
+            self.assertTrue(refs[0].startswith("_static/tikz/"))
+            filenames = os.listdir(assets_dir)
+            self.assertEqual(len(filenames), 1)
+            with open(os.path.join(assets_dir, filenames[0])) as asset_file:
+                self.assertEqual(asset_file.read(), r"\draw (0,0) -- (1,1);")
+
 
 class TestQuestions(unittest.TestCase):
     def setUp(self):
@@ -1,7 +1,9 @@
 # pylint: disable=missing-docstring,invalid-name
 
 import unittest
+from mock import patch
 import panflute as pf
+from innoconv_mintmod.context import ConversionContext, get_context
 from innoconv_mintmod.errors import ParseError
 from innoconv_mintmod.mintmod_filter.filter_action import MintmodFilterAction
 
@@ -142,6 +144,81 @@ class TestFilterAction(unittest.TestCase):
         self.assertIsInstance(ret, pf.Str)
         self.assertEqual(ret.text, r"„")
 
+    @patch(
+        "innoconv_mintmod.mintmod_filter.filter_action.slugify",
+        side_effect=lambda name: name.lower(),
+    )
+    def test_handler_lookup_cached(self, slugify_mock):
+        """filter() looks up handlers once per name, unknown names included"""
+        for _ in range(3):
+            for text in (r"\glqq", r"\ThisCommandDoesNotExist"):
+                elem = pf.RawInline(text, format="latex")
+                self._filter_elem([pf.Para(elem)], elem)
+        self.assertEqual(slugify_mock.call_count, 2)
+
+    def test_handler_stats(self):
+        """filter() records calls of handlers"""
+        for text in (r"\glqq", r"\glqq", r"\quad", r"\ThisCommandDoesNotExist"):
+            elem = pf.RawInline(text, format="latex")
+            self._filter_elem([pf.Para(elem)], elem)
+        self.assertEqual(
+            self.filter_action.stats.calls,
+            {"Commands.handle_glqq": 2, "Commands.handle_quad": 1},
+        )
+
+    @patch.dict("os.environ", {"INNOCONV_REMOVE_EXERCISES": "1"})
+    def test_remove_exercises(self):
+        """filter() removes exercise commands"""
+        filter_action = MintmodFilterAction()
+        elem = pf.RawBlock(r"\MLQuestion{1}{A}{B}", format="latex")
+        self.doc.content.extend([elem])
+        self.assertEqual(filter_action.filter(elem, self.doc), [])
+
+    def test_context(self):
+        """filter() binds its context to the document"""
+        context = ConversionContext(remove_exercises=True)
+        filter_action = MintmodFilterAction(context=context)
+        elem = pf.RawBlock(r"\MLQuestion{1}{A}{B}", format="latex")
+        self.doc.content.extend([elem])
+        self.assertEqual(filter_action.filter(elem, self.doc), [])
+        self.assertIs(get_context(self.doc), context)
+        self.assertEqual(context.lang, "en")
+
     def _filter_elem(self, elem_list, test_elem):
         self.doc.content.extend(elem_list)
         return self.filter_action.filter(test_elem, self.doc)
+
+
+class TestFilterActionPrepare(unittest.TestCase):
+    def setUp(self):
+        self.doc = pf.Doc(metadata={"lang": "en"})
+        self.filter_action = MintmodFilterAction()
+
+    @patch.dict("os.environ", {"INNOCONV_JOBS": "2"})
+    @patch("innoconv_mintmod.mintmod_filter.filter_action.prefetch_fragments")
+    def test_prepare(self, prefetch_mock):
+        """prepare() prefetches fragments of top-level environments"""
+        self.doc.content.extend(
+            [
+                pf.RawBlock(r"\begin{MInfo}Foo\end{MInfo}", format="latex"),
+                pf.Para(pf.Str("Bar")),
+                pf.RawBlock(r"\begin{html}<p>Baz</p>\end{html}", format="latex"),
+                pf.RawBlock(r"\MTitle{Foo}", format="latex"),
+            ]
+        )
+        self.filter_action.prepare(self.doc)
+        jobs = prefetch_mock.call_args[0][0]
+        self.assertEqual([job.source for job in jobs], ["Foo", "<p>Baz</p>"])
+        self.assertEqual(jobs[1].from_format, "html")
+
+    @patch("innoconv_mintmod.mintmod_filter.filter_action.prefetch_fragments")
+    def test_prepare_single_job(self, prefetch_mock):
+        """prepare() does nothing without multiple jobs"""
+        self.doc.content.extend(
+            [
+                pf.RawBlock(r"\begin{MInfo}Foo\end{MInfo}", format="latex"),
+                pf.RawBlock(r"\begin{MInfo}Bar\end{MInfo}", format="latex"),
+            ]
+        )
+        self.filter_action.prepare(self.doc)
+        self.assertFalse(prefetch_mock.called)
@@ -1,8 +1,21 @@
 # pylint: disable=missing-docstring,invalid-name
 
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
+from mock import patch
 import panflute as pf
-from innoconv_mintmod.mintmod_filter.math import handle_math
+from innoconv_mintmod.mintmod_filter.math import (
+    MATH_ALIASES,
+    MATH_CACHE,
+    expand_irregular,
+    handle_math,
+    macro_config,
+    normalize_math,
+    split_aliases,
+)
 
 
 class TestHandleSubstitutions(unittest.TestCase):
@@ -13,6 +26,54 @@ class TestHandleSubstitutions(unittest.TestCase):
         self.assertEqual(elem_math_repl.text, r"\mathbb{N} \mathbb{Q} {\mathbb{R}}")
 
 
+class TestNormalizeMath(unittest.TestCase):
+    def setUp(self):
+        MATH_CACHE.clear()
+
+    def tearDown(self):
+        MATH_CACHE.clear()
+
+    def test_cached(self):
+        """Repeated formulas are normalized once"""
+        self.assertEqual(normalize_math(r"x\in\R"), r"x\in\mathbb{R}")
+        self.assertEqual(normalize_math(r"x\in\R"), r"x\in\mathbb{R}")
+        self.assertEqual(MATH_CACHE.hits, 1)
+        self.assertEqual(MATH_CACHE.misses, 1)
+        elem_math = handle_math(pf.Math(r"x\in\R"))
+        self.assertEqual(elem_math.text, r"x\in\mathbb{R}")
+        self.assertEqual(MATH_CACHE.hits, 2)
+
+
+class TestMathMacros(unittest.TestCase):
+    def test_split_aliases(self):
+        aliases, remaining = split_aliases(
+            (
+                (r"\\Mvarphi", r"\\varphi"),
+                (r"\\MBlank", r"\ "),
+                (r"\\MVec{", r"\\vec{"),
+                (r"\\([NZQRC])(?=$|\s)", r"\\mathbb{\1}"),
+            )
+        )
+        self.assertEqual(aliases, {"Mvarphi": r"\varphi", "MBlank": r"\ "})
+        self.assertEqual(len(remaining), 2)
+
+    def test_macro_mode(self):
+        """Aliases are kept, other substitutions are applied"""
+        text = r"\N \Mvarphi \MVec{x} \MZahl{1}{2}"
+        self.assertEqual(
+            normalize_math(text, macros=True), r"\mathbb{N} \Mvarphi \vec{x} \num{1.2}"
+        )
+        self.assertEqual(normalize_math(text), r"\mathbb{N} \varphi \vec{x} \num{1.2}")
+        elem_math = handle_math(pf.Math(r"\MEU^x"), macros=True)
+        self.assertEqual(elem_math.text, r"\MEU^x")
+
+    def test_macro_config(self):
+        config = macro_config()
+        self.assertEqual(config["mathjax"]["Mvarphi"], r"\varphi")
+        self.assertEqual(config["katex"][r"\Mvarphi"], r"\varphi")
+        self.assertEqual(len(config["mathjax"]), len(MATH_ALIASES))
+
+
 class TestHandleIrregular(unittest.TestCase):
     def test_handle_math_mvector(self):
         """MVector: commands in arguments"""
@@ -145,3 +206,76 @@ class TestHandleMCaseEnv(unittest.TestCase):
             r"|x| = \left\lbrace\begin{array}{rl} x & \text{falls}\;x\geq 0 "
             r"\\ -x & \text{falls}\;x<0 \, . \end{array}\right.",
         )
+
+
+class TestExpandIrregular(unittest.TestCase):
+    def test_nested(self):
+        """Commands in arguments of other commands are expanded"""
+        self.assertEqual(
+            expand_irregular(r"\MPointTwo{\MVector{1\\2}}{\MPointTwoAS{a}{b}}"),
+            r"(\begin{pmatrix}1\\2\end{pmatrix}\coordsep \left(a\coordsep b\right))",
+        )
+
+    def test_no_commands(self):
+        self.assertEqual(expand_irregular(r"\frac{1}{2}"), r"\frac{1}{2}")
+
+    @patch("innoconv_mintmod.mintmod_filter.math.log")
+    def test_wrong_number_of_args(self, log_mock):
+        text = r"x + \MPointTwo{1}"
+        self.assertEqual(expand_irregular(text), text)
+        msg = log_mock.call_args[0][0]
+        self.assertIn(r"\MPointTwo at position 4", msg)
+        self.assertIn("expected 2 or 3, got 1", msg)
+        self.assertEqual(log_mock.call_args[1], {"level": "WARNING"})
+
+    @patch("innoconv_mintmod.mintmod_filter.math.log")
+    def test_too_many_args(self, log_mock):
+        self.assertEqual(expand_irregular(r"\MVector{1}{2}"), r"\MVector{1}{2}")
+        self.assertIn("expected 1, got 2", log_mock.call_args[0][0])
+
+    @patch("innoconv_mintmod.mintmod_filter.math.log")
+    def test_wrong_number_of_args_nested(self, log_mock):
+        """Positions refer to the whole formula"""
+        self.assertEqual(
+            expand_irregular(r"x + \MPointTwo[\Big]{\MVector{1}{2}}{3}"),
+            r"x + \Big(\MVector{1}{2}\coordsep 3{}\Big)",
+        )
+        self.assertIn(r"\MVector at position 21", log_mock.call_args[0][0])
+
+
+CACHE_SCRIPT = """
+import sys
+import panflute as pf
+from innoconv_mintmod.mintmod_filter.filter_action import MintmodFilterAction
+from innoconv_mintmod.mintmod_filter.math import MATH_CACHE, normalize_math
+
+filter_action = MintmodFilterAction()
+filter_action.prepare(pf.Doc())
+normalize_math(sys.argv[1])
+filter_action.save_math_cache()
+print(MATH_CACHE.hits, MATH_CACHE.misses)
+"""
+
+
+class TestMathCacheFile(unittest.TestCase):
+    def test_shared_between_processes(self):
+        """A cache saved by one process gives hits in the next one"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            env = dict(
+                os.environ,
+                INNOCONV_MATH_CACHE_FILE=os.path.join(tmpdir, "cache.json"),
+                INNOCONV_JOBS="1",
+            )
+            env.pop("INNOCONV_RECURSION_DEPTH", None)
+
+            def _run():
+                proc = subprocess.run(
+                    [sys.executable, "-c", CACHE_SCRIPT, r"x\in\R"],
+                    env=env,
+                    stdout=subprocess.PIPE,
+                    check=True,
+                )
+                return proc.stdout.decode().split()
+
+            self.assertEqual(_run(), ["0", "1"])
+            self.assertEqual(_run(), ["1", "0"])
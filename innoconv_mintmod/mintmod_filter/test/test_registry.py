@@ -0,0 +1,84 @@
+# pylint: disable=missing-docstring,invalid-name
+
+import os
+import tempfile
+import unittest
+from innoconv_mintmod.mintmod_filter.commands import Commands
+from innoconv_mintmod.mintmod_filter.environments import Environments
+from innoconv_mintmod.mintmod_filter.registry import (
+    DEFAULT_INFO,
+    HandlerStats,
+    handler,
+    handler_table,
+)
+
+
+class Handlers:
+    @handler(reads_files=True)
+    def handle_foo(self):
+        return "foo"
+
+    def handle_bar(self):
+        return "bar"
+
+    @handler(fragment_format="html")
+    def handle_baz(self):
+        return "baz"
+
+    handle_not_callable = None
+
+
+class TestHandlerTable(unittest.TestCase):
+    def test_handler_table(self):
+        table = handler_table(Handlers())
+        self.assertEqual(set(table), {"foo", "bar", "baz"})
+        self.assertEqual(table["foo"].func(), "foo")
+        self.assertEqual(table["foo"].label, "Handlers.handle_foo")
+        self.assertTrue(table["foo"].info.reads_files)
+        self.assertIs(table["bar"].info, DEFAULT_INFO)
+        self.assertTrue(table["baz"].info.spawns_fragment)
+        self.assertEqual(table["baz"].info.fragment_format, "html")
+        with self.assertRaises(TypeError):
+            table["foo"] = None  # pylint: disable=unsupported-assignment-operation
+
+    def test_metadata(self):
+        commands = handler_table(Commands())
+        self.assertTrue(commands["input"].info.reads_files)
+        self.assertTrue(commands["input"].info.spawns_fragment)
+        self.assertIsNone(commands["input"].info.fragment_format)
+        self.assertIs(commands["quad"].info, DEFAULT_INFO)
+        environments = handler_table(Environments())
+        self.assertEqual(environments["minfo"].info.fragment_format, "latex+raw_tex")
+        self.assertEqual(environments["html"].info.fragment_format, "html")
+        self.assertTrue(environments["itemize"].info.spawns_fragment)
+        self.assertIsNone(environments["itemize"].info.fragment_format)
+
+
+class TestHandlerStats(unittest.TestCase):
+    def test_record_report(self):
+        stats = HandlerStats()
+        stats.record("cheap", 0.001)
+        stats.record("cheap", 0.001)
+        stats.record("expensive", 1.5)
+        self.assertEqual(stats.calls, {"cheap": 2, "expensive": 1})
+        self.assertAlmostEqual(stats.seconds["cheap"], 0.002)
+        lines = stats.report()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("expensive"))
+        self.assertEqual(len(stats.report(limit=1)), 1)
+
+    def test_merge(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "stats.json")
+            child = HandlerStats()
+            child.record("foo", 1.0)
+            child.merge(path)
+            parent = HandlerStats()
+            parent.record("foo", 2.0)
+            parent.record("bar", 0.5)
+            parent.merge(path)
+            self.assertEqual(parent.calls, {"foo": 2, "bar": 1})
+            self.assertAlmostEqual(parent.seconds["foo"], 3.0)
+            again = HandlerStats()
+            again.merge(path)
+            self.assertEqual(again.calls, {"foo": 2, "bar": 1})
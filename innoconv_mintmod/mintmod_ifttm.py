@@ -1,25 +1,257 @@
 #!/usr/bin/env python3
 
 r"""
-Pre-processor that removes all \iftm commands.
+Pre-processor that removes all \ifttm commands.
 
-It works by preserving the HTML part of the \ifttm command. The PDF part it
+It works by preserving the HTML part of the \ifttm command. The PDF part is
 discarded.
+
+The input is scanned once and streamed to the output in chunks. Nested
+``\ifttm`` blocks are supported, as are other TeX conditionals inside of them
+whose ``\else`` and ``\fi`` must not be mistaken for the ones of ``\ifttm``.
 """
 
-import sys
 import re
+import sys
+
+from innoconv_mintmod.errors import ParseError
+
+#: Size of chunks read from the input
+CHUNK_SIZE = 64 * 1024
+
+#: TeX conditionals that are closed by ``\fi``
+CONDITIONALS = frozenset(
+    (
+        "if",
+        "ifcase",
+        "ifcat",
+        "ifcsname",
+        "ifdefined",
+        "ifdim",
+        "ifeof",
+        "iffalse",
+        "iffontchar",
+        "ifhbox",
+        "ifhmode",
+        "ifinner",
+        "ifmmode",
+        "ifnum",
+        "ifodd",
+        "iftrue",
+        "ifvbox",
+        "ifvmode",
+        "ifvoid",
+        "ifx",
+    )
+)
+
+#: Tokens the scanner cares about (other control words are skipped)
+TOKEN = re.compile(
+    r"\\(?:(?P<name>if[A-Za-z]*|else|fi|newif)(?![A-Za-z])|[^A-Za-z])|%", re.DOTALL
+)
+
+
+class IfttmScanner:
+    r"""Incrementally remove ``\ifttm…\else…\fi`` from LaTeX source.
+
+    Feed chunks of input with :meth:`feed` and call :meth:`close` at the end.
+    Both return the output for the input seen so far.
+
+    If ``track_lines`` is set, :attr:`line_sync` records ``(output line,
+    input line)`` pairs wherever lines were dropped. This allows to map
+    lines of the output back to the input.
+    """
+
+    def __init__(self, track_lines=False):
+        self._lines = _LineCounter(track_lines)
+        self._pending = ""
+        self._comment = False
+        self._newif = False
+        self._conditionals = set(CONDITIONALS)
+        # frames are [is_ifttm, in_else]
+        self._stack = []
+        self._visible = True
+
+    @property
+    def line_sync(self):
+        """``(output line, input line)`` pairs where lines were dropped."""
+        return self._lines.sync
+
+    def feed(self, chunk):
+        """Process a chunk of input.
+
+        :param chunk: Input
+        :type chunk: str
+
+        :rtype: str
+        :returns: output
+        """
+        return self._scan(self._pending + chunk, final=False)
+
+    def close(self):
+        r"""Process remaining input.
+
+        :rtype: str
+        :returns: output
+
+        :raises ParseError: if an ``\ifttm`` was not terminated
+        """
+        out = self._scan(self._pending, final=True)
+        if self._stack:
+            raise ParseError(
+                r"Unterminated \ifttm (input line {})".format(self._lines.in_lines)
+            )
+        return out
+
+    def _scan(self, buf, final):
+        out = []
+        pos = idx = 0
+        end = len(buf) if final else _safe_end(buf)
+        while idx < end:
+            if self._comment:
+                idx = buf.find("\n", idx, end)
+                if idx == -1:
+                    idx = end
+                    break
+                self._comment = False
+                continue
+
+            match = TOKEN.search(buf, idx, end)
+            if match is None:
+                idx = end
+                break
+            start, idx = match.span()
+            name = match.group("name")
+            if name is None:
+                # comment or escaped character
+                self._comment = match.group() == "%"
+            elif self._is_boundary(name):
+                self._flush(out, buf[pos:start])
+                pos = idx
+                self._switch(name)
+
+        self._flush(out, buf[pos:idx])
+        self._pending = buf[idx:]
+        return "".join(out)
+
+    def _is_boundary(self, name):
+        r"""Return if ``name`` starts, splits or ends an ``\ifttm``.
+
+        Other conditionals are tracked on the way.
+        """
+        if self._newif:
+            self._newif = False
+            self._conditionals.add(name)
+        elif name == "newif":
+            self._newif = True
+        elif name == "ifttm":
+            return True
+        elif not self._stack:
+            pass
+        elif name in self._conditionals:
+            self._stack.append([False, False])
+        elif name in ("else", "fi") and self._stack[-1][0]:
+            return True
+        elif name == "fi":
+            self._stack.pop()
+        return False
+
+    def _switch(self, name):
+        r"""Enter the HTML or PDF part of an ``\ifttm`` or leave it."""
+        if name == "ifttm":
+            self._stack.append([True, False])
+        elif name == "else":
+            self._stack[-1][1] = True
+        else:
+            self._stack.pop()
+        self._visible = not any(
+            is_ifttm and in_else for is_ifttm, in_else in self._stack
+        )
+
+    def _flush(self, out, text):
+        if self._visible:
+            out.append(text)
+        self._lines.count(text, self._visible)
+
+
+class _LineCounter:
+    """Count input and output lines and record where they diverge."""
+
+    def __init__(self, track):
+        self.track = track
+        self.sync = []
+        self.in_lines = 1
+        self.out_lines = 1
+        self.offset = 0
+
+    def count(self, text, visible):
+        """Count lines of input (and output if ``visible`` is set)."""
+        lines = text.count("\n")
+        if visible:
+            offset = self.in_lines - self.out_lines
+            if self.track and offset != self.offset:
+                self.sync.append((self.out_lines, self.in_lines))
+                self.offset = offset
+            self.out_lines += lines
+        self.in_lines += lines
+
+
+def _safe_end(buf):
+    """Return end of text that can be scanned without the next chunk.
+
+    A trailing control word or run of backslashes might continue in the next
+    chunk.
+    """
+    idx = len(buf)
+    while idx > 0 and buf[idx - 1].isalpha():
+        idx -= 1
+    backslash = idx
+    while backslash > 0 and buf[backslash - 1] == "\\":
+        backslash -= 1
+    return backslash if backslash < idx else len(buf)
+
+
+def remove_ifttm(infile, outfile, chunk_size=CHUNK_SIZE):
+    r"""Copy LaTeX source from ``infile`` to ``outfile`` without ``\ifttm``.
+
+    :param infile: Input file
+    :type infile: file
+    :param outfile: Output file
+    :type outfile: file
+    :param chunk_size: Size of chunks read from input
+    :type chunk_size: int
+
+    :raises ParseError: if an ``\ifttm`` was not terminated
+    """
+    scanner = IfttmScanner()
+    for chunk in iter(lambda: infile.read(chunk_size), ""):
+        outfile.write(scanner.feed(chunk))
+    outfile.write(scanner.close())
+
+
+def strip_ifttm(source):
+    r"""Return LaTeX source without ``\ifttm``.
+
+    :param source: LaTeX source
+    :type source: str
+
+    :rtype: str
+    :returns: processed source
+
+    :raises ParseError: if an ``\ifttm`` was not terminated
+    """
+    scanner = IfttmScanner()
+    return scanner.feed(source) + scanner.close()
 
 
 def main():
     """Main entry point."""
-    out = re.sub(
-        r"\\ifttm(.*?)\\else.*?\\fi([%\s\\])",
-        r"\1\2",
-        sys.stdin.read(),
-        flags=re.DOTALL,
-    )
-    sys.stdout.write(out)
+    try:
+        remove_ifttm(sys.stdin, sys.stdout)
+    except ParseError as exc:
+        sys.stdout.flush()
+        sys.stderr.write("{}\n".format(exc))
+        sys.exit(1)
     sys.stdout.flush()
 
 
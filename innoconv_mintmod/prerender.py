@@ -0,0 +1,238 @@
+"""Prerender module
+
+Render formulas and TikZ figures at build time using an external command
+(e.g. a MathJax or KaTeX command line tool or a LaTeX to SVG toolchain).
+
+The command receives the source on stdin and writes the rendered markup
+(SVG, MathML or HTML) to stdout. Results are stored in a content-addressed
+cache directory so unchanged sources are never rendered twice, not even
+across builds. Sources are rendered by a pool of concurrent renderer
+processes, each of them is time-boxed.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import shlex
+import subprocess
+
+from innoconv_mintmod.constants import ENCODING
+
+#: A formula to render
+Formula = namedtuple("Formula", ["tex", "display"])
+
+
+def normalize_tikz(code):
+    """Normalize TikZ code so that formatting changes keep the cache valid.
+
+    Trailing whitespace and blank lines are removed.
+
+    :param code: TikZ code
+    :type code: str
+
+    :rtype: str
+    :returns: normalized code
+    """
+    return "\n".join(line.rstrip() for line in code.splitlines() if line.strip())
+
+
+class CommandRenderer:
+    """Render sources with an external command and cache the results.
+
+    The command receives the source on stdin and writes the result to
+    stdout. Results are stored in ``cache_dir`` named by a hash of the
+    command and the source.
+
+    :param command: Renderer command line
+    :type command: str
+    :param cache_dir: Directory of rendered sources
+    :type cache_dir: str
+    :param jobs: Number of concurrent renderer processes
+    :type jobs: int
+    :param timeout: Timeout for rendering a single source in seconds
+    :type timeout: float
+    """
+
+    def __init__(self, command, cache_dir, jobs=1, timeout=30):
+        self.command = command
+        self.cache_dir = cache_dir
+        self.jobs = max(jobs, 1)
+        self.timeout = timeout
+        self.rendered = 0
+        self.cached = 0
+        self.failed = 0
+
+    def key(self, source):
+        """Return the cache key of a source.
+
+        The key covers the renderer command, so changing the renderer
+        invalidates the cache.
+
+        :param source: Source
+        :type source: object
+
+        :rtype: str
+        :returns: key
+        """
+        data = "\0".join((self.command,) + self._key_data(source))
+        return hashlib.sha1(data.encode(ENCODING)).hexdigest()
+
+    def path(self, key):
+        """Return the path of a cached result.
+
+        :param key: Key
+        :type key: str
+
+        :rtype: str
+        :returns: path
+        """
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def render_paths(self, sources):
+        """Render sources (cached results are reused).
+
+        :param sources: Sources to render
+        :type sources: iterable
+
+        :rtype: dict
+        :returns: mapping of sources to paths of the results (failed sources
+            are missing)
+        """
+        # sources with the same key share a result, render each key once
+        groups = {}
+        for source in set(sources):
+            groups.setdefault(self.key(source), []).append(source)
+
+        results = {}
+        missing = []
+        for key, group in groups.items():
+            path = self.path(key)
+            if os.path.exists(path):
+                results.update(dict.fromkeys(group, path))
+                self.cached += 1
+            else:
+                missing.append(group)
+
+        # long sources first so they don't delay the end
+        missing.sort(key=lambda group: -len(self._input(group[0])))
+        firsts = [group[0] for group in missing]
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for group, path in zip(missing, executor.map(self._render, firsts)):
+                if path is None:
+                    self.failed += 1
+                else:
+                    results.update(dict.fromkeys(group, path))
+                    self.rendered += 1
+        return results
+
+    def _render(self, source):
+        """Run the renderer and store the result in the cache."""
+        env = os.environ.copy()
+        env.update(self._environ(source))
+        try:
+            proc = subprocess.run(
+                shlex.split(self.command),
+                input=self._input(source).encode(ENCODING),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                env=env,
+                timeout=self.timeout,
+                check=True,
+            )
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+        # write atomically as several builds might share the cache
+        path = self.path(self.key(source))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "wb") as cache_file:
+            cache_file.write(proc.stdout)
+        os.replace(tmp_path, path)
+        return path
+
+    def _key_data(self, source):
+        """Return strings identifying a source."""
+        return (source,)
+
+    def _input(self, source):
+        """Return the input of the renderer command."""
+        return source
+
+    def _environ(self, source):  # pylint: disable=unused-argument,no-self-use
+        """Return environment variables for the renderer command."""
+        return {}
+
+    def report(self):
+        """Return a summary of the statistics.
+
+        :rtype: str
+        :returns: summary
+        """
+        return "{} rendered, {} cached, {} failed".format(
+            self.rendered, self.cached, self.failed
+        )
+
+
+class MathRenderer(CommandRenderer):
+    """Render formulas (see :class:`CommandRenderer`).
+
+    ``INNOCONV_MATH_DISPLAY`` is set to ``1`` for display math.
+    """
+
+    def render(self, formulas):
+        """Render formulas (cached results are reused).
+
+        :param formulas: Formulas to render
+        :type formulas: iterable of :class:`Formula`
+
+        :rtype: dict
+        :returns: mapping of formulas to rendered markup (failed formulas are
+            missing)
+        """
+        results = {}
+        for formula, path in self.render_paths(formulas).items():
+            with open(path, "r", encoding=ENCODING) as cache_file:
+                results[formula] = cache_file.read()
+        return results
+
+    def _key_data(self, source):
+        return ("1" if source.display else "", source.tex)
+
+    def _input(self, source):
+        return source.tex
+
+    def _environ(self, source):
+        return {"INNOCONV_MATH_DISPLAY": "1" if source.display else ""}
+
+
+class TikzRenderer(CommandRenderer):
+    """Render TikZ code to SVG files (see :class:`CommandRenderer`).
+
+    Files are named ``<key>.svg`` so the cache directory can be published.
+    The cache key covers the normalized code (see :func:`normalize_tikz`)
+    and the preamble. ``INNOCONV_TIKZ_PREAMBLE`` is set to the path of the
+    preamble file.
+
+    :param preamble: Path of a preamble file (its content is part of the
+        cache key)
+    :type preamble: str
+    """
+
+    def __init__(self, command, cache_dir, preamble=None, **kwargs):
+        super().__init__(command, cache_dir, **kwargs)
+        self.preamble = preamble
+        self._preamble_code = ""
+        if preamble:
+            with open(preamble, "r", encoding=ENCODING) as preamble_file:
+                self._preamble_code = preamble_file.read()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, "{}.svg".format(key))
+
+    def _key_data(self, source):
+        return (self._preamble_code, normalize_tikz(source))
+
+    def _environ(self, source):
+        return {"INNOCONV_TIKZ_PREAMBLE": self.preamble or ""}
@@ -0,0 +1,58 @@
+r"""Rewrite module
+
+Some mintmod constructs are purely syntactic aliases Pandoc can't parse (e.g.
+``\begin{MExerciseItems}`` inside of an ``itemize``). Instead of re-parsing
+them in the filter they are rewritten in the LaTeX source before the first
+Pandoc pass according to :data:`innoconv_mintmod.constants.SOURCE_REWRITES`.
+"""
+
+import re
+
+from innoconv_mintmod.constants import SOURCE_REWRITES
+from innoconv_mintmod.mintmod_ifttm import CHUNK_SIZE, IfttmScanner
+
+_RULES = tuple((re.compile(pattern), repl) for pattern, repl in SOURCE_REWRITES)
+
+
+def rewrite_source(source):
+    """Apply source rewrite rules.
+
+    :param source: LaTeX source
+    :type source: str
+
+    :rtype: str
+    :returns: rewritten source
+    """
+    for pattern, repl in _RULES:
+        source = pattern.sub(repl, source)
+    return source
+
+
+def preprocess(infile, outfile, remove_ifttm=False, chunk_size=CHUNK_SIZE):
+    r"""Copy LaTeX source from ``infile`` to ``outfile`` applying rewrite rules.
+
+    The source is streamed line by line as rewrite rules never span lines.
+
+    :param infile: Input file
+    :type infile: file
+    :param outfile: Output file
+    :type outfile: file
+    :param remove_ifttm: Remove ``\ifttm`` commands
+    :type remove_ifttm: bool
+    :param chunk_size: Size of chunks read from input
+    :type chunk_size: int
+
+    :raises ParseError: if an ``\ifttm`` was not terminated
+    """
+    scanner = IfttmScanner() if remove_ifttm else None
+    rest = ""
+    for chunk in iter(lambda: infile.read(chunk_size), ""):
+        if scanner:
+            chunk = scanner.feed(chunk)
+        text = rest + chunk
+        cut = text.rfind("\n") + 1
+        outfile.write(rewrite_source(text[:cut]))
+        rest = text[cut:]
+    if scanner:
+        rest += scanner.close()
+    outfile.write(rewrite_source(rest))
@@ -2,14 +2,31 @@
 
 import os
 import subprocess
+import sys
+import tempfile
 
 from innoconv_mintmod.constants import (
+    DEFAULT_CACHE_DIR,
     PANZER_SUPPORT_DIR,
     PANZER_TIMEOUT,
     DEFAULT_OUTPUT_FORMAT,
     OUTPUT_FORMAT_EXT_MAP,
     DEFAULT_INPUT_FORMAT,
+    DEFAULT_MARKDOWN_WRITER,
+    DEFAULT_TIKZ_TIMEOUT,
+    FLATTENED_FILENAME,
+    HANDLER_STATS_FILENAME,
+    MATH_CACHE_FILENAME,
+    MATH_MACROS_FILENAME,
+    MATH_RENDER_CACHE_DIRNAME,
+    TIKZ_ASSETS_URL,
+    PREPROCESSED_FILENAME,
+    SOURCE_MAP_FILENAME,
+    TIMINGS_FILENAME,
 )
+from innoconv_mintmod.flatten import SourceMap, flatten
+from innoconv_mintmod.mintmod_filter.math import write_macro_config
+from innoconv_mintmod.rewrite import preprocess
 
 
 class InnoconvRunner:
@@ -28,9 +45,24 @@ class InnoconvRunner:
         input_format=DEFAULT_INPUT_FORMAT,
         output_format=DEFAULT_OUTPUT_FORMAT,
         generate_innodoc_markdown=False,
+        markdown_writer=DEFAULT_MARKDOWN_WRITER,
         debug=False,
+        jobs=1,
+        min_jobs=1,
+        memory_headroom=None,
+        flatten_input=False,
+        remove_ifttm=False,
+        math_cache=True,
+        math_macros=False,
+        math_table=False,
+        math_renderer=None,
+        tikz_assets=False,
+        tikz_renderer=None,
+        tikz_preamble=None,
+        tikz_timeout=DEFAULT_TIKZ_TIMEOUT,
+        cache_dir=DEFAULT_CACHE_DIR,
     ):
-        # pylint: disable=too-many-arguments
+        # pylint: disable=too-many-arguments,too-many-locals
         self.source = source
         self.output_dir_base = output_dir_base
         self.language_code = language_code
@@ -40,7 +72,22 @@ class InnoconvRunner:
         self.input_format = input_format
         self.output_format = output_format
         self.generate_innodoc_markdown = generate_innodoc_markdown
+        self.markdown_writer = markdown_writer
         self.debug = debug
+        self.jobs = jobs
+        self.min_jobs = min_jobs
+        self.memory_headroom = memory_headroom
+        self.flatten_input = flatten_input
+        self.remove_ifttm = remove_ifttm
+        self.math_cache = math_cache
+        self.math_macros = math_macros
+        self.math_table = math_table
+        self.math_renderer = math_renderer
+        self.tikz_assets = tikz_assets
+        self.tikz_renderer = tikz_renderer
+        self.tikz_preamble = tikz_preamble
+        self.tikz_timeout = tikz_timeout
+        self.cache_dir = cache_dir
 
     def run(self):
         """Setup paths and options and run the panzer command.
@@ -48,7 +95,58 @@ class InnoconvRunner:
         :rtype: str
         :returns: output filename
         """
+        source_dir, source_file, output_dir, filename = self._resolve_paths()
 
+        # create output directory
+        os.makedirs(output_dir, exist_ok=True)
+
+        # data kept between builds is not published with the output
+        cache_dir = os.path.abspath(
+            os.path.join(
+                self.cache_dir, os.path.relpath(output_dir, self.output_dir_base)
+            )
+        )
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # output filename
+        filename_path = os.path.abspath(os.path.join(output_dir, filename))
+
+        env = os.environ.copy()
+        style = self._set_debug_env(env)
+        self._set_exercise_env(env)
+        self._set_jobs_env(env, cache_dir)
+        self._set_math_env(env, output_dir, cache_dir)
+        self._set_math_renderer_env(env)
+        self._set_tikz_env(env)
+
+        # intermediate files of this build are removed afterwards
+        with tempfile.TemporaryDirectory(prefix="innoconv-") as build_dir:
+            env["INNOCONV_HANDLER_STATS_FILE"] = os.path.join(
+                build_dir, HANDLER_STATS_FILENAME
+            )
+            source_file, source_map = self._prepare_source(
+                os.path.join(source_dir, os.path.basename(source_file)), build_dir
+            )
+
+            cmd = [
+                "panzer",
+                "---panzer-support",
+                PANZER_SUPPORT_DIR,
+                "--metadata=style:{}".format(style),
+                "--metadata=lang:{}".format(self.language_code),
+                "--from={}".format(self.input_format),
+                "--to={}".format(self.output_format),
+                "--standalone",
+                "--output={}".format(filename_path),
+                source_file,
+            ]
+            self._run_panzer(cmd, source_dir, env, source_map)
+
+        return filename_path
+
+    def _resolve_paths(self):
+        """Return source directory, source file, output directory and output
+        filename."""
         if os.path.isdir(self.source):
             source_dir = os.path.join(self.source, self.language_code)
             filename = "index.{}".format(OUTPUT_FORMAT_EXT_MAP[self.output_format])
@@ -64,26 +162,22 @@ class InnoconvRunner:
             output_dir = self.output_dir_base
         else:
             raise FileNotFoundError("Couldn't find {}".format(self.source))
+        return source_dir, source_file, output_dir, filename
 
-        # create output directory
-        os.makedirs(output_dir, exist_ok=True)
-
-        # output filename
-        filename_path = os.path.abspath(os.path.join(output_dir, filename))
-
-        # set debug mode
-        env = os.environ.copy()
-        if self.debug and self.generate_innodoc:
+    def _set_debug_env(self, env):
+        """Set debug mode and return the panzer style."""
+        if self.debug:
             env["INNOCONV_DEBUG"] = "1"
-            style = "innoconv-debug-generate-innodoc"
-        elif self.debug:
-            env["INNOCONV_DEBUG"] = "1"
-            style = "innoconv-debug"
-        elif self.generate_innodoc:
-            style = "innoconv-generate-innodoc"
-        else:
-            style = "innoconv"
+        if self.debug and self.generate_innodoc:
+            return "innoconv-debug-generate-innodoc"
+        if self.debug:
+            return "innoconv-debug"
+        if self.generate_innodoc:
+            return "innoconv-generate-innodoc"
+        return "innoconv"
 
+    def _set_exercise_env(self, env):
+        """Set options that change the converted content."""
         if self.ignore_exercises:
             env["INNOCONV_IGNORE_EXERCISES"] = "1"
 
@@ -92,24 +186,119 @@ class InnoconvRunner:
 
         if self.generate_innodoc_markdown:
             env["INNOCONV_GENERATE_INNODOC_MARKDOWN"] = "1"
+            env["INNOCONV_MARKDOWN_WRITER"] = self.markdown_writer
+
+        if self.remove_ifttm:
+            env["INNOCONV_REMOVE_IFTTM"] = "1"
+
+    def _set_jobs_env(self, env, cache_dir):
+        """Set number of workers and where to keep their timings."""
+        env["INNOCONV_JOBS"] = str(self.jobs)
+        env["INNOCONV_MIN_JOBS"] = str(self.min_jobs)
+        if self.memory_headroom is not None:
+            env["INNOCONV_MEMORY_HEADROOM"] = str(self.memory_headroom)
+        env["INNOCONV_TIMINGS_FILE"] = os.path.join(cache_dir, TIMINGS_FILENAME)
+
+    def _set_math_env(self, env, output_dir, cache_dir):
+        """Set math cache, macro and table options."""
+        # normalized math is kept between builds
+        _set_or_remove(
+            env,
+            "INNOCONV_MATH_CACHE_FILE",
+            self.math_cache and os.path.join(cache_dir, MATH_CACHE_FILENAME),
+        )
+
+        # keep macro aliases in math and write their definitions
+        _set_or_remove(env, "INNOCONV_MATH_MACROS", self.math_macros and "1")
+        if self.math_macros:
+            write_macro_config(os.path.join(output_dir, MATH_MACROS_FILENAME))
+
+        # collect unique formulas in a table
+        _set_or_remove(env, "INNOCONV_MATH_TABLE", self.math_table and "1")
+
+    def _set_math_renderer_env(self, env):
+        """Render formulas at build time (cache is shared by all languages)."""
+        _set_or_remove(env, "INNOCONV_MATH_RENDERER", self.math_renderer)
+        if self.math_renderer:
+            env["INNOCONV_MATH_RENDER_CACHE"] = os.path.join(
+                os.path.abspath(self.cache_dir), MATH_RENDER_CACHE_DIRNAME
+            )
+
+    def _set_tikz_env(self, env):
+        """Set TikZ asset and renderer options."""
+        tikz_dir = os.path.join(os.path.abspath(self.output_dir_base), TIKZ_ASSETS_URL)
+
+        # TikZ code is stored once for all sections and languages
+        _set_or_remove(env, "INNOCONV_TIKZ_ASSETS_DIR", self.tikz_assets and tikz_dir)
 
-        cmd = [
-            "panzer",
-            "---panzer-support",
-            PANZER_SUPPORT_DIR,
-            "--metadata=style:{}".format(style),
-            "--metadata=lang:{}".format(self.language_code),
-            "--from={}".format(self.input_format),
-            "--to={}".format(self.output_format),
-            "--standalone",
-            "--output={}".format(filename_path),
-            source_file,
-        ]
-
-        proc = subprocess.Popen(cmd, cwd=source_dir, stderr=subprocess.STDOUT, env=env)
+        # render TikZ figures to SVG (rendered files are kept between builds)
+        _set_or_remove(env, "INNOCONV_TIKZ_RENDERER", self.tikz_renderer)
+        if self.tikz_renderer:
+            env["INNOCONV_TIKZ_SVG_DIR"] = tikz_dir
+            env["INNOCONV_TIKZ_TIMEOUT"] = str(self.tikz_timeout)
+            _set_or_remove(
+                env,
+                "INNOCONV_TIKZ_PREAMBLE_FILE",
+                self.tikz_preamble and os.path.abspath(self.tikz_preamble),
+            )
+
+    def _prepare_source(self, source_path, build_dir):
+        """Flatten or preprocess the source file.
+
+        :rtype: (str, :class:`innoconv_mintmod.flatten.SourceMap`)
+        :returns: file passed to panzer and source map (``None`` if the
+            source wasn't flattened)
+        """
+        # inline \input files so Pandoc parses the whole source at once
+        if self.flatten_input:
+            source_map = SourceMap()
+            flattened = flatten(
+                source_path,
+                os.path.dirname(source_path),
+                source_map,
+                remove_ifttm=self.remove_ifttm,
+            )
+            source_file = os.path.join(build_dir, FLATTENED_FILENAME)
+            with open(source_file, "w") as flattened_file:
+                flattened_file.write(flattened)
+            source_map.save(os.path.join(build_dir, SOURCE_MAP_FILENAME))
+            return source_file, source_map
+
+        # apply source rewrite rules before Pandoc sees the source
+        preprocessed = os.path.join(build_dir, PREPROCESSED_FILENAME)
+        with open(source_path, "r") as infile:
+            with open(preprocessed, "w") as outfile:
+                preprocess(infile, outfile, remove_ifttm=self.remove_ifttm)
+        return preprocessed, None
+
+    @staticmethod
+    def _run_panzer(cmd, source_dir, env, source_map):
+        """Run panzer and point error messages back to the original files."""
+        if source_map is None:
+            proc = subprocess.Popen(
+                cmd, cwd=source_dir, stderr=subprocess.STDOUT, env=env
+            )
+        else:
+            proc = subprocess.Popen(
+                cmd,
+                cwd=source_dir,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                env=env,
+                universal_newlines=True,
+            )
+            for line in source_map.translate_output(proc.stdout):
+                sys.stdout.write(line)
+            sys.stdout.flush()
 
         return_code = proc.wait(timeout=PANZER_TIMEOUT)
         if return_code != 0:
             raise RuntimeError("Failed to run panzer!")
 
-        return filename_path
+
+def _set_or_remove(env, name, value):
+    """Set an environment variable or remove it if ``value`` is empty."""
+    if value:
+        env[name] = value
+    else:
+        env.pop(name, None)
@@ -0,0 +1,189 @@
+"""Scheduler module
+
+Independent units of work (environment fragments, chapters) are dispatched to
+a pool of workers. As a single huge job that starts last determines the total
+run time, jobs are submitted longest-first.
+
+The cost of a job is estimated from its source size and nesting count. If a
+timing from an earlier build is known it takes precedence over the estimate.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from innoconv_mintmod.constants import ENCODING
+
+#: Cost of a single nested environment or input in characters
+NESTING_COST = 2000
+
+
+def estimate_cost(source):
+    r"""Estimate the relative cost of converting a LaTeX source.
+
+    Every nested environment or ``\input`` means another panzer run and is
+    weighted accordingly.
+
+    :param source: LaTeX source
+    :type source: str
+
+    :rtype: int
+    :returns: estimated cost
+    """
+    nesting = source.count(r"\begin{") + source.count(r"\input{")
+    return len(source) + NESTING_COST * nesting
+
+
+class TimingHistory:
+    """Timings of jobs from earlier builds.
+
+    Timings are keyed by a hash of the job source and stored as JSON file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.timings = {}
+        if path:
+            try:
+                with open(path, "r") as timings_file:
+                    self.timings = json.load(timings_file)
+            except (FileNotFoundError, ValueError):
+                pass
+
+    @staticmethod
+    def key(source):
+        """Return history key for a source.
+
+        :param source: Job source
+        :type source: str
+
+        :rtype: str
+        :returns: key
+        """
+        return hashlib.sha1(source.encode(ENCODING)).hexdigest()
+
+    def get(self, source):
+        """Return timing of an earlier build in seconds or ``None``.
+
+        :param source: Job source
+        :type source: str
+
+        :rtype: float
+        :returns: timing
+        """
+        try:
+            return self.timings[self.key(source)]["seconds"]
+        except KeyError:
+            return None
+
+    def record(self, source, seconds):
+        """Record the timing for a job.
+
+        :param source: Job source
+        :type source: str
+        :param seconds: Time needed for the job
+        :type seconds: float
+        """
+        self.timings[self.key(source)] = {
+            "seconds": seconds,
+            "cost": estimate_cost(source),
+        }
+
+    def seconds_per_cost(self):
+        """Return seconds per estimated cost unit over all known jobs.
+
+        :rtype: float
+        :returns: rate (might be ``None`` if there's no history)
+        """
+        total_cost = sum(timing["cost"] for timing in self.timings.values())
+        if not total_cost:
+            return None
+        total_seconds = sum(timing["seconds"] for timing in self.timings.values())
+        return total_seconds / total_cost
+
+    def save(self):
+        """Write timings to file."""
+        if not self.path:
+            return
+        tmp_path = "{}.tmp".format(self.path)
+        with open(tmp_path, "w") as timings_file:
+            json.dump(self.timings, timings_file)
+        os.replace(tmp_path, self.path)
+
+
+class Scheduler:
+    """Dispatch jobs to a pool of workers, longest jobs first.
+
+    Jobs need a ``source`` attribute that is used for cost estimation.
+
+    An optional ``limiter`` (e.g.
+    :class:`innoconv_mintmod.limiter.AdaptiveLimiter`) further restricts how
+    many of the ``max_workers`` may run at the same time.
+    """
+
+    def __init__(self, max_workers=1, history=None, limiter=None):
+        self.max_workers = max(1, max_workers)
+        self.history = history or TimingHistory()
+        self.limiter = limiter
+
+    def cost(self, source):
+        """Return expected cost of a job in seconds.
+
+        If no timings are known at all, estimated cost units are returned
+        which is fine for ordering jobs.
+
+        :param source: Job source
+        :type source: str
+
+        :rtype: float
+        :returns: expected cost
+        """
+        seconds = self.history.get(source)
+        if seconds is not None:
+            return seconds
+        rate = self.history.seconds_per_cost()
+        if rate is None:
+            return estimate_cost(source)
+        return estimate_cost(source) * rate
+
+    def order(self, jobs):
+        """Return jobs sorted by expected cost (longest first).
+
+        :param jobs: Jobs
+        :type jobs: list
+
+        :rtype: list
+        :returns: sorted jobs
+        """
+        return sorted(jobs, key=lambda job: self.cost(job.source), reverse=True)
+
+    def map(self, func, jobs):
+        """Run ``func(job)`` for every job and record the timings.
+
+        :param func: Worker function
+        :type func: function
+        :param jobs: Jobs
+        :type jobs: list
+
+        :rtype: list
+        :returns: results in the order of ``jobs``
+        """
+
+        def _run(job):
+            with self.limiter or nullcontext():
+                start = time.monotonic()
+                try:
+                    return func(job)
+                finally:
+                    self.history.record(job.source, time.monotonic() - start)
+
+        indices = sorted(
+            range(len(jobs)), key=lambda idx: self.cost(jobs[idx].source), reverse=True
+        )
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {idx: executor.submit(_run, jobs[idx]) for idx in indices}
+        self.history.save()
+        return [futures[idx].result() for idx in range(len(jobs))]
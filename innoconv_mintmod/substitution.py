@@ -0,0 +1,213 @@
+r"""Substitution module
+
+Apply an ordered table of regex substitutions in a single pass.
+
+All patterns are combined into one alternation (in table order) and scanned
+once. A cheap prefilter skips texts that can't contain any match. Content
+captured by groups is substituted recursively, so rules spanning other
+commands (e.g. ``\Id(\MEU)``) see the same content as with sequential
+application.
+
+The substitutions are applied one after another with :func:`re.sub` instead
+if the single pass could differ from that:
+
+- A rule removes its match entirely (e.g. ``\MTSP``), which joins the
+  neighbouring text (``\Id\MTSP(A)`` becomes ``\Id(A)``).
+- A rule that depends on the text after its command (e.g. ``\Id\(``) is
+  followed by another command, which an earlier rule might rewrite.
+- The result still contains a match (a rule matches only after other rules
+  were applied).
+"""
+
+import re
+
+
+class Substitutions:
+    """Compiled table of regex substitutions.
+
+    :param rules: Pairs of pattern and replacement template (see
+        :func:`re.sub`), every pattern has to start with a backslash
+    :type rules: iterable
+
+    :raises ValueError: if a pattern doesn't start with a backslash
+    """
+
+    def __init__(self, rules):
+        alternatives = []
+        self._rules = {}
+        self._ordered = []
+        triggers = set()
+        unsafe = []
+        group = 1
+        for pattern, repl in rules:
+            if not pattern.startswith("\\\\"):
+                raise ValueError("Pattern must start with a backslash: " + pattern)
+            regex = re.compile(pattern)
+            alternatives.append("({})".format(pattern[2:]))
+            self._rules[group] = (regex, repl)
+            prefixes = _literal_prefixes(pattern)
+            if not repl:
+                unsafe.append(pattern)
+            elif self._ordered and not _NAME_PATTERN.fullmatch(pattern):
+                unsafe.extend(_context_patterns(prefixes))
+            self._ordered.append((regex, repl))
+            triggers.update(prefixes)
+            group += regex.groups + 1
+        self._regex = re.compile(r"\\(?:{})".format("|".join(alternatives)))
+        # texts that need sequential application
+        self._unsafe = re.compile("|".join(unsafe)) if unsafe else None
+        # keep triggers that don't contain another trigger
+        self._triggers = tuple(
+            sorted(
+                trigger
+                for trigger in triggers
+                if not any(
+                    other != trigger and trigger.startswith(other) for other in triggers
+                )
+            )
+        )
+
+    def might_match(self, text):
+        """Check quickly if ``text`` could contain a match.
+
+        :param text: Text
+        :type text: str
+
+        :rtype: bool
+        :returns: ``False`` if there's definitely no match
+        """
+        if "\\" not in text:
+            return False
+        return any(trigger in text for trigger in self._triggers)
+
+    def sub(self, text):
+        """Apply the substitutions.
+
+        :param text: Text
+        :type text: str
+
+        :rtype: str
+        :returns: substituted text
+        """
+        if not self.might_match(text):
+            return text
+        if self._unsafe is not None and self._unsafe.search(text):
+            return self.sub_sequential(text)
+        result = self._regex.sub(self._replace, text)
+        if self.might_match(result) and self._regex.search(result):
+            # a rule matches text produced by other rules (e.g. a group that
+            # only matches after its content was substituted)
+            result = self.sub_sequential(text)
+        return result
+
+    def sub_sequential(self, text):
+        """Apply the substitutions one after another.
+
+        This is the reference implementation :meth:`sub` falls back to.
+
+        :param text: Text
+        :type text: str
+
+        :rtype: str
+        :returns: substituted text
+        """
+        for regex, repl in self._ordered:
+            text = regex.sub(repl, text)
+        return text
+
+    def _replace(self, match):
+        regex, repl = self._rules[match.lastindex]
+        rule_match = regex.match(match.string, match.start())
+        if regex.groups:
+            # substitute captured content first
+            parts = []
+            pos = rule_match.start()
+            for idx in range(1, regex.groups + 1):
+                start, end = rule_match.span(idx)
+                if start < pos:
+                    break
+                parts.append(match.string[pos:start])
+                parts.append(self.sub(rule_match.group(idx)))
+                pos = end
+            else:
+                end = rule_match.end()
+                parts.append(match.string[pos:end])
+                rebuilt = "".join(parts)
+                if rebuilt != rule_match.group():
+                    rule_match = regex.fullmatch(rebuilt) or rule_match
+        return rule_match.expand(repl)
+
+
+# pattern that matches a command name only
+_NAME_PATTERN = re.compile(r"\\\\[A-Za-z]+")
+
+
+def _context_patterns(prefixes):
+    """Return patterns of command names followed by another command.
+
+    :param prefixes: Literal prefixes of a pattern (see
+        :func:`_literal_prefixes`)
+    :type prefixes: list
+
+    :rtype: list
+    :returns: patterns
+    """
+    patterns = []
+    for prefix in prefixes:
+        name = re.match(r"\\[A-Za-z]*", prefix).group()
+        if len(name) > 1:
+            patterns.append(re.escape(name) + r"\\")
+    return patterns
+
+
+def _literal_prefixes(pattern):
+    """Return the literal strings one of which every match starts with.
+
+    Character classes of letters are expanded (up to a few alternatives).
+    """
+    prefixes = [""]
+    groups = []  # prefixes at the start of open groups
+    pos = 0
+    while pos < len(pattern):
+        char = pattern[pos]
+        end = pos + 1
+        if char == "(" and not pattern.startswith("(?", pos):
+            groups.append(prefixes)
+            pos = end
+            continue
+        if char == ")" and groups:
+            start_prefixes = groups.pop()
+            if _is_quantified(pattern, end):
+                return start_prefixes
+            pos = end
+            continue
+        if char == "|":
+            return groups[0] if groups else [""]
+        first = pos + 1
+        if char == "\\":
+            end = pos + 2
+            chars = pattern[first:end]
+            if not chars or chars.isalnum():
+                break  # end of pattern or character class escape
+        elif char == "[":
+            end = pattern.find("]", pos) + 1
+            last = end - 1
+            chars = pattern[first:last]
+            if not end or not chars.isalpha() or len(prefixes) * len(chars) > 16:
+                break
+        elif char.isalnum() or char in "{}" and not _is_quantified(pattern, pos):
+            chars = char
+        else:
+            break
+        if _is_quantified(pattern, end):
+            break
+        prefixes = [prefix + char for prefix in prefixes for char in chars]
+        pos = end
+    return groups[0] if groups else prefixes
+
+
+def _is_quantified(pattern, pos):
+    """Check if there's a quantifier at ``pos``."""
+    return pattern.startswith(("*", "?", "+"), pos) or bool(
+        re.match(r"{\d+(,\d*)?}|{,\d+}", pattern[pos:])
+    )
@@ -3,6 +3,7 @@
 import unittest
 import os
 import tempfile
+from innoconv_mintmod.constants import MATH_CACHE_FILENAME
 from innoconv_mintmod.runner import InnoconvRunner
 
 TEX_CODE = r"""
@@ -61,6 +62,7 @@ class TestGenerateInnodoc(unittest.TestCase):
                 input_format="latex+raw_tex",
                 output_format="json",
                 generate_innodoc_markdown=True,
+                cache_dir=os.path.join(tmpdir, "cache"),
             ).run()
             with open(os.path.join(output_dir_lang, "content.md")) as file:
                 content = file.read()
@@ -70,3 +72,83 @@ class TestGenerateInnodoc(unittest.TestCase):
                 )
                 for link in links:
                     self.assertIn(link, content)
+
+    def test_generate_innodoc_markdown_sections(self):
+        """Test postflight generate_innodoc.py batched Markdown conversion."""
+        lang = "en"
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source_dir = os.path.join(tmpdir, "source")
+            source_lang_dir = os.path.join(source_dir, lang)
+            output_dir_lang = os.path.join(tmpdir, "output", lang)
+            os.makedirs(source_lang_dir)
+            with open(os.path.join(source_lang_dir, "index.tex"), "w+") as file:
+                file.write(TEX_CODE)
+            InnoconvRunner(
+                source_dir,
+                os.path.join(tmpdir, "output"),
+                lang,
+                generate_innodoc=True,
+                input_format="latex+raw_tex",
+                output_format="json",
+                generate_innodoc_markdown=True,
+                cache_dir=os.path.join(tmpdir, "cache"),
+            ).run()
+            sections = (
+                ((), "1", "Einführungstext-für-header-1."),
+                (("000-LABEL_1_1",), "1-1", "MIntro-text-hier."),
+                (("001-LABEL_1_2",), "1-2", "subsection-text-hier."),
+                (
+                    ("001-LABEL_1_2", "000-LABEL_1_2_1"),
+                    "1-2-1",
+                    "subsubsection-text-hier",
+                ),
+            )
+            for path, title, text in sections:
+                with self.subTest(title=title):
+                    filepath = os.path.join(output_dir_lang, *path, "content.md")
+                    with open(filepath) as file:
+                        content = file.read()
+                    self.assertTrue(content.startswith("---\n"))
+                    self.assertRegex(content, r"\ntitle: '?{}'?\n".format(title))
+                    self.assertIn(text, content)
+                    self.assertNotIn("innoconv-section", content)
+
+    def test_generate_innodoc_unchanged_files(self):
+        """Test postflight generate_innodoc.py keeps unchanged files."""
+        lang = "en"
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source_dir = os.path.join(tmpdir, "source")
+            source_lang_dir = os.path.join(source_dir, lang)
+            output_dir_lang = os.path.join(tmpdir, "output", lang)
+            os.makedirs(source_lang_dir)
+            with open(os.path.join(source_lang_dir, "index.tex"), "w+") as file:
+                file.write(TEX_CODE)
+            runner = InnoconvRunner(
+                source_dir,
+                os.path.join(tmpdir, "output"),
+                lang,
+                generate_innodoc=True,
+                input_format="latex+raw_tex",
+                output_format="json",
+                cache_dir=os.path.join(tmpdir, "cache"),
+            )
+            paths = (
+                os.path.join(output_dir_lang, "toc.json"),
+                os.path.join(output_dir_lang, "content.json"),
+                os.path.join(output_dir_lang, "001-LABEL_1_2", "content.json"),
+            )
+            runner.run()
+            mtimes = [os.stat(path).st_mtime_ns for path in paths]
+            runner.run()
+            self.assertEqual([os.stat(path).st_mtime_ns for path in paths], mtimes)
+            # internal files are kept out of the published output
+            files = [
+                name
+                for name in os.listdir(output_dir_lang)
+                if os.path.isfile(os.path.join(output_dir_lang, name))
+            ]
+            self.assertEqual(sorted(files), ["content.json", "toc.json"])
+            cache_dir_lang = os.path.join(tmpdir, "cache", lang)
+            self.assertTrue(
+                os.path.exists(os.path.join(cache_dir_lang, MATH_CACHE_FILENAME))
+            )
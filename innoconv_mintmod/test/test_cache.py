@@ -0,0 +1,113 @@
+"""This are unit tests for innoconv.cache"""
+
+# pylint: disable=missing-docstring
+
+import json
+import os
+import tempfile
+import unittest
+
+from innoconv_mintmod.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_put(self):
+        cache = LRUCache(10)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", "1")
+        self.assertEqual(cache.get("a"), "1")
+        self.assertIn("a", cache)
+        self.assertEqual(len(cache), 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        cache.get("a")
+        cache.put("c", "3")
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+    def test_statistics(self):
+        cache = LRUCache(10)
+        self.assertEqual(cache.hit_rate(), 0.0)
+        cache.put("a", "1")
+        cache.get("a")
+        cache.get("a")
+        cache.get("a")
+        cache.get("b")
+        self.assertEqual(cache.hits, 3)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hit_rate(), 0.75)
+        self.assertGreater(cache.memory(), 0)
+        self.assertIn("75.0% hit rate", cache.report())
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.hits, 0)
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            LRUCache(0)
+
+
+class TestLRUCachePersistence(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "cache.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_save_load(self):
+        cache = LRUCache(10, version="1")
+        cache.put("a", "1")
+        cache.put("b", "2")
+        cache.save(self.path)
+        loaded = LRUCache(10, version="1")
+        loaded.load(self.path)
+        self.assertEqual(loaded.get("a"), "1")
+        self.assertEqual(loaded.get("b"), "2")
+
+    def test_save_merges(self):
+        first = LRUCache(10)
+        first.put("a", "1")
+        first.save(self.path)
+        second = LRUCache(10)
+        second.put("b", "2")
+        second.save(self.path)
+        loaded = LRUCache(10)
+        loaded.load(self.path)
+        self.assertEqual(len(loaded), 2)
+
+    def test_load_keeps_recent_entries(self):
+        stored = LRUCache(2)
+        stored.put("a", "old")
+        stored.put("b", "2")
+        stored.save(self.path)
+        cache = LRUCache(2)
+        cache.put("a", "new")
+        cache.put("c", "3")
+        cache.load(self.path)
+        self.assertEqual(cache.get("a"), "new")
+        self.assertEqual(cache.get("c"), "3")
+        self.assertNotIn("b", cache)
+
+    def test_version_mismatch(self):
+        cache = LRUCache(10, version="1")
+        cache.put("a", "1")
+        cache.save(self.path)
+        other = LRUCache(10, version="2")
+        other.load(self.path)
+        self.assertEqual(len(other), 0)
+
+    def test_missing_or_broken_file(self):
+        cache = LRUCache(10)
+        cache.load(self.path)
+        with open(self.path, "w") as cache_file:
+            cache_file.write("{broken")
+        cache.load(self.path)
+        with open(self.path, "w") as cache_file:
+            json.dump(["unexpected"], cache_file)
+        cache.load(self.path)
+        self.assertEqual(len(cache), 0)
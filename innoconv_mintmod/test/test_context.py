@@ -0,0 +1,99 @@
+"""This are unit tests for innoconv.context"""
+
+# pylint: disable=missing-docstring
+
+import unittest
+import panflute as pf
+
+from innoconv_mintmod.context import (
+    MAX_DEPTH,
+    ConversionContext,
+    bind_context,
+    get_context,
+)
+
+
+class TestConversionContext(unittest.TestCase):
+    def test_environ_roundtrip(self):
+        context = ConversionContext(
+            lang="de", current_dir="/foo", depth=2, remove_exercises=True
+        )
+        environ = {"INNOCONV_IGNORE_EXERCISES": "1"}
+        context.to_environ(environ)
+        self.assertEqual(
+            environ,
+            {
+                "INNOCONV_RECURSION_DEPTH": "2",
+                "INNOCONV_MINTMOD_CURRENT_DIR": "/foo",
+                "INNOCONV_REMOVE_EXERCISES": "1",
+            },
+        )
+        restored = ConversionContext.from_environ(environ)
+        self.assertEqual(restored.current_dir, "/foo")
+        self.assertEqual(restored.depth, 2)
+        self.assertTrue(restored.remove_exercises)
+        self.assertFalse(restored.ignore_exercises)
+        self.assertFalse(restored.remove_ifttm)
+        self.assertFalse(restored.math_macros)
+        self.assertIsNone(restored.tikz_assets_dir)
+
+    def test_from_environ_defaults(self):
+        context = ConversionContext.from_environ({})
+        self.assertIsNone(context.current_dir)
+        self.assertEqual(context.depth, 0)
+        self.assertFalse(context.remove_exercises)
+
+    def test_child(self):
+        context = ConversionContext(
+            lang="en",
+            current_dir="/foo",
+            remove_ifttm=True,
+            math_macros=True,
+            tikz_assets_dir="/assets",
+        )
+        context.remember("label", pf.Header())
+        child = context.child("/bar")
+        self.assertEqual(child.depth, 1)
+        self.assertEqual(child.lang, "en")
+        self.assertEqual(child.current_dir, "/bar")
+        self.assertTrue(child.remove_ifttm)
+        self.assertTrue(child.math_macros)
+        self.assertEqual(child.tikz_assets_dir, "/assets")
+        self.assertIsNone(child.get_remembered("label"))
+        self.assertEqual(child.child().current_dir, "/bar")
+
+    def test_child_depth_exceeded(self):
+        context = ConversionContext(depth=MAX_DEPTH + 1)
+        with self.assertRaises(RuntimeError):
+            context.child()
+
+    def test_remember(self):
+        context = ConversionContext()
+        header = pf.Header()
+        context.remember("label", header)
+        self.assertIs(context.get_remembered("label", keep=True), header)
+        self.assertIs(context.get_remembered("label"), header)
+        self.assertIsNone(context.get_remembered("label"))
+
+
+class TestGetContext(unittest.TestCase):
+    def test_bound_per_document(self):
+        doc1 = pf.Doc(metadata={"lang": "de"})
+        doc2 = pf.Doc(metadata={"lang": "en"})
+        self.assertEqual(get_context(doc1).lang, "de")
+        self.assertEqual(get_context(doc2).lang, "en")
+        self.assertIs(get_context(doc1), get_context(doc1))
+        self.assertIsNot(get_context(doc1), get_context(doc2))
+
+    def test_default(self):
+        doc = pf.Doc(metadata={"lang": "en"})
+        context = ConversionContext(depth=3)
+        self.assertIs(get_context(doc, context), context)
+        self.assertEqual(context.lang, "en")
+        self.assertIs(get_context(doc, ConversionContext()), context)
+
+    def test_bind(self):
+        doc = pf.Doc()
+        context = ConversionContext(lang="de")
+        bind_context(doc, context)
+        self.assertIs(get_context(doc), context)
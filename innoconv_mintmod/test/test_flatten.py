@@ -0,0 +1,112 @@
+"""This are unit tests for innoconv.flatten"""
+
+# pylint: disable=missing-docstring
+
+import os
+import tempfile
+import unittest
+
+from innoconv_mintmod.errors import ParseError
+from innoconv_mintmod.flatten import SourceMap, flatten
+
+
+class TestFlatten(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, path, content):
+        filepath = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, "w") as source_file:
+            source_file.write(content)
+        return filepath
+
+    def test_nested(self):
+        index = self._write("index.tex", "a\n\\input{ch1/ch1.tex}\nz\n")
+        self._write("ch1/ch1.tex", "b\n\\input{ch1/sec}\nc\n")
+        self._write("ch1/sec.tex", "s1\ns2")
+        self.assertEqual(flatten(index), "a\nb\ns1\ns2\n\nc\n\nz\n")
+
+    def test_comment(self):
+        index = self._write(
+            "index.tex", "% \\input{missing}\n100\\% \\input{chapter}\n"
+        )
+        self._write("chapter.tex", "chapter")
+        self.assertEqual(flatten(index), "% \\input{missing}\n100\\% chapter\n\n")
+
+    def test_roulette(self):
+        index = self._write("index.tex", "\\input{ch1/ch1}\n")
+        self._write("ch1/ch1.tex", "\\MDirectRouletteExercises{rou.rtex}{ID}")
+        expected = "\\MDirectRouletteExercises{{{}}}{{ID}}\n\n".format(
+            os.path.join(self.root, "ch1", "rou.rtex")
+        )
+        self.assertEqual(flatten(index), expected)
+
+    def test_recursion(self):
+        index = self._write("index.tex", "\\input{chapter}")
+        self._write("chapter.tex", "\\input{index}")
+        with self.assertRaises(ParseError):
+            flatten(index)
+
+    def test_source_map(self):
+        index = self._write("index.tex", "a\n\\input{chapter}\nb\nc\n")
+        chapter = self._write("chapter.tex", "f1\nf2\n")
+        source_map = SourceMap()
+        flatten(index, source_map=source_map)
+        self.assertEqual(source_map.lookup(1), (index, 1))
+        self.assertEqual(source_map.lookup(2), (chapter, 1))
+        self.assertEqual(source_map.lookup(3), (chapter, 2))
+        self.assertEqual(source_map.lookup(5), (index, 3))
+        self.assertEqual(
+            source_map.translate("Error (line 3, column 1)"),
+            "Error (line 3, column 1) [{}:2]".format(chapter),
+        )
+
+    def test_remove_ifttm(self):
+        index = self._write(
+            "index.tex",
+            "a\n\\ifttm h\n\\else p\n\\input{pdf}\n\\fi\n\\input{chapter}\nb\n",
+        )
+        chapter = self._write("chapter.tex", "f1\n\\ifttm\\else x\ny\n\\fi f2\n")
+        source_map = SourceMap()
+        flattened = flatten(index, source_map=source_map, remove_ifttm=True)
+        self.assertEqual(flattened, "a\n h\n\nf1\n f2\n\nb\n")
+        self.assertEqual(source_map.lookup(3), (index, 5))
+        self.assertEqual(source_map.lookup(5), (chapter, 4))
+        self.assertEqual(source_map.lookup(7), (index, 7))
+
+
+class TestSourceMap(unittest.TestCase):
+    def test_unknown(self):
+        source_map = SourceMap()
+        self.assertEqual(source_map.lookup(5), (None, 5))
+        self.assertEqual(
+            source_map.translate("(line 5, column 2)"), "(line 5, column 2)"
+        )
+
+    def test_translate_output(self):
+        source_map = SourceMap()
+        source_map.add(1, "index.tex", 10)
+        output = [
+            "----- pandoc read -----\n",
+            "Error at (line 2, column 1)\n",
+            "----- filter -----\n",
+            "ERROR: fragment error at (line 2, column 1)\n",
+            "----- pandoc write -----\n",
+            "Warning at (line 3, column 4)\n",
+        ]
+        self.assertEqual(
+            list(source_map.translate_output(output)),
+            [
+                "----- pandoc read -----\n",
+                "Error at (line 2, column 1) [index.tex:11]\n",
+                "----- filter -----\n",
+                "ERROR: fragment error at (line 2, column 1)\n",
+                "----- pandoc write -----\n",
+                "Warning at (line 3, column 4) [index.tex:12]\n",
+            ],
+        )
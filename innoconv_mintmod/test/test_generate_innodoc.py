@@ -0,0 +1,294 @@
+"""This are unit tests for the generate_innodoc postflight script"""
+
+# pylint: disable=missing-docstring
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from mock import patch
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..")
+sys.path.insert(0, os.path.join(ROOT_DIR, ".panzer", "postflight"))
+os.environ.setdefault("PANZER_SHARED", os.path.join(ROOT_DIR, ".panzer", "shared"))
+
+# pylint: disable=wrong-import-position,import-error
+from generate_innodoc import (  # noqa: E402
+    CreateMathTable,
+    ExtractSectionTree,
+    GenerateInnodoc,
+    WriteSections,
+    math_key,
+    write_if_changed,
+)
+
+
+def math(tex, math_type="InlineMath"):
+    return {"t": "Math", "c": [{"t": math_type}, tex]}
+
+
+def para(*inlines):
+    return {"t": "Para", "c": list(inlines)}
+
+
+def text(string):
+    return para({"t": "Str", "c": string})
+
+
+def header(elem_id, title, level=4):
+    return {"t": "Header", "c": [level, [elem_id, [], []], [{"t": "Str", "c": title}]]}
+
+
+def meta(title):
+    return {"title": {"t": "MetaInlines", "c": [{"t": "Str", "c": title}]}}
+
+
+class TestCreateMathTable(unittest.TestCase):
+    def setUp(self):
+        self.sections = [
+            {
+                "id": "000-a",
+                "content": [para(math("x^2"), {"t": "Space"}, math("y"))],
+                "children": [
+                    {
+                        "id": "000-b",
+                        "content": [
+                            {
+                                "t": "Div",
+                                "c": [
+                                    ["", ["info"], []],
+                                    [para(math("x^2", "DisplayMath"))],
+                                ],
+                            }
+                        ],
+                    }
+                ],
+            }
+        ]
+
+    def test_table(self):
+        table = CreateMathTable(self.sections).create()
+        self.assertEqual(
+            table,
+            {
+                math_key("x^2"): {"tex": "x^2", "count": 2},
+                math_key("y"): {"tex": "y", "count": 1},
+            },
+        )
+
+    def test_references(self):
+        CreateMathTable(self.sections).create()
+        inlines = self.sections[0]["content"][0]["c"]
+        self.assertEqual(
+            inlines[0],
+            {
+                "t": "Span",
+                "c": [
+                    ["", ["math"], [["data-math", math_key("x^2")]]],
+                    [{"t": "Math", "c": [{"t": "InlineMath"}, ""]}],
+                ],
+            },
+        )
+        self.assertEqual(inlines[1], {"t": "Space"})
+        div = self.sections[0]["children"][0]["content"][0]
+        span = div["c"][1][0]["c"][0]
+        self.assertEqual(span["c"][0][2], [["data-math", math_key("x^2")]])
+        self.assertEqual(span["c"][1][0]["c"][0], {"t": "DisplayMath"})
+
+    def test_key(self):
+        self.assertEqual(len(math_key("x")), 16)
+        self.assertNotEqual(math_key("x"), math_key("y"))
+
+
+class TestExtractSectionTree(unittest.TestCase):
+    def test_tree(self):
+        nodes = [
+            header("a", "A", 1),
+            text("a"),
+            header("a1", "A1", 2),
+            text("a1"),
+            header("a1x", "A1x", 3),
+            header("b", "B", 1),
+        ]
+        sections, content = ExtractSectionTree(nodes, 1).get_tree()
+        self.assertEqual(content, [])
+        self.assertEqual(
+            sections,
+            [
+                {
+                    "title": [{"t": "Str", "c": "A"}],
+                    "id": "000-a",
+                    "content": [text("a")],
+                    "children": [
+                        {
+                            "title": [{"t": "Str", "c": "A1"}],
+                            "id": "000-a1",
+                            "content": [text("a1")],
+                            "children": [
+                                {"title": [{"t": "Str", "c": "A1x"}], "id": "000-a1x"}
+                            ],
+                        }
+                    ],
+                },
+                {"title": [{"t": "Str", "c": "B"}], "id": "001-b"},
+            ],
+        )
+
+    def test_sibling_numbering(self):
+        nodes = [
+            header("a", "A", 1),
+            header("a1", "A1", 2),
+            header("a2", "A2", 2),
+            header("", "A3", 2),
+            header("b", "B", 1),
+            header("b1", "B1", 2),
+        ]
+        sections, _ = ExtractSectionTree(nodes, 1).get_tree()
+        self.assertEqual([section["id"] for section in sections], ["000-a", "001-b"])
+        self.assertEqual(
+            [child["id"] for child in sections[0]["children"]],
+            ["000-a1", "001-a2", "002"],
+        )
+        self.assertEqual([child["id"] for child in sections[1]["children"]], ["000-b1"])
+
+    def test_leading_content(self):
+        nodes = [text("intro"), header("a", "A", 1), text("a")]
+        sections, content = ExtractSectionTree(nodes, 1).get_tree()
+        self.assertEqual(content, [text("intro")])
+        self.assertEqual(sections[0]["content"], [text("a")])
+
+    def test_skipped_level(self):
+        """Headers skipping a level are content of the current section"""
+        nodes = [header("a", "A", 1), header("x", "X", 3), header("a1", "A1", 2)]
+        sections, _ = ExtractSectionTree(nodes, 1).get_tree()
+        self.assertEqual(sections[0]["content"], [nodes[1]])
+        self.assertEqual([child["id"] for child in sections[0]["children"]], ["000-a1"])
+
+    def test_max_levels(self):
+        """Headers deeper than MAX_LEVELS are content"""
+        nodes = [
+            header("a", "A", 1),
+            header("a1", "A1", 2),
+            header("a1x", "A1x", 3),
+            header("deep", "Deep", 4),
+        ]
+        sections, _ = ExtractSectionTree(nodes, 1).get_tree()
+        innermost = sections[0]["children"][0]["children"][0]
+        self.assertEqual(innermost["content"], [nodes[3]])
+        self.assertNotIn("children", innermost)
+
+
+class TestWriteIfChanged(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "content.md")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def read(self):
+        with open(self.path, encoding="utf-8") as md_file:
+            return md_file.read()
+
+    def test_new_file(self):
+        self.assertTrue(write_if_changed(self.path, "Ä"))
+        self.assertEqual(self.read(), "Ä")
+        self.assertEqual(os.listdir(self.tmpdir.name), ["content.md"])
+
+    def test_unchanged(self):
+        write_if_changed(self.path, "foo")
+        os.utime(self.path, (0, 0))
+        self.assertFalse(write_if_changed(self.path, "foo"))
+        self.assertEqual(os.stat(self.path).st_mtime, 0)
+
+    def test_changed(self):
+        write_if_changed(self.path, "foo")
+        self.assertTrue(write_if_changed(self.path, "bar"))
+        self.assertEqual(self.read(), "bar")
+
+
+class TestGenerateInnodocMathTable(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.outdir = os.path.join(self.tmpdir.name, "de")
+        os.makedirs(self.outdir)
+        self.filepath = os.path.join(self.outdir, "content.json")
+        doc = {
+            "blocks": [
+                {"t": "Header", "c": [1, ["a", [], []], [{"t": "Str", "c": "A"}]]},
+                para(math("x^2")),
+            ],
+            "meta": {"title": {"t": "MetaInlines", "c": [{"t": "Str", "c": "T"}]}},
+        }
+        with open(self.filepath, "w") as doc_file:
+            json.dump(doc, doc_file)
+        options = {
+            "pandoc": {
+                "output": self.filepath,
+                "write": "json",
+                "options": {"r": {"metadata": [["lang:de"]]}},
+            }
+        }
+        patcher = patch("generate_innodoc.panzertools")
+        self.panzertools = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.panzertools.read_options.return_value = options
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_json(self):
+        with patch.dict(os.environ, {"INNOCONV_MATH_TABLE": "1"}):
+            os.environ.pop("INNOCONV_GENERATE_INNODOC_MARKDOWN", None)
+            GenerateInnodoc().main()
+        with open(os.path.join(self.outdir, "math.json")) as math_file:
+            table = json.load(math_file)
+        self.assertEqual(table, {math_key("x^2"): {"tex": "x^2", "count": 1}})
+
+    def test_markdown_warning(self):
+        environ = {
+            "INNOCONV_MATH_TABLE": "1",
+            "INNOCONV_GENERATE_INNODOC_MARKDOWN": "1",
+        }
+        with patch.dict(os.environ, environ):
+            GenerateInnodoc().main()
+        self.panzertools.log.assert_any_call("WARNING", "Math table needs JSON output.")
+        self.assertFalse(os.path.exists(os.path.join(self.outdir, "math.json")))
+
+
+@patch("generate_innodoc.panzertools")
+class TestWriteSectionsMarkdown(unittest.TestCase):
+    def setUp(self):
+        # headers with the same title in different sections (as numbered by
+        # the LaTeX reader)
+        self.items = [
+            ([header("aufgabe-1", "Aufgabe 1"), para(math("x"))], meta("A")),
+            ([header("aufgabe-1-1", "Aufgabe 1"), para(math("y"))], meta("B")),
+            ([para({"t": "Str", "c": "Text"})], meta("C")),
+            ([para({"t": "Str", "c": "Text"})], meta("D")),
+        ]
+
+    def convert(self, writer):
+        # pylint: disable=protected-access
+        with ThreadPoolExecutor(max_workers=writer.jobs) as executor:
+            return writer._convert_sections_to_markdown(self.items, executor)
+
+    def test_headers_converted_on_their_own(self, _):
+        writer = WriteSections([], "", "markdown", jobs=1, native=False)
+        with patch.object(writer, "_run_pandoc", return_value="") as run_mock:
+            with patch.object(writer, "_convert_batch", return_value=["", ""]) as batch:
+                self.convert(writer)
+        self.assertEqual(
+            [call[0][0] for call in run_mock.call_args_list],
+            [self.items[0][0], self.items[1][0]],
+        )
+        batch.assert_called_once_with([self.items[2], self.items[3]])
+
+    @unittest.skipUnless(shutil.which("pandoc"), "pandoc not installed")
+    def test_header_ids(self, _):
+        outputs = self.convert(WriteSections([], "", "markdown", jobs=1, native=False))
+        self.assertIn("#### Aufgabe 1", outputs[0])
+        self.assertIn("#### Aufgabe 1 {#aufgabe-1-1}", outputs[1])
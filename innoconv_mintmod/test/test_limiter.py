@@ -0,0 +1,119 @@
+"""This are unit tests for innoconv.limiter"""
+
+# pylint: disable=missing-docstring
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from mock import patch
+
+from innoconv_mintmod.limiter import AdaptiveLimiter, ProcMemoryProbe
+
+MIB = 1024 * 1024
+
+
+class FakeProbe:
+    def __init__(self, available, rss=0):
+        self._available = available
+        self._rss = rss
+
+    def available(self):
+        return self._available
+
+    def children_rss(self):
+        return self._rss
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+    def setUp(self):
+        patcher = patch("innoconv_mintmod.limiter.log")
+        self.log_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_grow(self):
+        probe = FakeProbe(available=8192 * MIB)
+        limiter = AdaptiveLimiter(1, 4, headroom=1024 * MIB, probe=probe)
+        for expected in (2, 3, 4, 4):
+            self.assertEqual(limiter.adjust(), expected)
+        self.assertTrue(self.log_mock.called)
+
+    def test_shrink(self):
+        probe = FakeProbe(available=8192 * MIB)
+        limiter = AdaptiveLimiter(2, 4, headroom=1024 * MIB, probe=probe)
+        limiter.limit = 4
+        probe._available = 512 * MIB  # pylint: disable=protected-access
+        for expected in (3, 2, 2):
+            self.assertEqual(limiter.adjust(), expected)
+
+    def test_worker_rss(self):
+        """Don't grow if there's no room for another worker."""
+        probe = FakeProbe(available=2048 * MIB, rss=2048 * MIB)
+        limiter = AdaptiveLimiter(1, 4, headroom=1024 * MIB, probe=probe)
+        limiter.active = 1
+        self.assertEqual(limiter.adjust(), 1)
+
+    def test_reserve_starting_workers(self):
+        """Workers that didn't allocate memory yet count as a full worker."""
+        probe = FakeProbe(available=2048 * MIB)
+        limiter = AdaptiveLimiter(1, 16, headroom=1024 * MIB, probe=probe)
+        limiter.limit = 3
+        limiter.active = 3
+        self.assertEqual(limiter.adjust(), 3)
+        probe._rss = 768 * MIB  # pylint: disable=protected-access
+        probe._available = 2816 * MIB  # pylint: disable=protected-access
+        self.assertEqual(limiter.adjust(), 4)
+
+    def test_concurrent_acquire(self):
+        """Threads arriving together don't push the limit to the maximum."""
+        probe = FakeProbe(available=2048 * MIB)
+        limiter = AdaptiveLimiter(1, 16, headroom=1024 * MIB, probe=probe)
+        started = []
+        done = threading.Event()
+
+        def _work():
+            with limiter:
+                started.append(limiter.active)
+                done.wait()
+
+        threads = [threading.Thread(target=_work) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        try:
+            time.sleep(0.2)
+            # 1024 MiB above headroom are enough for 4 workers
+            self.assertEqual(len(started), 4)
+            self.assertEqual(limiter.limit, 4)
+        finally:
+            done.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(started), 16)
+        self.assertEqual(limiter.active, 0)
+
+    def test_context_manager(self):
+        limiter = AdaptiveLimiter(1, 1, probe=FakeProbe(available=None))
+        with limiter:
+            self.assertEqual(limiter.active, 1)
+        self.assertEqual(limiter.active, 0)
+
+    def test_no_memory_info(self):
+        limiter = AdaptiveLimiter(1, 3, probe=FakeProbe(available=None))
+        self.assertEqual(limiter.adjust(), 3)
+
+
+class TestProcMemoryProbe(unittest.TestCase):
+    def test_fake_proc(self):
+        with tempfile.TemporaryDirectory() as proc_dir:
+            with open(os.path.join(proc_dir, "meminfo"), "w") as meminfo:
+                meminfo.write("MemTotal: 8000 kB\nMemAvailable: 4000 kB\n")
+            for pid, ppid in ((10, 1), (11, 10), (12, 11), (13, 1)):
+                os.mkdir(os.path.join(proc_dir, str(pid)))
+                with open(os.path.join(proc_dir, str(pid), "stat"), "w") as stat:
+                    stat.write("{} (some proc) S {} 1 1\n".format(pid, ppid))
+                with open(os.path.join(proc_dir, str(pid), "statm"), "w") as statm:
+                    statm.write("100 {} 0 0 0 0 0\n".format(pid))
+            probe = ProcMemoryProbe(proc_dir)
+            self.assertEqual(probe.available(), 4000 * 1024)
+            self.assertEqual(probe.children_rss(10), (11 + 12) * probe.page_size)
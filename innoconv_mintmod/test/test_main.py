@@ -0,0 +1,45 @@
+"""This are unit tests for innoconv.__main__"""
+
+# pylint: disable=missing-docstring
+
+import os
+import subprocess
+import sys
+import unittest
+
+from innoconv_mintmod.test.utils import ROOT_DIR
+
+
+def run_python(*args):
+    env = os.environ.copy()
+    env["PYTHONPATH"] = ROOT_DIR
+    return subprocess.run(
+        [sys.executable] + list(args),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+
+
+class TestStartup(unittest.TestCase):
+    def test_lazy_imports(self):
+        """CLI module doesn't import heavy modules"""
+        proc = run_python(
+            "-c",
+            "import sys, innoconv_mintmod.__main__; "
+            "print(' '.join(sorted(sys.modules)))",
+        )
+        modules = proc.stdout.decode().split()
+        for module in ("panflute", "innoconv_mintmod.utils", "innoconv_mintmod.runner"):
+            with self.subTest(module=module):
+                self.assertNotIn(module, modules)
+
+    def test_help(self):
+        """--help works without panzer lookup"""
+        proc = run_python("-m", "innoconv_mintmod", "--help")
+        self.assertIn(b"Convert mintmod LaTeX content.", proc.stdout)
+
+    def test_version(self):
+        proc = run_python("-m", "innoconv_mintmod", "--version")
+        self.assertRegex(proc.stdout.decode(), r"\d+\.\d+\.\d+")
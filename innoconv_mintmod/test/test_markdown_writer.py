@@ -0,0 +1,357 @@
+"""This are unit tests for innoconv.markdown_writer"""
+
+# pylint: disable=missing-docstring
+
+import json
+import shutil
+import subprocess
+import unittest
+
+import yaml
+
+from innoconv_mintmod.constants import ENCODING
+from innoconv_mintmod.errors import UnsupportedElement
+from innoconv_mintmod.markdown_writer import (
+    PANDOC_MARKDOWN_COMMAND,
+    MarkdownWriter,
+    escape_text,
+    identifier,
+)
+
+NULL_ATTR = ["", [], []]
+
+
+def text(words):
+    inlines = []
+    for word in words.split(" "):
+        if inlines:
+            inlines.append({"t": "Space"})
+        inlines.append({"t": "Str", "c": word})
+    return inlines
+
+
+def para(words):
+    return {"t": "Para", "c": text(words)}
+
+
+def plain(words):
+    return {"t": "Plain", "c": text(words)}
+
+
+def meta(title):
+    return {"title": {"t": "MetaInlines", "c": text(title)}}
+
+
+#: Section contents as produced by the mintmod filter
+CORPUS = (
+    ("paragraphs", [para("Ein erster Absatz."), para("Und ein zweiter.")]),
+    (
+        "header",
+        [
+            {"t": "Header", "c": [4, ["aufgabe-1", [], []], text("Aufgabe 1")]},
+            {"t": "Header", "c": [4, ["custom", [], []], text("Aufgabe 1")]},
+            {"t": "Header", "c": [5, ["", ["unnumbered"], []], text("Lösung")]},
+        ],
+    ),
+    (
+        "math",
+        [
+            {
+                "t": "Para",
+                "c": text("Es gilt")
+                + [
+                    {"t": "Space"},
+                    {"t": "Math", "c": [{"t": "InlineMath"}, r"x^2 \geq 0"]},
+                    {"t": "Str", "c": "."},
+                ],
+            },
+            {
+                "t": "Para",
+                "c": [
+                    {
+                        "t": "Math",
+                        "c": [
+                            {"t": "DisplayMath"},
+                            r"\sum_{k=1}^n k = \frac{n(n+1)}{2}",
+                        ],
+                    }
+                ],
+            },
+        ],
+    ),
+    (
+        "emphasis and escapes",
+        [
+            {
+                "t": "Para",
+                "c": [
+                    {"t": "Emph", "c": text("kursiv")},
+                    {"t": "Space"},
+                    {"t": "Strong", "c": text("fett")},
+                    {"t": "Space"},
+                    {"t": "Str", "c": "a*b_c[d]$e"},
+                    {"t": "SoftBreak"},
+                    {"t": "Str", "c": "snake_case"},
+                    {"t": "Space"},
+                    {"t": "Str", "c": "„Anführung“"},
+                    {"t": "LineBreak"},
+                    {"t": "Str", "c": "Ende"},
+                ],
+            }
+        ],
+    ),
+    (
+        "links",
+        [
+            {
+                "t": "Para",
+                "c": [
+                    {
+                        "t": "Link",
+                        "c": [NULL_ATTR, [], ["/section/000-a#label", ""]],
+                    },
+                    {"t": "Space"},
+                    {
+                        "t": "Link",
+                        "c": [
+                            NULL_ATTR,
+                            text("Intro"),
+                            ["/section/000-a/001-b", "Titel"],
+                        ],
+                    },
+                    {"t": "Space"},
+                    {
+                        "t": "Link",
+                        "c": [
+                            NULL_ATTR,
+                            [{"t": "Str", "c": "https://example.org"}],
+                            ["https://example.org", ""],
+                        ],
+                    },
+                ],
+            }
+        ],
+    ),
+    (
+        "image",
+        [
+            {
+                "t": "Para",
+                "c": [
+                    {
+                        "t": "Image",
+                        "c": [
+                            ["", [], [["width", "50%"]]],
+                            text("Bild"),
+                            ["_static/bild.png", "fig:"],
+                        ],
+                    }
+                ],
+            }
+        ],
+    ),
+    (
+        "lists",
+        [
+            {"t": "BulletList", "c": [[plain("eins")], [plain("zwei")]]},
+            para("Dazwischen."),
+            {
+                "t": "OrderedList",
+                "c": [
+                    [1, {"t": "Decimal"}, {"t": "Period"}],
+                    [[para("erstens")], [para("zweitens")]],
+                ],
+            },
+            para("Danach."),
+            {
+                "t": "BulletList",
+                "c": [
+                    [
+                        plain("außen"),
+                        {"t": "BulletList", "c": [[plain("innen")]]},
+                    ]
+                ],
+            },
+        ],
+    ),
+    (
+        "divs and spans",
+        [
+            {
+                "t": "Div",
+                "c": [
+                    ["", ["info"], []],
+                    [
+                        para("Info-Text."),
+                        {
+                            "t": "Div",
+                            "c": [
+                                ["label", ["exercise"], [["points", "2"]]],
+                                [
+                                    {
+                                        "t": "Para",
+                                        "c": [
+                                            {
+                                                "t": "Span",
+                                                "c": [
+                                                    [
+                                                        "",
+                                                        [],
+                                                        [["data-index-term", "Folge"]],
+                                                    ],
+                                                    text("Folge"),
+                                                ],
+                                            }
+                                        ],
+                                    }
+                                ],
+                            ],
+                        },
+                    ],
+                ],
+            }
+        ],
+    ),
+    (
+        "code",
+        [
+            {
+                "t": "CodeBlock",
+                "c": [
+                    ["", ["tikz"], [["src", "_static/tikz/abc.tikz"]]],
+                    "",
+                ],
+            },
+            {"t": "CodeBlock", "c": [["", ["python"], []], "print(1)"]},
+            {"t": "CodeBlock", "c": [NULL_ATTR, "x = 1\n\ny = 2"]},
+            {"t": "Para", "c": [{"t": "Code", "c": [NULL_ATTR, "a_b"]}]},
+        ],
+    ),
+)
+
+
+class TestMarkdownWriter(unittest.TestCase):
+    def write(self, blocks, title="Titel"):
+        return MarkdownWriter().write(blocks, meta(title))
+
+    def test_document(self):
+        self.assertEqual(
+            self.write([para("Text.")]), "---\ntitle: Titel\n---\n\nText.\n"
+        )
+        self.assertEqual(self.write([], "1"), "---\ntitle: '1'\n---\n")
+
+    def test_meta(self):
+        output = MarkdownWriter().write(
+            [],
+            {
+                "title": {"t": "MetaInlines", "c": text("Einführung: $x$")},
+                "type": {"t": "MetaInlines", "c": text("exercises")},
+            },
+        )
+        loaded = yaml.load(output.split("---\n")[1], Loader=yaml.BaseLoader)
+        self.assertEqual(loaded, {"title": r"Einführung: \$x\$", "type": "exercises"})
+
+    def test_header(self):
+        output = MarkdownWriter().blocks(dict(CORPUS)["header"])
+        self.assertEqual(
+            output,
+            "#### Aufgabe 1\n\n#### Aufgabe 1 {#custom}\n\n##### Lösung {.unnumbered}",
+        )
+
+    def test_lists(self):
+        output = MarkdownWriter().blocks(dict(CORPUS)["lists"])
+        self.assertEqual(
+            output,
+            "-   eins\n-   zwei\n\nDazwischen.\n\n1.  erstens\n\n2.  zweitens\n\n"
+            "Danach.\n\n-   außen\n    -   innen",
+        )
+
+    def test_divs_and_spans(self):
+        output = MarkdownWriter().blocks(dict(CORPUS)["divs and spans"])
+        self.assertEqual(
+            output,
+            "::: info\nInfo-Text.\n\n"
+            '::: {#label .exercise points="2"}\n[Folge]{data-index-term="Folge"}\n'
+            ":::\n:::",
+        )
+
+    def test_links(self):
+        output = MarkdownWriter().blocks(dict(CORPUS)["links"])
+        self.assertEqual(
+            output,
+            '[](/section/000-a#label) [Intro](/section/000-a/001-b "Titel") '
+            "<https://example.org>",
+        )
+
+    def test_image(self):
+        output = MarkdownWriter().blocks(dict(CORPUS)["image"])
+        self.assertEqual(output, '![Bild](_static/bild.png){width="50%"}')
+
+    def test_code(self):
+        output = MarkdownWriter().blocks(dict(CORPUS)["code"])
+        self.assertEqual(
+            output,
+            '``` {.tikz src="_static/tikz/abc.tikz"}\n\n```\n\n'
+            "``` python\nprint(1)\n```\n\n"
+            "    x = 1\n\n    y = 2\n\n"
+            "`a_b`",
+        )
+
+    def test_escape_text(self):
+        self.assertEqual(escape_text("a*b_c[d]$e"), r"a\*b_c\[d\]\$e")
+        self.assertEqual(escape_text("snake_case"), "snake_case")
+        self.assertEqual(escape_text("it’s…"), "it's...")
+        self.assertEqual(escape_text("a--b"), r"a\--b")
+
+    def test_identifier(self):
+        self.assertEqual(
+            identifier(text("1.2 Folgen und Reihen!")), "folgen-und-reihen"
+        )
+        self.assertEqual(identifier(text("42")), "")
+
+    def test_unsupported(self):
+        unsupported = (
+            [{"t": "Table", "c": []}],
+            [{"t": "Para", "c": [{"t": "Note", "c": []}]}],
+            [para("1. kein Listenpunkt")],
+            [para("- kein Listenpunkt")],
+            [{"t": "Div", "c": [NULL_ATTR, [para("x")]]}],
+            [{"t": "RawBlock", "c": ["html", "<br>"]}],
+            [
+                {"t": "BulletList", "c": [[plain("a")]]},
+                {"t": "BulletList", "c": [[plain("b")]]},
+            ],
+            [para("#hashtag")],
+        )
+        for blocks in unsupported:
+            with self.subTest(blocks=blocks):
+                with self.assertRaises(UnsupportedElement):
+                    self.write(blocks)
+
+
+@unittest.skipUnless(shutil.which("pandoc"), "pandoc not installed")
+class TestPandocConformance(unittest.TestCase):
+    """Native writer output is the same as pandoc's."""
+
+    @staticmethod
+    def pandoc(blocks, doc_meta):
+        doc = {"blocks": blocks, "pandoc-api-version": [1, 22], "meta": doc_meta}
+        proc = subprocess.run(
+            PANDOC_MARKDOWN_COMMAND,
+            input=json.dumps(doc).encode(ENCODING),
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        return proc.stdout.decode(ENCODING)
+
+    @staticmethod
+    def split(output):
+        _, header, body = output.split("---\n", 2)
+        return yaml.load(header, Loader=yaml.BaseLoader), body.strip("\n")
+
+    def test_corpus(self):
+        for name, blocks in CORPUS:
+            with self.subTest(name=name):
+                doc_meta = meta("Abschnitt {}".format(name))
+                native = self.split(MarkdownWriter().write(blocks, doc_meta))
+                self.assertEqual(native, self.split(self.pandoc(blocks, doc_meta)))
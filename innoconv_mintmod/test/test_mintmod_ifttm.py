@@ -0,0 +1,68 @@
+"""This are unit tests for innoconv.mintmod_ifttm"""
+
+# pylint: disable=missing-docstring
+
+import io
+import unittest
+
+from innoconv_mintmod.errors import ParseError
+from innoconv_mintmod.mintmod_ifttm import IfttmScanner, remove_ifttm, strip_ifttm
+
+
+class TestStripIfttm(unittest.TestCase):
+    def test_else(self):
+        self.assertEqual(strip_ifttm(r"a \ifttm HTML\else PDF\fi b"), "a  HTML b")
+
+    def test_multiline(self):
+        source = "x\\ifttm\n A\n\\else\n B\n\\fi\n y"
+        self.assertEqual(strip_ifttm(source), "x\n A\n\n y")
+
+    def test_without_else(self):
+        self.assertEqual(strip_ifttm(r"\ifttm A\fi b"), " A b")
+
+    def test_nested(self):
+        source = r"\ifttm a\ifttm b\else c\fi d\else e\ifttm f\else g\fi\fi z"
+        self.assertEqual(strip_ifttm(source), " a b d z")
+
+    def test_other_conditionals(self):
+        source = r"\ifttm \ifnum1=1 x\else y\fi\else pdf\fi."
+        self.assertEqual(strip_ifttm(source), r" \ifnum1=1 x\else y\fi.")
+
+    def test_newif(self):
+        source = r"\newif\iffoo\ifttm\iffoo a\else b\fi\else c\fi d"
+        self.assertEqual(strip_ifttm(source), r"\newif\iffoo\iffoo a\else b\fi d")
+
+    def test_comments_and_escapes(self):
+        source = "% \\ifttm\n\\ifttm a%\\else\n\\else b\\fi\\fill 100\\% \\\\"
+        self.assertEqual(
+            strip_ifttm(source), "% \\ifttm\n a%\\else\n\\fill 100\\% \\\\"
+        )
+
+    def test_unmatched(self):
+        self.assertEqual(strip_ifttm(r"a\else b\fi c"), r"a\else b\fi c")
+
+    def test_unterminated(self):
+        with self.assertRaises(ParseError):
+            strip_ifttm(r"a\ifttm b\else c")
+
+
+class TestRemoveIfttm(unittest.TestCase):
+    def test_chunks(self):
+        source = (
+            "% \\ifttm\n\\ifttm a\\\\\\else b\\fi\\fill \\iff "
+            "\\ifttm\\ifx a\\else b\\fi\\else c\\fi end\\"
+        )
+        expected = strip_ifttm(source)
+        for chunk_size in range(1, 8):
+            out = io.StringIO()
+            remove_ifttm(io.StringIO(source), out, chunk_size=chunk_size)
+            self.assertEqual(out.getvalue(), expected)
+
+
+class TestIfttmScanner(unittest.TestCase):
+    def test_line_sync(self):
+        scanner = IfttmScanner(track_lines=True)
+        out = scanner.feed("l1\n\\ifttm h2\n\\else p2\np3\np4\n\\fi l5\nl6")
+        out += scanner.close()
+        self.assertEqual(out, "l1\n h2\n l5\nl6")
+        self.assertEqual(scanner.line_sync, [(3, 6)])
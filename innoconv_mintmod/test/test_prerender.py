@@ -0,0 +1,136 @@
+"""This are unit tests for innoconv.prerender"""
+
+# pylint: disable=missing-docstring
+
+import os
+import sys
+import tempfile
+import unittest
+
+from innoconv_mintmod.prerender import (
+    Formula,
+    MathRenderer,
+    TikzRenderer,
+    normalize_tikz,
+)
+
+STUB_RENDERER = (
+    "{} -c \"import os, sys; print('<svg data-display=\\\\'{{}}\\\\'>{{}}</svg>'"
+    ".format(os.environ['INNOCONV_MATH_DISPLAY'], sys.stdin.read()), end='')\""
+).format(sys.executable)
+
+STUB_TIKZ_RENDERER = (
+    "{} -c \"import os, sys; print('<svg data-preamble=\\'{{}}\\'>{{}}</svg>'"
+    ".format(os.environ['INNOCONV_TIKZ_PREAMBLE'], len(sys.stdin.read())), "
+    "end='')\""
+).format(sys.executable)
+
+
+class TestMathRenderer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, "cache")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_render(self):
+        renderer = MathRenderer(STUB_RENDERER, self.cache_dir, jobs=2)
+        formulas = [Formula("x^2", False), Formula("x^2", True), Formula("y", False)]
+        results = renderer.render(formulas + formulas)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(
+            results[Formula("x^2", False)], "<svg data-display=''>x^2</svg>"
+        )
+        self.assertEqual(
+            results[Formula("x^2", True)], "<svg data-display='1'>x^2</svg>"
+        )
+        self.assertEqual(renderer.rendered, 3)
+        self.assertEqual(renderer.cached, 0)
+
+    def test_cached_across_runs(self):
+        MathRenderer(STUB_RENDERER, self.cache_dir).render([Formula("z", False)])
+        # same command, but rendering would fail now
+        renderer = MathRenderer(STUB_RENDERER, self.cache_dir)
+        renderer._render = None  # pylint: disable=protected-access
+        results = renderer.render([Formula("z", False)])
+        self.assertEqual(results[Formula("z", False)], "<svg data-display=''>z</svg>")
+        self.assertEqual(renderer.cached, 1)
+        self.assertEqual(renderer.rendered, 0)
+
+    def test_key_depends_on_command(self):
+        formula = Formula("x", False)
+        key = MathRenderer("a", self.cache_dir).key(formula)
+        self.assertNotEqual(key, MathRenderer("b", self.cache_dir).key(formula))
+        self.assertNotEqual(
+            key, MathRenderer("a", self.cache_dir).key(Formula("x", True))
+        )
+
+    def test_failing_renderer(self):
+        renderer = MathRenderer("false", self.cache_dir)
+        self.assertEqual(renderer.render([Formula("x", False)]), {})
+        self.assertEqual(renderer.failed, 1)
+        self.assertIn("1 failed", renderer.report())
+
+    def test_missing_renderer(self):
+        renderer = MathRenderer("/nonexistent/renderer", self.cache_dir)
+        self.assertEqual(renderer.render([Formula("x", False)]), {})
+        self.assertEqual(renderer.failed, 1)
+
+
+class TestTikzRenderer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.svg_dir = os.path.join(self.tmp_dir.name, "tikz")
+        self.preamble = os.path.join(self.tmp_dir.name, "preamble.tex")
+        with open(self.preamble, "w") as preamble_file:
+            preamble_file.write("\\usetikzlibrary{arrows}")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_render(self):
+        renderer = TikzRenderer(
+            STUB_TIKZ_RENDERER, self.svg_dir, preamble=self.preamble, jobs=2
+        )
+        paths = renderer.render_paths(["\\draw (0,0) -- (1,1);", "\\fill (0,0);"])
+        path = paths["\\draw (0,0) -- (1,1);"]
+        self.assertEqual(os.path.dirname(path), self.svg_dir)
+        self.assertTrue(path.endswith(".svg"))
+        with open(path) as svg_file:
+            self.assertEqual(
+                svg_file.read(),
+                "<svg data-preamble='{}'>21</svg>".format(self.preamble),
+            )
+        self.assertEqual(renderer.rendered, 2)
+
+    def test_only_changed_figures(self):
+        TikzRenderer(STUB_TIKZ_RENDERER, self.svg_dir).render_paths(["\\draw;"])
+        renderer = TikzRenderer(STUB_TIKZ_RENDERER, self.svg_dir)
+        renderer.render_paths(["\\draw;  \n\n", "\\fill;"])
+        self.assertEqual(renderer.cached, 1)
+        self.assertEqual(renderer.rendered, 1)
+
+    def test_same_key_rendered_once(self):
+        renderer = TikzRenderer(STUB_TIKZ_RENDERER, self.svg_dir, jobs=2)
+        paths = renderer.render_paths(["\\draw;", "\\draw;  \n\n", "\\draw;\n"])
+        self.assertEqual(len(paths), 3)
+        self.assertEqual(len(set(paths.values())), 1)
+        self.assertEqual(renderer.rendered, 1)
+
+    def test_key_depends_on_preamble(self):
+        key = TikzRenderer("a", self.svg_dir).key("\\draw;")
+        self.assertNotEqual(
+            key, TikzRenderer("a", self.svg_dir, preamble=self.preamble).key("\\draw;")
+        )
+
+    def test_timeout(self):
+        command = '{} -c "import time; time.sleep(5)"'.format(sys.executable)
+        renderer = TikzRenderer(command, self.svg_dir, timeout=0.2)
+        self.assertEqual(renderer.render_paths(["\\draw;"]), {})
+        self.assertEqual(renderer.failed, 1)
+
+    def test_normalize_tikz(self):
+        self.assertEqual(
+            normalize_tikz("  \\draw; \n\n\\fill;\t\n"), "  \\draw;\n\\fill;"
+        )
@@ -0,0 +1,59 @@
+"""This are unit tests for innoconv.rewrite"""
+
+# pylint: disable=missing-docstring
+
+import io
+import unittest
+
+from innoconv_mintmod.rewrite import preprocess, rewrite_source
+
+SOURCE = r"""\begin{itemize}
+\item Foo
+\begin{MExerciseItems}
+\item $|x| = \begin{MCaseEnv} x & x\geq 0 \\ -x & x<0 \end{MCaseEnv}$
+\end{MExerciseItems}
+\end{itemize}
+\begin{MQuestionGroup}
+\MLCheckbox{1}{A}
+\end{MQuestionGroup}
+"""
+
+REWRITTEN = r"""\begin{itemize}
+\item Foo
+\begin{enumerate}
+\item $|x| = \left\lbrace\begin{array}{rl} x & x\geq 0 \\ -x & x<0 \end{array}\right.$
+\end{enumerate}
+\end{itemize}
+
+\MLCheckbox{1}{A}
+
+"""
+
+
+class TestRewriteSource(unittest.TestCase):
+    def test_rewrite_source(self):
+        self.assertEqual(rewrite_source(SOURCE), REWRITTEN)
+
+    def test_lines_preserved(self):
+        self.assertEqual(rewrite_source(SOURCE).count("\n"), SOURCE.count("\n"))
+
+    def test_untouched(self):
+        source = r"\begin{MExercise}\MQuestionGroupFoo\end{MExercise}"
+        self.assertEqual(rewrite_source(source), source)
+
+
+class TestPreprocess(unittest.TestCase):
+    def test_chunks(self):
+        for chunk_size in (1, 5, 64):
+            out = io.StringIO()
+            preprocess(io.StringIO(SOURCE), out, chunk_size=chunk_size)
+            self.assertEqual(out.getvalue(), REWRITTEN)
+
+    def test_remove_ifttm(self):
+        source = "\\ifttm\\begin{MExerciseItems}\\else\\begin{itemize}\\fi\n"
+        for chunk_size in (1, 5, 64):
+            out = io.StringIO()
+            preprocess(
+                io.StringIO(source), out, remove_ifttm=True, chunk_size=chunk_size
+            )
+            self.assertEqual(out.getvalue(), "\\begin{enumerate}\n")
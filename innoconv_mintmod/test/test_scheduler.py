@@ -0,0 +1,75 @@
+"""This are unit tests for innoconv.scheduler"""
+
+# pylint: disable=missing-docstring
+
+import os
+import tempfile
+import threading
+import unittest
+from collections import namedtuple
+
+from innoconv_mintmod.scheduler import Scheduler, TimingHistory, estimate_cost
+
+Job = namedtuple("Job", ["source"])
+
+
+class TestEstimateCost(unittest.TestCase):
+    def test_size(self):
+        self.assertGreater(estimate_cost("a" * 100), estimate_cost("a" * 10))
+
+    def test_nesting(self):
+        nested = r"\begin{MInfo}foo\end{MInfo}"
+        self.assertGreater(estimate_cost(nested), estimate_cost("a" * len(nested)))
+
+
+class TestTimingHistory(unittest.TestCase):
+    def test_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "timings.json")
+            history = TimingHistory(path)
+            self.assertIsNone(history.get("foo"))
+            history.record("foo", 1.5)
+            history.save()
+            self.assertEqual(TimingHistory(path).get("foo"), 1.5)
+
+    def test_broken_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "timings.json")
+            with open(path, "w") as timings_file:
+                timings_file.write("{broken")
+            self.assertEqual(TimingHistory(path).timings, {})
+
+
+class TestScheduler(unittest.TestCase):
+    def test_longest_first(self):
+        """Jobs are dispatched by estimated cost, results keep job order."""
+        jobs = [Job("a" * 10), Job("a" * 1000), Job("a" * 100)]
+        dispatched = []
+        lock = threading.Lock()
+
+        def _func(job):
+            with lock:
+                dispatched.append(len(job.source))
+            return len(job.source)
+
+        results = Scheduler(max_workers=1).map(_func, jobs)
+        self.assertEqual(dispatched, [1000, 100, 10])
+        self.assertEqual(results, [10, 1000, 100])
+
+    def test_history_takes_precedence(self):
+        """Timings of earlier builds override the estimate."""
+        history = TimingHistory()
+        history.record("short", 10.0)
+        history.record("a" * 1000, 0.1)
+        scheduler = Scheduler(history=history)
+        ordered = scheduler.order([Job("a" * 1000), Job("short")])
+        self.assertEqual(ordered[0].source, "short")
+
+    def test_records_timings(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "timings.json")
+            scheduler = Scheduler(max_workers=2, history=TimingHistory(path))
+            scheduler.map(lambda job: None, [Job("foo"), Job("bar")])
+            history = TimingHistory(path)
+            self.assertIsNotNone(history.get("foo"))
+            self.assertIsNotNone(history.get("bar"))
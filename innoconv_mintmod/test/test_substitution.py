@@ -0,0 +1,110 @@
+"""This are unit tests for innoconv.substitution"""
+
+# pylint: disable=missing-docstring
+
+import random
+import re
+import unittest
+
+from innoconv_mintmod.constants import MATH_SUBSTITUTIONS, TIKZ_SUBSTITUTIONS
+from innoconv_mintmod.substitution import Substitutions
+
+FORMULAS = (
+    r"\N \Q {\R} \Z_+ \C^2 \N, \R.",
+    r"\Rightarrow \Re \Name \N\Q",
+    r"x \in \N \MCondSetSep x > 0",
+    r"\MGeoStrecke{A}{B} \MGeoDreieck{A}{B}{C} \MGeoAbstand{P}{g}",
+    r"\Id(\MEU) = \Id \circ \Mid",
+    r"\MZahl{3}{14} \MZXYZhltrennzeichen",
+    r"\MoIl[\left]0;1\MoIr[\right] \MoIl 2 \MIntvlSep 3\MoIr",
+    r"\int_0^1 x \MD x + \jMD y \MDFPSpace \MDVec{AB} \MVec{v} \MVector",
+    r"\begin{MCaseEnv}1 & x \in \Q \\ 0 & \text{sonst}\end{MCaseEnv}",
+    r"\MSep \MGrad \MOhm \MTSP \null \lto \ld(8)",
+    r"\MGeoStrecke{A}{\MEU}",
+    "no commands at all",
+)
+
+
+def _names(pattern):
+    """Return command names matched by a pattern."""
+    name = re.match(r"\\\\([A-Za-z]+|\(\[([A-Z]+)\]\))", pattern)
+    return (
+        ["\\" + char for char in name.group(2)]
+        if name.group(2)
+        else ["\\" + name.group(1)]
+    )
+
+
+def sequential(text):
+    for pattern, repl in MATH_SUBSTITUTIONS:
+        text = re.sub(pattern, repl, text)
+    return text
+
+
+class TestSubstitutions(unittest.TestCase):
+    def setUp(self):
+        self.subs = Substitutions(MATH_SUBSTITUTIONS)
+
+    def test_same_as_sequential(self):
+        for formula in FORMULAS:
+            with self.subTest(formula=formula):
+                self.assertEqual(self.subs.sub(formula), sequential(formula))
+                self.assertEqual(self.subs.sub_sequential(formula), sequential(formula))
+
+    def test_group_content_substituted(self):
+        self.assertEqual(self.subs.sub(r"\Id(\MEU)"), r"\operatorname{Id}(e)")
+
+    def test_adjacent_blackboard(self):
+        self.assertEqual(self.subs.sub(r"\N\Q"), r"\mathbb{N}\Q")
+
+    def test_neighbouring_text(self):
+        """Rules see text joined by earlier rules."""
+        self.assertEqual(self.subs.sub(r"\Id\MTSP(A)"), r"\operatorname{Id}(A)")
+        self.assertEqual(self.subs.sub(r"\Id\null(A)"), r"\operatorname{Id}(A)")
+        self.assertEqual(self.subs.sub(r"\MoIl[\MTSP\left]"), r"\left]")
+
+    def test_random_same_as_sequential(self):
+        tokens = [
+            name for pattern, _ in MATH_SUBSTITUTIONS for name in _names(pattern)
+        ] + ["(", ")", "{A}", "{1}", "{", "}", "[\\left]", "[", "]", " ", "x", ","]
+        rand = random.Random(0)
+        for _ in range(5000):
+            text = "".join(rand.choice(tokens) for _ in range(rand.randint(1, 8)))
+            with self.subTest(text=text):
+                self.assertEqual(self.subs.sub(text), sequential(text))
+
+    def test_order(self):
+        subs = Substitutions(((r"\\ab", "1"), (r"\\abc", "2")))
+        self.assertEqual(subs.sub(r"\abc"), "1c")
+        subs = Substitutions(((r"\\abc", "2"), (r"\\ab", "1")))
+        self.assertEqual(subs.sub(r"\abc \ab"), "2 1")
+
+    def test_prefilter(self):
+        self.assertFalse(self.subs.might_match("x^2 + y^2"))
+        self.assertFalse(self.subs.might_match(r"\alpha + \beta"))
+        self.assertTrue(self.subs.might_match(r"\alpha + \MEU"))
+        self.assertTrue(self.subs.might_match(r"\Q"))
+
+    def test_pattern_without_backslash(self):
+        with self.assertRaises(ValueError):
+            Substitutions(((r"foo", "bar"),))
+
+    def test_no_output_matches_later_rule(self):
+        """Replacements must not create matches for later rules."""
+        for idx, (_, repl) in enumerate(MATH_SUBSTITUTIONS):
+            output = re.sub(r"\\(\d)", "A", repl).replace("\\\\", "\\")
+            later = idx + 1
+            for pattern, _ in MATH_SUBSTITUTIONS[later:]:
+                with self.subTest(repl=repl, pattern=pattern):
+                    self.assertIsNone(re.search(pattern, output))
+
+    def test_tikz_same_as_sequential(self):
+        subs = Substitutions(TIKZ_SUBSTITUTIONS)
+        code = (
+            r"\draw[\jccolorfkt] (0,0) -- (1,1) node {$\MZahl{1}{5}\MEinheit{m}$};"
+            r"\fill[\jccolorfktareahell] \MPointTwo{1}{2} \MVector{1\\2} \MVec{v}"
+        )
+        expected = code
+        for pattern, repl in TIKZ_SUBSTITUTIONS:
+            expected = re.sub(pattern, repl, expected)
+        self.assertEqual(subs.sub(code), expected)
@@ -0,0 +1,100 @@
+"""This are unit tests for innoconv.tokenizer"""
+
+# pylint: disable=missing-docstring
+
+import unittest
+
+from innoconv_mintmod.errors import ParseError
+from innoconv_mintmod.tokenizer import (
+    Command,
+    commands_regex,
+    iter_commands,
+    match_group,
+    parse_arguments,
+    parse_command,
+)
+
+
+class TestMatchGroup(unittest.TestCase):
+    def test_nested(self):
+        text = r"{a{b{c}}d}rest"
+        self.assertEqual(match_group(text, 0), len(text) - 4)
+
+    def test_escaped_braces(self):
+        text = r"{a\}b\{c}rest"
+        self.assertEqual(match_group(text, 0), len(text) - 4)
+
+    def test_comment(self):
+        text = "{a % } comment\nb}rest"
+        self.assertEqual(match_group(text, 0), len(text) - 4)
+
+    def test_optional(self):
+        text = r"[a{]}b]rest"
+        self.assertEqual(match_group(text, 0), len(text) - 4)
+
+    def test_unterminated(self):
+        with self.assertRaises(ParseError) as context:
+            match_group("foo {bar", 4)
+        self.assertIn("position 4", str(context.exception))
+
+
+class TestParseArguments(unittest.TestCase):
+    def test_mandatory(self):
+        self.assertEqual(parse_arguments("{a}{b{c}} rest"), ([], ["a", "b{c}"], 9))
+
+    def test_optional(self):
+        self.assertEqual(
+            parse_arguments(r"[\Big]{a}{b}[c]"), ([r"\Big"], ["a", "b"], 12)
+        )
+
+    def test_optional_disabled(self):
+        self.assertEqual(parse_arguments("[a]{b}", optional=False), ([], [], 0))
+
+    def test_empty_optional(self):
+        self.assertEqual(parse_arguments("[]{C}"), ([""], ["C"], 5))
+
+    def test_unterminated(self):
+        self.assertEqual(parse_arguments("{a}{b"), ([], ["a"], 3))
+
+    def test_position(self):
+        self.assertEqual(parse_arguments(r"\foo{a}", 4), ([], ["a"], 7))
+
+
+class TestParseCommand(unittest.TestCase):
+    def test_command(self):
+        self.assertEqual(
+            parse_command(r"x \foo[o]{a}{b}y", 2),
+            Command("foo", ["o"], ["a", "b"], 2, 15),
+        )
+
+    def test_star(self):
+        self.assertEqual(parse_command(r"\section*{a}").name, "section*")
+
+    def test_symbol(self):
+        self.assertEqual(parse_command(r"\,").name, ",")
+
+    def test_invalid(self):
+        with self.assertRaises(ParseError):
+            parse_command("foo")
+
+
+class TestIterCommands(unittest.TestCase):
+    def test_iter_commands(self):
+        regex = commands_regex(["MPointTwo", "MPointTwoAS"])
+        text = (
+            r"\MPointTwoAS{1}{2} \MPointTwoX \\MPointTwo{3}{4} "
+            "% \\MPointTwo{5}{6}\n\\MPointTwo[\\big]{7}{8}"
+        )
+        self.assertEqual(
+            list(iter_commands(text, regex)),
+            [
+                Command("MPointTwoAS", [], ["1", "2"], 0, 18),
+                Command(
+                    "MPointTwo",
+                    [r"\big"],
+                    ["7", "8"],
+                    text.index(r"\MPointTwo["),
+                    len(text),
+                ),
+            ],
+        )
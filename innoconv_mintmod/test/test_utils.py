@@ -2,13 +2,19 @@
 
 # pylint: disable=missing-docstring,invalid-name
 
+import os
+import tempfile
 import unittest
 from mock import patch
 import panflute as pf
 
+from innoconv_mintmod.context import ConversionContext
 from innoconv_mintmod.errors import ParseError
+from innoconv_mintmod.scheduler import Scheduler
 from innoconv_mintmod.utils import (
+    FragmentJob,
     parse_fragment,
+    prefetch_fragments,
     destringify,
     parse_cmd,
     parse_nested_args,
@@ -18,6 +24,7 @@ from innoconv_mintmod.utils import (
     to_inline,
     extract_identifier,
     convert_simplification_code,
+    read_source,
 )
 from innoconv_mintmod.test.utils import captured_output
 from innoconv_mintmod.constants import INDEX_LABEL_PREFIX, SITE_UXID_PREFIX
@@ -122,6 +129,43 @@ class TestParseFragment(unittest.TestCase):
         with self.assertRaises(OSError):
             parse_fragment("foo bar", "en")
 
+    @patch("innoconv_mintmod.utils._run_panzer")
+    def test_prefetch_per_context(self, run_mock):
+        """Prefetched fragments are only used by their own context"""
+        prefetched = pf.Doc(pf.Para(pf.Str("prefetched")))
+        parsed = pf.Doc(pf.Para(pf.Str("parsed")))
+        run_mock.return_value = prefetched
+        context = ConversionContext()
+        other = ConversionContext(remove_exercises=True)
+        job = FragmentJob("Text", "en", "latex+raw_tex", None)
+        prefetch_fragments([job], Scheduler(), context=context)
+
+        run_mock.return_value = parsed
+        ret = parse_fragment("Text", "en", as_doc=True, context=other)
+        self.assertIs(ret, parsed)
+        ret = parse_fragment("Text", "en", as_doc=True, context=context)
+        self.assertIs(ret, prefetched)
+        self.assertEqual(run_mock.call_count, 2)
+
+
+class TestReadSource(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.tmpdir.name, "foo.tex")
+        with open(self.filepath, "w") as source_file:
+            source_file.write(r"\ifttm A\else B\fi")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_read_source(self):
+        with patch.dict(os.environ, clear=True):
+            self.assertEqual(read_source(self.filepath), r"\ifttm A\else B\fi")
+
+    def test_read_source_remove_ifttm(self):
+        with patch.dict(os.environ, {"INNOCONV_REMOVE_IFTTM": "1"}):
+            self.assertEqual(read_source(self.filepath), " A")
+
 
 class TestDestringify(unittest.TestCase):
     def test_regular(self):
@@ -209,6 +253,12 @@ class TestParseCmd(unittest.TestCase):
         self.assertEqual(cmd_name, "foobar")
         self.assertEqual(cmd_args, [r"word\bar{two}bbb", "baz"])
 
+    def test_parse_cmd_optional(self):
+        """It should skip optional arguments"""
+        cmd_name, cmd_args = parse_cmd(r"\MEinheit[]{kg\}}")
+        self.assertEqual(cmd_name, "MEinheit")
+        self.assertEqual(cmd_args, [r"kg\}"])
+
     def test_parse_cmd_mvector(self):
         r"""It should parse \MVector command"""
         cmd_name, cmd_args = parse_cmd(r"\MVector{2\\-\Mtfrac{5}{2}\\-2}")
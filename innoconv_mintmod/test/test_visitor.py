@@ -0,0 +1,94 @@
+"""This are unit tests for innoconv.visitor"""
+
+# pylint: disable=missing-docstring
+
+import unittest
+import panflute as pf
+
+from innoconv_mintmod.constants import INDEX_LABEL_PREFIX, SITE_UXID_PREFIX
+from innoconv_mintmod.utils import delete_annotation, delete_empty_paragraph
+from innoconv_mintmod.visitor import Visitor
+
+
+def _doc():
+    return pf.Doc(
+        pf.Para(pf.Str("Foo")),
+        pf.Para(),
+        pf.Div(pf.Para(), classes=[INDEX_LABEL_PREFIX]),
+        pf.Div(
+            pf.Para(pf.Str("Bar")),
+            pf.Para(),
+            pf.Div(classes=[SITE_UXID_PREFIX]),
+            pf.BulletList(pf.ListItem(pf.Para(), pf.Para(pf.Str("Baz")))),
+        ),
+        metadata={"foo": pf.MetaBlocks(pf.Para(), pf.Para(pf.Str("Meta")))},
+    )
+
+
+class TestVisitor(unittest.TestCase):
+    def test_fused_walk_equals_separate_walks(self):
+        expected = _doc()
+        expected.walk(delete_empty_paragraph)
+        expected.walk(delete_annotation)
+
+        doc = _doc()
+        visitor = Visitor()
+        visitor.add_pass(delete_empty_paragraph, pf.Para)
+        visitor.add_pass(delete_annotation, pf.Div)
+        visitor.walk(doc)
+        self.assertEqual(pf.stringify(doc), pf.stringify(expected))
+        self.assertEqual(doc.to_json(), expected.to_json())
+
+    def test_visit_order(self):
+        doc = pf.Doc(pf.Para(pf.Str("a"), pf.Emph(pf.Str("b"))), pf.Para(pf.Str("c")))
+        seen = []
+        visitor = Visitor()
+        visitor.add_pass(lambda elem, _: seen.append(elem.tag) and None)
+        visitor.walk(doc)
+        expected = []
+        doc.walk(lambda elem, _: expected.append(elem.tag) and None)
+        self.assertEqual(seen, expected)
+        self.assertEqual(seen[-1], "Doc")
+
+    def test_types(self):
+        doc = pf.Doc(pf.Para(pf.Str("a"), pf.Space(), pf.Str("b")))
+        seen = []
+        visitor = Visitor()
+        visitor.add_pass(lambda elem, _: seen.append(elem.text) and None, pf.Str)
+        visitor.walk(doc)
+        self.assertEqual(seen, ["a", "b"])
+
+    def test_replace_and_split(self):
+        doc = pf.Doc(pf.Para(pf.Str("a"), pf.Str("b"), pf.Str("c")))
+
+        def _split(elem, _):
+            if elem.text == "b":
+                return [pf.Str("b1"), pf.Str("b2")]
+            return None
+
+        visitor = Visitor()
+        visitor.add_pass(_split, pf.Str)
+        visitor.add_pass(lambda elem, _: pf.Emph(pf.Str(elem.text)), pf.Str)
+        visitor.add_pass(lambda elem, _: pf.Strong(*elem.content), pf.Emph)
+        visitor.walk(doc)
+        self.assertEqual(
+            [elem.tag for elem in doc.content[0].content],
+            ["Strong", "Str", "Str", "Strong"],
+        )
+        self.assertEqual(pf.stringify(doc), "ab1b2c\n\n")
+        self.assertIs(doc.content[0].content[0].parent, doc.content[0])
+
+    def test_deep_nesting(self):
+        inner = pf.Para(pf.Str("deep"))
+        for _ in range(5000):
+            inner = pf.Div(inner)
+        doc = pf.Doc(inner, pf.Para())
+        visitor = Visitor()
+        visitor.add_pass(delete_empty_paragraph, pf.Para)
+        visitor.walk(doc)
+        self.assertEqual(len(doc.content), 1)
+
+    def test_no_passes(self):
+        doc = pf.Doc(pf.Para())
+        self.assertIs(Visitor().walk(doc), doc)
+        self.assertEqual(len(doc.content), 1)
@@ -0,0 +1,124 @@
+"""This are unit tests for innoconv.walker"""
+
+# pylint: disable=missing-docstring
+
+import unittest
+
+from innoconv_mintmod.walker import walk
+
+
+def string(text):
+    return {"t": "Str", "c": text}
+
+
+def cell(blocks):
+    return [["", [], []], {"t": "AlignDefault"}, 1, 1, blocks]
+
+
+def row(*cells):
+    return [["", [], []], list(cells)]
+
+
+class TestWalk(unittest.TestCase):
+    def collect(self, nodes):
+        found = []
+        walk(nodes, {"Str": lambda node: found.append(node["c"])})
+        return found
+
+    def test_document_order(self):
+        nodes = [
+            {"t": "Header", "c": [1, ["h", [], []], [string("a")]]},
+            {
+                "t": "Para",
+                "c": [
+                    string("b"),
+                    {"t": "Space"},
+                    {"t": "Emph", "c": [{"t": "Strong", "c": [string("c")]}]},
+                    {"t": "Span", "c": [["", [], []], [string("d")]]},
+                ],
+            },
+            {
+                "t": "Div",
+                "c": [["", [], []], [{"t": "Plain", "c": [string("e")]}]],
+            },
+        ]
+        self.assertEqual(self.collect(nodes), ["a", "b", "c", "d", "e"])
+
+    def test_lists(self):
+        nodes = [
+            {
+                "t": "BulletList",
+                "c": [[{"t": "Plain", "c": [string("a")]}], [{"t": "Null"}]],
+            },
+            {
+                "t": "OrderedList",
+                "c": [
+                    [1, {"t": "Decimal"}, {"t": "Period"}],
+                    [[{"t": "Plain", "c": [string("b")]}]],
+                ],
+            },
+            {
+                "t": "DefinitionList",
+                "c": [
+                    [
+                        [string("c")],
+                        [[{"t": "Plain", "c": [string("d")]}]],
+                    ]
+                ],
+            },
+        ]
+        self.assertEqual(self.collect(nodes), ["a", "b", "c", "d"])
+
+    def test_table(self):
+        plain = [{"t": "Plain", "c": [string("x")]}]
+        table = {
+            "t": "Table",
+            "c": [
+                ["", [], []],
+                [None, [{"t": "Plain", "c": [string("caption")]}]],
+                [],
+                [["", [], []], [row(cell(plain))]],
+                [
+                    [
+                        ["", [], []],
+                        0,
+                        [row(cell(plain))],
+                        [row(cell(plain), cell(plain))],
+                    ]
+                ],
+                [["", [], []], [row(cell(plain))]],
+            ],
+        }
+        self.assertEqual(self.collect([table]), ["caption", "x", "x", "x", "x", "x"])
+
+    def test_skips_leaves(self):
+        nodes = [
+            {"t": "Para", "c": [{"t": "Math", "c": [{"t": "InlineMath"}, "x"]}]},
+            {"t": "CodeBlock", "c": [["", [], []], "code"]},
+        ]
+        self.assertEqual(self.collect(nodes), [])
+
+    def test_handler_modifies_children(self):
+        link = {
+            "t": "Link",
+            "c": [["", [], []], [string("caption")], ["#target", ""]],
+        }
+
+        def _clear(node):
+            node["c"][1] = []
+
+        found = []
+        walk([{"t": "Para", "c": [link]}], {"Link": _clear, "Str": found.append})
+        self.assertEqual(found, [])
+
+    def test_unknown(self):
+        unknown = []
+        nodes = [{"t": "Foo", "c": [string("a")]}, {"t": "Para", "c": []}]
+        walk(nodes, {}, unknown.append)
+        self.assertEqual([node["t"] for node in unknown], ["Foo"])
+
+    def test_deep_nesting(self):
+        nodes = [string("deep")]
+        for _ in range(5000):
+            nodes = [{"t": "Div", "c": [["", [], []], nodes]}]
+        self.assertEqual(self.collect(nodes), ["deep"])
@@ -0,0 +1,181 @@
+r"""Tokenizer module
+
+Scan LaTeX commands and their arguments in linear time.
+
+Arguments may be mandatory (``{…}``) or optional (``[…]``) and may contain
+nested groups, escaped braces (``\{``) and comments. Parsed commands report
+their position in the scanned text.
+"""
+
+import re
+from collections import namedtuple
+
+from innoconv_mintmod.errors import ParseError
+
+#: A parsed command with optional and mandatory arguments, ``start`` and
+#: ``end`` are positions in the scanned text
+Command = namedtuple("Command", ["name", "opt_args", "args", "start", "end"])
+
+#: Command names (letters with an optional star or a single character)
+CONTROL_SEQUENCE = re.compile(r"\\([A-Za-z@]+\*?|[^\\\s{])")
+
+# escaped characters that matter and comments are single tokens
+BRACE_TOKEN = re.compile(r"\\[\\{}%\]]|%[^\n]*|[{}]")
+BRACKET_TOKEN = re.compile(r"\\[\\{}%\]]|%[^\n]*|[{}\]]")
+
+# groups without these can be matched by counting braces
+NEEDS_TOKENS = re.compile(r"%|\\[{}]")
+
+
+def match_group(text, pos):
+    """Return the end of the group that starts at ``pos``.
+
+    A group starts with ``{`` or ``[``. An optional argument ``[…]`` ends with
+    the first ``]`` that is not nested in braces.
+
+    :param text: Text to scan
+    :type text: str
+    :param pos: Position of the opening ``{`` or ``[``
+    :type pos: int
+
+    :rtype: int
+    :returns: position after the closing ``}`` or ``]``
+
+    :raises ParseError: if the group is not terminated
+    """
+    if text[pos] == "[":
+        depth = 0
+        regex = BRACKET_TOKEN
+    else:
+        end = _match_braces(text, pos)
+        if end is not None and not NEEDS_TOKENS.search(text, pos, end):
+            return end
+        depth = 1
+        regex = BRACE_TOKEN
+    for match in regex.finditer(text, pos + 1):
+        token = match.group()
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth < 0:
+                break
+            if depth == 0 and regex is BRACE_TOKEN:
+                return match.end()
+        elif token == "]" and depth == 0:
+            return match.end()
+    snippet_end = pos + 50
+    raise ParseError(
+        "Unterminated group at position {}: {}…".format(pos, text[pos:snippet_end])
+    )
+
+
+def _match_braces(text, pos):
+    """Match braces by counting only (fast path of :func:`match_group`)."""
+    depth = 1
+    idx = pos + 1
+    while depth:
+        close = text.find("}", idx)
+        if close == -1:
+            return None
+        depth += text.count("{", idx, close) - 1
+        idx = close + 1
+    return idx
+
+
+def parse_arguments(text, pos=0, optional=True):
+    """Parse command arguments starting at ``pos``.
+
+    Optional arguments are only recognized before the first mandatory
+    argument. Parsing stops at the first character that doesn't start an
+    argument or at an unterminated group.
+
+    :param text: Text to scan
+    :type text: str
+    :param pos: Position of first argument
+    :type pos: int
+    :param optional: Recognize optional arguments
+    :type optional: bool
+
+    :rtype: (list, list, int)
+    :returns: optional arguments, mandatory arguments and end position
+    """
+    opt_args = []
+    args = []
+    end = len(text)
+    while pos < end:
+        char = text[pos]
+        if char == "{":
+            target = args
+        elif char == "[" and optional and not args:
+            target = opt_args
+        else:
+            break
+        try:
+            group_end = match_group(text, pos)
+        except ParseError:
+            break
+        arg_start, arg_end = pos + 1, group_end - 1
+        target.append(text[arg_start:arg_end])
+        pos = group_end
+    return opt_args, args, pos
+
+
+def parse_command(text, pos=0):
+    """Parse a command and its arguments starting at ``pos``.
+
+    :param text: Text to scan
+    :type text: str
+    :param pos: Position of the backslash
+    :type pos: int
+
+    :rtype: :class:`Command`
+    :returns: parsed command
+
+    :raises ParseError: if there's no command at ``pos``
+    """
+    match = CONTROL_SEQUENCE.match(text, pos)
+    if match is None:
+        raise ParseError("Could not parse LaTeX command: '%s'" % text[pos:])
+    opt_args, args, end = parse_arguments(text, match.end())
+    return Command(match.group(1), opt_args, args, pos, end)
+
+
+def commands_regex(names):
+    """Compile a regex that finds the given commands with :func:`iter_commands`.
+
+    :param names: Command names
+    :type names: iterable
+
+    :rtype: :class:`re.Pattern`
+    :returns: compiled regex
+    """
+    # escaped backslashes, escaped percent signs and comments are skipped
+    return re.compile(
+        r"\\\\|\\%|%[^\n]*|\\(?P<name>{})(?![A-Za-z])".format(
+            "|".join(re.escape(name) for name in names)
+        )
+    )
+
+
+def iter_commands(text, regex):
+    """Find commands in ``text`` and parse their arguments.
+
+    :param text: Text to scan
+    :type text: str
+    :param regex: Regex compiled by :func:`commands_regex`
+    :type regex: :class:`re.Pattern`
+
+    :rtype: generator of :class:`Command`
+    :returns: commands in order of appearance
+    """
+    pos = 0
+    while True:
+        match = regex.search(text, pos)
+        if match is None:
+            return
+        pos = match.end()
+        name = match.group("name")
+        if name is not None:
+            opt_args, args, pos = parse_arguments(text, pos)
+            yield Command(name, opt_args, args, match.start(), pos)
@@ -2,6 +2,7 @@
 
 import os
 import json
+from collections import namedtuple
 from shutil import which
 from subprocess import Popen, PIPE
 import sys
@@ -16,7 +17,11 @@ from innoconv_mintmod.constants import (
     SITE_UXID_PREFIX,
     PANZER_TIMEOUT,
 )
-from innoconv_mintmod.errors import ParseError
+from innoconv_mintmod.context import ConversionContext, get_context
+from innoconv_mintmod.mintmod_ifttm import strip_ifttm
+from innoconv_mintmod.rewrite import rewrite_source
+from innoconv_mintmod.tokenizer import parse_arguments, parse_command
+from innoconv_mintmod.visitor import Visitor
 
 
 def log(msg_string, level="INFO"):
@@ -45,7 +50,46 @@ def get_panzer_bin():
     return panzer_bin
 
 
-def parse_fragment(parse_string, lang, as_doc=False, from_format="latex+raw_tex"):
+def read_source(filepath, context=None):
+    r"""Read a LaTeX source file and apply source rewrite rules.
+
+    ``\ifttm`` commands are removed if the conversion context says so.
+
+    :param filepath: File path
+    :type filepath: str
+    :param context: Conversion context (defaults to a context created from
+        environment variables)
+    :type context: :class:`innoconv_mintmod.context.ConversionContext`
+
+    :rtype: str
+    :returns: file content
+
+    :raises ParseError: if an ``\ifttm`` was not terminated
+    """
+    with open(filepath, "r") as source_file:
+        content = source_file.read()
+    if context is None:
+        context = ConversionContext.from_environ()
+    if context.remove_ifttm:
+        content = strip_ifttm(content)
+    return rewrite_source(content)
+
+
+#: A fragment parse, used as key for prefetched fragments of a
+#: :class:`~innoconv_mintmod.context.ConversionContext`
+FragmentJob = namedtuple(
+    "FragmentJob", ["source", "lang", "from_format", "current_dir"]
+)
+
+
+def parse_fragment(
+    parse_string,
+    lang,
+    as_doc=False,
+    from_format="latex+raw_tex",
+    current_dir=None,
+    context=None,
+):
     """Parse a source fragment using panzer.
 
     :param parse_string: Source fragment
@@ -56,6 +100,11 @@ def parse_fragment(parse_string, lang, as_doc=False, from_format="latex+raw_tex"
     :type as_doc: bool
     :param from_format: Source format
     :type from_format: str
+    :param current_dir: Directory of the file the fragment was read from
+    :type current_dir: str
+    :param context: Conversion context (defaults to a context created from
+        environment variables)
+    :type context: :class:`innoconv_mintmod.context.ConversionContext`
 
     :rtype: list of :class:`panflute.base.Element` or
         :class:`panflute.elements.Doc`
@@ -65,29 +114,73 @@ def parse_fragment(parse_string, lang, as_doc=False, from_format="latex+raw_tex"
     :raises RuntimeError: if panzer recursion depth is exceeded
     :raises RuntimeError: if panzer output could not be parsed
     """
+    if context is None:
+        context = ConversionContext.from_environ()
+    if current_dir is None:
+        current_dir = context.current_dir
+    job = FragmentJob(parse_string, lang, from_format, current_dir)
+    try:
+        doc = context.prefetched.pop(job)
+    except KeyError:
+        doc = _run_panzer(job, context)
+
+    if as_doc:
+        return doc
 
+    if isinstance(doc.content, pf.ListContainer):
+        return list(doc.content)
+
+    return doc.content
+
+
+def prefetch_fragments(jobs, scheduler, context=None):
+    """Parse fragments concurrently ahead of time.
+
+    Results are stored on the context and picked up by :func:`parse_fragment`
+    when the same fragment is requested later on with that context. Failing
+    fragments are skipped so the error is raised when the fragment is actually
+    parsed.
+
+    :param jobs: Fragments to parse
+    :type jobs: list of :class:`FragmentJob`
+    :param scheduler: Scheduler that dispatches the jobs
+    :type scheduler: :class:`innoconv_mintmod.scheduler.Scheduler`
+    :param context: Conversion context (defaults to a context created from
+        environment variables)
+    :type context: :class:`innoconv_mintmod.context.ConversionContext`
+    """
+    if context is None:
+        context = ConversionContext.from_environ()
+
+    def _prefetch(job):
+        try:
+            context.prefetched[job] = _run_panzer(job, context)
+        except (OSError, RuntimeError, ValueError):
+            pass
+
+    scheduler.map(_prefetch, jobs)
+
+
+def _run_panzer(job, context):
+    """Run panzer on a fragment and return the resulting document."""
     root_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
     panzer_cmd = [
         get_panzer_bin(),
         "---panzer-support",
         os.path.join(root_dir, ".panzer"),
-        "--from={}".format(from_format),
+        "--from={}".format(job.from_format),
         "--to=json",
         "--metadata=style:innoconv",
-        "--metadata=lang:{}".format(lang),
+        "--metadata=lang:{}".format(job.lang),
     ]
 
-    # pass nesting depth as ENV var
-    recursion_depth = int(os.getenv("INNOCONV_RECURSION_DEPTH", "0"))
+    # pass context (including nesting depth) as ENV vars
     env = os.environ.copy()
-    env["INNOCONV_RECURSION_DEPTH"] = str(recursion_depth + 1)
-
-    if recursion_depth > 10:
-        raise RuntimeError("Panzer recursion depth exceeded!")
+    context.child(job.current_dir).to_environ(env)
 
     proc = Popen(panzer_cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE, env=env)
     out, err = proc.communicate(
-        input=parse_string.encode(ENCODING), timeout=PANZER_TIMEOUT
+        input=job.source.encode(ENCODING), timeout=PANZER_TIMEOUT
     )
     out = out.decode(ENCODING)
     err = err.decode(ENCODING)
@@ -104,15 +197,7 @@ def parse_fragment(parse_string, lang, as_doc=False, from_format="latex+raw_tex"
     else:
         raise RuntimeError("Unable to parse panzer output: {}".format(err))
 
-    doc = json.loads(out, object_hook=from_json)
-
-    if as_doc:
-        return doc
-
-    if isinstance(doc.content, pf.ListContainer):
-        return list(doc.content)
-
-    return doc.content
+    return json.loads(out, object_hook=from_json)
 
 
 # pylint: disable=dangerous-default-value
@@ -175,23 +260,21 @@ def destringify(string):
 
 def parse_cmd(text):
     r"""
-    Parse a LaTeX command using regular expressions.
+    Parse a LaTeX command.
 
-    Parses a command like: ``\foo{bar}{baz}``
+    Parses a command like: ``\foo[opt]{bar}{baz}``. Optional arguments are
+    skipped.
 
     :param text: String to parse
     :type text: str
 
     :rtype: (str, list)
     :returns: command name and list of command arguments
+
+    :raises ParseError: if text doesn't start with a command
     """
-    match = REGEX_PATTERNS["CMD"].match(text)
-    if not match:
-        raise ParseError("Could not parse LaTeX command: '%s'" % text)
-    groups = match.groups()
-    cmd_name = groups[0]
-    cmd_args, _ = parse_nested_args(groups[1])
-    return cmd_name, cmd_args
+    cmd = parse_command(text)
+    return cmd.name, cmd.args
 
 
 def parse_nested_args(to_parse):
@@ -208,24 +291,8 @@ def parse_nested_args(to_parse):
     :rtype: (list, str)
     :returns: parsed arguments and rest string
     """
-    pargs = []
-    if to_parse.startswith("{"):
-        stack = []
-        for i, cha in enumerate(to_parse):
-            if not stack and cha != "{":
-                break
-            if cha == "{":
-                stack.append(i)
-            elif cha == "}" and stack:
-                start = stack.pop()
-                if not stack:
-                    start_index = start + 1
-                    pargs.append(to_parse[start_index:i])
-        chars_to_remove = len("".join(pargs)) + 2 * len(pargs)
-        to_parse = to_parse[chars_to_remove:]
-    if not to_parse:
-        to_parse = None
-    return (pargs, to_parse)
+    _, pargs, end = parse_arguments(to_parse, optional=False)
+    return (pargs, to_parse[end:] or None)
 
 
 def extract_identifier(content):
@@ -268,24 +335,48 @@ def extract_identifier(content):
     return identifier
 
 
+def delete_annotation(elem, _):
+    """Visitor pass that deletes left-over annotation elements.
+
+    :param elem: Element
+    :type elem: :py:class:`panflute.base.Element`
+
+    :rtype: list
+    :returns: ``[]`` for annotation elements, ``None`` otherwise
+    """
+    try:
+        if isinstance(elem, pf.Div) and (
+            INDEX_LABEL_PREFIX in elem.classes or SITE_UXID_PREFIX in elem.classes
+        ):
+            return []  # delete element
+    except AttributeError:
+        pass
+    return None
+
+
+def delete_empty_paragraph(elem, _):
+    """Visitor pass that deletes empty paragraphs.
+
+    :param elem: Element
+    :type elem: :py:class:`panflute.base.Element`
+
+    :rtype: list
+    :returns: ``[]`` for empty paragraphs, ``None`` otherwise
+    """
+    if isinstance(elem, pf.Para) and not elem.content:
+        return []  # delete element
+    return None
+
+
 def remove_annotations(doc):
     """Remove left-over annotation elements from document.
 
     :param doc: Document
     :type doc: :py:class:`panflute.elements.Doc`
     """
-
-    def _rem_para(elem, _):
-        try:
-            if isinstance(elem, pf.Div) and (
-                INDEX_LABEL_PREFIX in elem.classes or SITE_UXID_PREFIX in elem.classes
-            ):
-                return []  # delete element
-        except AttributeError:
-            pass
-        return None
-
-    doc.walk(_rem_para)
+    visitor = Visitor()
+    visitor.add_pass(delete_annotation, pf.Div)
+    visitor.walk(doc)
 
 
 def remove_empty_paragraphs(doc):
@@ -294,17 +385,13 @@ def remove_empty_paragraphs(doc):
     :param doc: Document
     :type doc: :py:class:`panflute.elements.Doc`
     """
-
-    def _rem_para(elem, _):
-        if isinstance(elem, pf.Para) and not elem.content:
-            return []  # delete element
-        return None
-
-    doc.walk(_rem_para)
+    visitor = Visitor()
+    visitor.add_pass(delete_empty_paragraph, pf.Para)
+    visitor.walk(doc)
 
 
 def remember(doc, key, elem):
-    """Rememember an element in the document for later.
+    """Rememember an element in the document's context for later.
 
     To retrieve remembered elements use :py:func:`get_remembered`.
 
@@ -315,10 +402,7 @@ def remember(doc, key, elem):
     :param elem: Element to remember
     :type elem: :py:class:`panflute.base.Element`
     """
-    try:
-        doc.remembered_element[key] = elem
-    except AttributeError:
-        doc.remembered_element = {key: elem}
+    get_context(doc).remember(key, elem)
 
 
 def get_remembered(doc, key, keep=False):
@@ -336,13 +420,7 @@ def get_remembered(doc, key, keep=False):
     :rtype: :py:class:`panflute.base.Element`
     :returns: The remembered element or `None`
     """
-    try:
-        elem = doc.remembered_element[key]
-    except (AttributeError, KeyError):
-        return None
-    if not keep:
-        del doc.remembered_element[key]
-    return elem
+    return get_context(doc).get_remembered(key, keep=keep)
 
 
 def block_wrap(elem, orig_elem):
@@ -0,0 +1,166 @@
+"""Visitor module
+
+Fuse multiple passes over a Panflute document into one traversal.
+
+A pass is a function ``action(elem, doc)`` with the same semantics as an
+action for :py:meth:`panflute.base.Element.walk`: It returns ``None`` to keep
+the element, a replacement element, a list of elements to splice into the
+parent list or ``[]`` to delete the element. Passes may be restricted to
+element types so they're only called for elements they care about.
+
+The traversal is iterative so deeply nested documents can't exceed the
+recursion limit. Every element is visited once, children before their
+parent, and all passes are applied to it in the order they were added.
+"""
+
+from panflute import DictContainer, Element, ListContainer
+
+
+class Visitor:
+    """Apply a number of passes to a document in a single walk.
+
+    .. code-block:: python
+
+        visitor = Visitor()
+        visitor.add_pass(delete_empty_paragraph, pf.Para)
+        visitor.add_pass(delete_annotation, pf.Div)
+        visitor.walk(doc)
+    """
+
+    def __init__(self):
+        self._passes = []
+        # element class -> tuple of (position, action)
+        self._cache = {}
+
+    def add_pass(self, action, *types):
+        """Add a pass to the walk.
+
+        :param action: Function that takes ``(elem, doc)`` as arguments
+        :type action: function
+        :param types: Element classes the pass is applied to (all elements if
+            none are given)
+        :type types: type
+
+        :rtype: function
+        :returns: ``action`` (so this can be used as a decorator)
+        """
+        self._passes.append((action, types))
+        self._cache.clear()
+        return action
+
+    def _actions(self, cls):
+        try:
+            return self._cache[cls]
+        except KeyError:
+            actions = tuple(
+                (position, action)
+                for position, (action, types) in enumerate(self._passes)
+                if not types or issubclass(cls, types)
+            )
+            self._cache[cls] = actions
+            return actions
+
+    def walk(self, elem, doc=None):
+        """Walk ``elem`` and its children applying all passes.
+
+        Elements returned by a pass are handed to the remaining passes but
+        their children are not visited (as with
+        :py:meth:`panflute.base.Element.walk`).
+
+        :param elem: Element to walk (usually the document)
+        :type elem: :py:class:`panflute.base.Element`
+        :param doc: Document passed to the actions (defaults to the document
+            of ``elem``)
+        :type doc: :py:class:`panflute.elements.Doc`
+
+        :rtype: :py:class:`panflute.base.Element` | list
+        :returns: ``elem`` or what the passes replaced it with
+        """
+        if doc is None:
+            doc = elem.doc
+        if not self._passes:
+            return elem
+
+        # element IDs stay valid as long as the elements are kept in order
+        order = _preorder(elem)
+        replaced = {}
+        dirty = set()
+        for node, parent in reversed(order):
+            if id(node) in dirty:
+                _splice(node, replaced)
+            result = self._apply(node, doc)
+            if result is not node:
+                replaced[id(node)] = result
+                if parent is not None:
+                    dirty.add(id(parent))
+        return replaced.get(id(elem), elem)
+
+    def _apply(self, elem, doc):
+        """Apply all passes to an element and return the result."""
+        actions = self._actions(type(elem))
+        idx = 0
+        while idx < len(actions):
+            position, action = actions[idx]
+            idx += 1
+            ans = action(elem, doc)
+            if ans is None:
+                continue
+            if not isinstance(ans, Element):
+                return ans  # deleted or split up
+            if type(ans) is not type(elem):
+                actions = tuple(
+                    item for item in self._actions(type(ans)) if item[0] > position
+                )
+                idx = 0
+            elem = ans
+        return elem
+
+
+def _preorder(elem):
+    """Return ``(element, parent)`` pairs in pre-order (last child first).
+
+    Reversed this is the post-order with children in their natural order.
+    """
+    order = []
+    stack = [(elem, None)]
+    while stack:
+        node, parent = stack.pop()
+        order.append((node, parent))
+        for attr in node._children:  # pylint: disable=protected-access
+            obj = getattr(node, attr)
+            if isinstance(obj, Element):
+                stack.append((obj, node))
+            elif isinstance(obj, ListContainer):
+                # bypass item access of the container but attach like it does
+                for item in obj.list:
+                    item.parent = node
+                    item.location = obj.location
+                    stack.append((item, node))
+            elif isinstance(obj, DictContainer):
+                stack.extend((item, node) for item in obj.values())
+            elif obj is not None:
+                raise TypeError(type(obj))
+    return order
+
+
+def _splice(node, replaced):
+    """Put replaced children of ``node`` in place."""
+    for attr in node._children:  # pylint: disable=protected-access
+        obj = getattr(node, attr)
+        if isinstance(obj, Element):
+            if id(obj) in replaced:
+                setattr(node, attr, replaced[id(obj)])
+        elif isinstance(obj, ListContainer):
+            if any(id(item) in replaced for item in obj.list):
+                items = []
+                for item in obj.list:
+                    ans = replaced.get(id(item), item)
+                    if isinstance(ans, list):
+                        items.extend(ans)
+                    else:
+                        items.append(ans)
+                setattr(node, attr, items)
+        elif isinstance(obj, DictContainer):
+            if any(id(item) in replaced for item in obj.values()):
+                items = [(key, replaced.get(id(val), val)) for key, val in obj.items()]
+                setattr(node, attr, [(key, val) for key, val in items if val != []])
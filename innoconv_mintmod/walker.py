@@ -0,0 +1,140 @@
+"""Walker module
+
+Walk a Pandoc JSON AST (plain dicts and lists as written by ``pandoc -t json``)
+without converting it to Panflute elements first.
+
+:data:`CHILDREN` knows where every block and inline element keeps its child
+elements, so a walk visits each element once and never looks into unrelated
+data like attributes, link targets or formulas. The walk is iterative so
+deeply nested documents can't exceed the recursion limit.
+"""
+
+from itertools import chain
+
+
+def _list(content):
+    """Children are a list of elements."""
+    return (content,)
+
+
+def _lists(content):
+    """Children are a list of lists of elements."""
+    return content
+
+
+def _second(content):
+    """Second item is a list of elements."""
+    return (content[1],)
+
+
+def _second_lists(content):
+    """Second item is a list of lists of elements."""
+    return content[1]
+
+
+def _third(content):
+    """Third item is a list of elements."""
+    return (content[2],)
+
+
+def _definition_list(content):
+    for term, definitions in content:
+        yield term
+        yield from definitions
+
+
+def _rows(rows):
+    for row in rows:
+        for cell in row[1]:
+            yield cell[4]
+
+
+def _table(content):
+    _, caption, _, head, bodies, foot = content
+    yield caption[1]
+    yield from _rows(head[1])
+    for body in bodies:
+        yield from _rows(body[2])
+        yield from _rows(body[3])
+    yield from _rows(foot[1])
+
+
+def _figure(content):
+    yield content[1][1]
+    yield content[2]
+
+
+#: Child layout of all element types (``None`` for elements without children)
+CHILDREN = {
+    # blocks
+    "BlockQuote": _list,
+    "BulletList": _lists,
+    "CodeBlock": None,
+    "DefinitionList": _definition_list,
+    "Div": _second,
+    "Figure": _figure,
+    "Header": _third,
+    "HorizontalRule": None,
+    "LineBlock": _lists,
+    "Null": None,
+    "OrderedList": _second_lists,
+    "Para": _list,
+    "Plain": _list,
+    "RawBlock": None,
+    "Table": _table,
+    # inlines
+    "Cite": _second,
+    "Code": None,
+    "Emph": _list,
+    "Image": _second,
+    "LineBreak": None,
+    "Link": _second,
+    "Math": None,
+    "Note": _list,
+    "Quoted": _second,
+    "RawInline": None,
+    "SmallCaps": _list,
+    "SoftBreak": None,
+    "Space": None,
+    "Span": _second,
+    "Str": None,
+    "Strikeout": _list,
+    "Strong": _list,
+    "Subscript": _list,
+    "Superscript": _list,
+    "Underline": _list,
+}
+
+
+def walk(nodes, handlers, unknown=None):
+    """Visit elements and their descendants in document order.
+
+    Handlers are called before the children of an element are visited, so
+    they may modify or replace the children.
+
+    :param nodes: Elements
+    :type nodes: list
+    :param handlers: Mapping of element types to functions ``handler(node)``
+    :type handlers: dict
+    :param unknown: Function ``unknown(node)`` called for elements of unknown
+        type (their children are not visited)
+    :type unknown: function
+    """
+    stack = [iter(nodes)]
+    while stack:
+        for node in stack[-1]:
+            node_type = node["t"]
+            handler = handlers.get(node_type)
+            if handler is not None:
+                handler(node)
+            try:
+                layout = CHILDREN[node_type]
+            except KeyError:
+                if unknown is not None:
+                    unknown(node)
+                continue
+            if layout is not None:
+                stack.append(chain.from_iterable(layout(node["c"])))
+                break
+        else:
+            stack.pop()
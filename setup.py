@@ -6,6 +6,7 @@
 
 import distutils.cmd
 from distutils.command.clean import clean
+from glob import glob
 import os
 import logging
 import re
@@ -15,8 +16,10 @@ from setuptools import setup
 
 ROOT_DIR = os.path.dirname(os.path.realpath(__file__))
 PANZER_SUPPORT_DIR = os.path.join(ROOT_DIR, ".panzer")
+BENCHMARK_DIR = os.path.join(ROOT_DIR, "benchmarks")
 LINT_DIRS = [
     os.path.join(ROOT_DIR, "innoconv_mintmod"),
+    BENCHMARK_DIR,
     os.path.join(ROOT_DIR, "setup.py"),
     os.path.join(PANZER_SUPPORT_DIR, "filter"),
     os.path.join(PANZER_SUPPORT_DIR, "preflight"),
@@ -90,6 +93,20 @@ class TestCommand(BaseCommand):
         self._run(["green", "-r", self.test_target])
 
 
+class BenchmarkCommand(BaseCommand):
+    description = "Run benchmarks"
+
+    user_options = [("bench-target=", "b", "Benchmark name (e.g. import)")]
+
+    def initialize_options(self):
+        self.bench_target = None
+
+    def run(self):
+        pattern = "bench_{}.py".format(self.bench_target or "*")
+        for bench in sorted(glob(os.path.join(BENCHMARK_DIR, pattern))):
+            self._run([sys.executable, bench])
+
+
 class CoverageCommand(BaseCommand):
     description = "Generate HTML coverage report"
 
@@ -113,6 +130,7 @@ def setup_package():
         author=METADATA["author"],
         author_email=METADATA["author_email"],
         cmdclass={
+            "bench": BenchmarkCommand,
             "clean": CleanCommand,
             "coverage": CoverageCommand,
             "flake8": Flake8Command,